@@ -0,0 +1,107 @@
+"""Controller codec throughput benchmark.
+
+Measures the frame code of :class:`PrimareController` on synthetic frame
+streams, without any I/O:
+
+* ``encode``: commands per second through ``_send_command`` and ``_write``,
+  each answered so no reply is left pending
+* ``decode``: unsolicited volume frames per second through
+  ``_primare_reader``, i.e. decoding, parsing and updating the state
+* ``frame_decoder``: frames per second through :class:`FrameDecoder` alone
+
+Run from the repository root::
+
+    python benchmarks/bench_codec.py
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..'))
+
+from mopidy_primare.primare_serial import (  # noqa: E402
+    FrameDecoder, PrimareController)
+from mopidy_primare.primare_simulator import reply_frame  # noqa: E402
+
+
+class _Timer(object):
+
+    def active(self):
+        return False
+
+    def cancel(self):
+        pass
+
+
+class ImmediateReactor(object):
+    """Reactor running everything right away, timers never fire."""
+
+    def seconds(self):
+        return time.time()
+
+    def callLater(self, delay, func, *args, **kwargs):
+        return _Timer()
+
+    def callFromThread(self, func, *args, **kwargs):
+        func(*args, **kwargs)
+
+
+def volume_stream(count):
+    """Build a stream of <count> verbose volume replies."""
+    return b''.join(reply_frame(0x03, bytes(bytearray([index % 80])))
+                    for index in range(count))
+
+
+def chunks(stream, size):
+    return [stream[i:i + size] for i in range(0, len(stream), size)]
+
+
+def controller():
+    # The gap must stay 0 for frames to be written as soon as they are
+    # queued, adaptive pacing would keep it above PacingCalibration.MIN_GAP
+    # and the frames would pile up waiting for timers that never fire
+    primare = PrimareController(writer=lambda frame: None,
+                                reactor=ImmediateReactor(), adaptive=False)
+    primare._tx_queue._gap = 0
+    return primare
+
+
+def run(count=20000, chunk_size=32, repeat=3):
+    replies = [reply_frame(0x03, bytes(bytearray([level])))
+               for level in range(80)]
+    stream_chunks = chunks(volume_stream(count), chunk_size)
+
+    def encode():
+        primare = controller()
+        for index in range(count):
+            # Alternate levels so no command is skipped as already current
+            level = index % 80
+            primare._send_command('volume_set', level)
+            primare._primare_reader(replies[level])
+
+    def decode():
+        primare = controller()
+        for chunk in stream_chunks:
+            primare._primare_reader(chunk)
+
+    def frame_decoder():
+        decoder = FrameDecoder()
+        for chunk in stream_chunks:
+            decoder.feed(chunk)
+
+    results = {}
+    for name, func in (('encode', encode), ('decode', decode),
+                       ('frame_decoder', frame_decoder)):
+        best = min(timeit.repeat(func, number=1, repeat=repeat))
+        results[name + '_per_s'] = count / best
+    return results
+
+
+if __name__ == '__main__':
+    for name, value in sorted(run().items()):
+        print('{0:>20}: {1:>12.0f}'.format(name, value))
@@ -0,0 +1,94 @@
+"""Frame decoder throughput benchmark.
+
+Compares the incremental :class:`FrameDecoder` against the per-byte decoder
+it replaced, using a stream of verbose volume frames like the ones the
+amplifier sends while the volume knob is being turned.
+
+Run from the repository root::
+
+    python benchmarks/bench_decoder.py
+"""
+
+from __future__ import print_function
+
+import binascii
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..'))
+
+from mopidy_primare.primare_serial import FrameDecoder  # noqa: E402
+
+
+def volume_frames(count):
+    """Build a stream of <count> verbose volume replies."""
+    frames = []
+    for index in range(count):
+        level = index % 80
+        value = b'\x10\x10' if level == 0x10 else bytearray([level])
+        frames.append(b'\x02\x03' + bytes(value) + b'\x10\x03')
+    return b''.join(frames)
+
+
+class LegacyDecoder(object):
+    """The byte-at-a-time decoder used before FrameDecoder."""
+
+    def __init__(self):
+        self._bytes_read = bytearray()
+        self.frames = 0
+
+    def feed(self, rawdata):
+        for c in bytearray(rawdata):
+            self._bytes_read.append(c)
+            if self._bytes_read[-2:] == b'\x10\x03':
+                self._decode(bytes(self._bytes_read))
+                self._bytes_read = bytearray()
+
+    def _decode(self, rawdata):
+        byte_string = [rawdata[i:i + 1] for i in range(len(rawdata))]
+        binascii.hexlify(b''.join(byte_string[1:2]))
+        byte_string = byte_string[2:-2]
+        data = ''
+        for byte_pairs in zip(byte_string[0:None:2], byte_string[1:None:2]):
+            str_pairs = binascii.hexlify(b''.join(byte_pairs))
+            if str_pairs == b'1010':
+                data += '10'
+            else:
+                data += str_pairs.decode('ascii')
+        if len(byte_string) % 2 != 0:
+            data += binascii.hexlify(byte_string[-1]).decode('ascii')
+        self.frames += 1
+
+
+def chunks(stream, size):
+    return [stream[i:i + size] for i in range(0, len(stream), size)]
+
+
+def run(count=20000, chunk_size=32, repeat=3):
+    stream_chunks = chunks(volume_frames(count), chunk_size)
+
+    def legacy():
+        decoder = LegacyDecoder()
+        for chunk in stream_chunks:
+            decoder.feed(chunk)
+
+    def incremental():
+        decoder = FrameDecoder()
+        for chunk in stream_chunks:
+            decoder.feed(chunk)
+
+    results = {}
+    for name, func in (('legacy', legacy), ('incremental', incremental)):
+        best = min(timeit.repeat(func, number=1, repeat=repeat))
+        results[name] = count / best
+    return results
+
+
+if __name__ == '__main__':
+    results = run()
+    for name in ('legacy', 'incremental'):
+        print('{0:>12}: {1:>12.0f} frames/s'.format(name, results[name]))
+    print('{0:>12}: {1:>12.1f}x'.format(
+        'speedup', results['incremental'] / results['legacy']))
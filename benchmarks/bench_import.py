@@ -0,0 +1,55 @@
+"""Import time benchmark.
+
+Mopidy imports every extension at boot, so this reports how long importing
+the mixer takes and which modules it pulls in, using ``python -X
+importtime`` (Python 3.7 and newer).
+
+Run from the repository root::
+
+    python benchmarks/bench_import.py [module]
+"""
+
+from __future__ import print_function
+
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def import_times(module):
+    """Import ``module`` in a fresh interpreter.
+
+    :rtype: list of (module name, self microseconds, cumulative microseconds)
+    """
+    output = subprocess.check_output(
+        [sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+        stderr=subprocess.STDOUT, cwd=ROOT)
+    times = []
+    for line in output.decode('utf-8').splitlines():
+        if not line.startswith('import time:') or '[us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        times.append((name.strip(), int(self_us), int(cumulative_us)))
+    return times
+
+
+def run(module='mopidy_primare.mixer'):
+    times = import_times(module)
+    total = [cumulative for name, _, cumulative in times if name == module]
+    return {
+        'module': module,
+        'cumulative_us': total[0] if total else None,
+        'modules': len(times),
+        'slowest': sorted(times, key=lambda item: item[1], reverse=True)[:10],
+    }
+
+
+if __name__ == '__main__':
+    result = run(*sys.argv[1:2])
+    print('{0}: {1} us cumulative, {2} modules imported'.format(
+        result['module'], result['cumulative_us'], result['modules']))
+    for name, self_us, cumulative_us in result['slowest']:
+        print('{0:>10} us self {1:>10} us cumulative  {2}'.format(
+            self_us, cumulative_us, name))
@@ -0,0 +1,98 @@
+"""Mixer end to end latency benchmark.
+
+Measures how long it takes from :meth:`PrimareMixer.set_volume` to Mopidy
+being told about the confirmed volume change, against a
+:class:`PrimareSimulator` on a pseudo-terminal standing in for the
+amplifier. The simulator sends at 4800 baud, so the numbers include the time
+the frames take on the wire.
+
+Needs Mopidy and Pykka. Run from the repository root::
+
+    python benchmarks/bench_mixer.py
+"""
+
+from __future__ import print_function
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..'))
+
+from mopidy_primare.mixer import PrimareMixer  # noqa: E402
+from mopidy_primare.primare_simulator import PrimareSimulator  # noqa: E402
+
+_clock = getattr(time, 'perf_counter', time.time)
+
+TIMEOUT = 5
+
+
+class TimedMixer(PrimareMixer):
+    """Mixer recording when volume changes are reported to Mopidy."""
+
+    def __init__(self, config, changed):
+        super(TimedMixer, self).__init__(config)
+        self._changed = changed
+
+    def trigger_volume_changed(self, volume):
+        self._changed.append((_clock(), volume))
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def wait_for(condition):
+    deadline = _clock() + TIMEOUT
+    while not condition():
+        if _clock() > deadline:
+            raise RuntimeError('Timed out waiting for the mixer')
+        time.sleep(0.0005)
+
+
+def run(count=20, response_delay=0.01):
+    simulator = PrimareSimulator(response_delay=response_delay,
+                                 power_on_delay=0)
+    # Keep the mixer's cache away from the user's own
+    data_dir = tempfile.mkdtemp()
+    config = {'core': {'data_dir': data_dir},
+              'primare': {'port': simulator.open(), 'source': None,
+                          'volume': None}}
+    changed = []
+    mixer = TimedMixer.start(config=config, changed=changed).proxy()
+    try:
+        # Wait for the setup to learn the current volume,
+        wait_for(lambda: mixer.get_volume().get() is not None)
+        # and the remaining setup commands to be answered
+        time.sleep(0.5)
+        latencies = []
+        for index in range(count):
+            # Alternate between two volumes mapping to different levels
+            volume = 30 if index % 2 else 60
+            reported = len(changed)
+            started = _clock()
+            mixer.set_volume(volume).get()
+            wait_for(lambda: len(changed) > reported)
+            latencies.append((changed[-1][0] - started) * 1000)
+            # Let the frame gap pass so pacing does not add to the next one
+            time.sleep(0.1)
+    finally:
+        mixer.actor_ref.stop()
+        simulator.close()
+        shutil.rmtree(data_dir)
+
+    return {
+        'commands': len(latencies),
+        'p50_ms': percentile(latencies, 0.5),
+        'p95_ms': percentile(latencies, 0.95),
+        'max_ms': max(latencies),
+    }
+
+
+if __name__ == '__main__':
+    for name, value in sorted(run().items()):
+        print('{0:>10}: {1:>10.3f}'.format(name, value))
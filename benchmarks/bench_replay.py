@@ -0,0 +1,75 @@
+"""Capture replay throughput benchmark.
+
+Replays every capture in ``benchmarks/captures/`` (or the files given on the
+command line) into a controller at maximum speed, and reports the frames
+decoded per second for each. Captures are recorded with the ``capture``
+setting of the mixer or the ``--capture`` option of the CLI, see
+:mod:`mopidy_primare.primare_capture`.
+
+Run from the repository root::
+
+    python benchmarks/bench_replay.py [capture ...]
+"""
+
+from __future__ import print_function
+
+import glob
+import os
+import sys
+import time
+import timeit
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+sys.path.insert(0, os.path.join(HERE, '..'))
+
+from mopidy_primare.primare_capture import replay  # noqa: E402
+from mopidy_primare.primare_serial import PrimareController  # noqa: E402
+
+
+class _Timer(object):
+
+    def active(self):
+        return False
+
+    def cancel(self):
+        pass
+
+
+class ReplayReactor(object):
+    """Reactor for replays at maximum speed, timers never fire."""
+
+    def seconds(self):
+        return time.time()
+
+    def callLater(self, delay, func, *args, **kwargs):
+        return _Timer()
+
+    def callFromThread(self, func, *args, **kwargs):
+        func(*args, **kwargs)
+
+
+def replay_capture(path, repeat=3):
+    frames = []
+
+    def run_replay():
+        controller = PrimareController(writer=lambda data: None,
+                                       reactor=ReplayReactor())
+        replay(path, controller).result()
+        frames.append(sum(controller.stats()['frames_received'].values()))
+
+    best = min(timeit.repeat(run_replay, number=1, repeat=repeat))
+    return {'frames': frames[-1], 'frames_per_s': frames[-1] / best}
+
+
+def run(paths=None):
+    if not paths:
+        paths = sorted(glob.glob(os.path.join(HERE, 'captures', '*.bin')))
+    return dict((os.path.basename(path), replay_capture(path))
+                for path in paths)
+
+
+if __name__ == '__main__':
+    for name, result in sorted(run(sys.argv[1:]).items()):
+        print('{0:>30}: {1:>8} frames {2:>12.0f} frames/s'.format(
+            name, result['frames'], result['frames_per_s']))
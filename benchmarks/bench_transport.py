@@ -0,0 +1,91 @@
+"""Twisted transport latency benchmark.
+
+Measures how long a command takes from the call on the controller to its
+frame being handed to the transport of :class:`PrimareProtocol`, with the
+Twisted reactor running in its own thread as in the CLI. Commands are sent
+further apart than the frame gap, so the numbers are the cost of getting
+into the reactor and through the transmit queue, not the pacing.
+
+Needs Twisted. Run from the repository root::
+
+    python benchmarks/bench_transport.py
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..'))
+
+from mopidy_primare.primare_serial import PrimareController  # noqa: E402
+from mopidy_primare.primare_simulator import reply_frame  # noqa: E402
+from mopidy_primare.primare_twisted import PrimareProtocol  # noqa: E402
+
+from twisted.internet import reactor  # noqa: E402
+
+try:
+    from twisted.internet.testing import StringTransport
+except ImportError:
+    from twisted.test.proto_helpers import StringTransport
+
+_clock = getattr(time, 'perf_counter', time.time)
+
+
+class TimedTransport(StringTransport):
+    """Transport recording when every write happens."""
+
+    def __init__(self, protocol):
+        StringTransport.__init__(self)
+        self.protocol = protocol
+        self.written = []
+
+    def write(self, data):
+        self.written.append(_clock())
+        # Answer like the amplifier would, so no reply times out
+        level = bytearray(data)[3]
+        reactor.callLater(0, self.protocol.dataReceived,
+                          reply_frame(0x03, bytes(bytearray([level]))))
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run(count=50, interval=0.08):
+    protocol = PrimareProtocol()
+    transport = TimedTransport(protocol)
+    protocol.makeConnection(transport)
+    primare = PrimareController(writer=protocol.write, reactor=reactor)
+    protocol.primare_talker = primare
+
+    thread = threading.Thread(target=reactor.run,
+                              kwargs={'installSignalHandlers': False})
+    thread.start()
+    try:
+        sent = []
+        for index in range(count):
+            sent.append(_clock())
+            primare.volume_set(20 + index % 2 * 10).result(5)
+            time.sleep(interval)
+    finally:
+        reactor.callFromThread(reactor.stop)
+        thread.join()
+
+    latencies = [(written - queued) * 1000
+                 for queued, written in zip(sent, transport.written)]
+    return {
+        'commands': len(latencies),
+        'p50_ms': percentile(latencies, 0.5),
+        'p95_ms': percentile(latencies, 0.95),
+        'max_ms': max(latencies),
+    }
+
+
+if __name__ == '__main__':
+    for name, value in sorted(run().items()):
+        print('{0:>10}: {1:>10.3f}'.format(name, value))
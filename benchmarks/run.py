@@ -0,0 +1,69 @@
+"""Run all benchmarks and report the results as JSON.
+
+Every benchmark module provides a ``run()`` function returning a dict of
+numbers. The combined report can be stored and compared between revisions
+to spot regressions. Benchmarks whose dependencies are missing are reported
+as skipped.
+
+Run from the repository root::
+
+    python benchmarks/run.py [--output results.json] [benchmark ...]
+"""
+
+from __future__ import print_function
+
+import argparse
+import importlib
+import json
+import os
+import platform
+import sys
+import time
+import traceback
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+BENCHMARKS = ('bench_codec', 'bench_decoder', 'bench_replay',
+              'bench_transport', 'bench_mixer', 'bench_import')
+
+
+def run_benchmark(name):
+    try:
+        module = importlib.import_module(name)
+    except ImportError as e:
+        return {'skipped': str(e)}
+    try:
+        return module.run()
+    except Exception:
+        return {'error': traceback.format_exc()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('benchmarks', nargs='*', default=BENCHMARKS,
+                        help='Benchmarks to run, all by default.')
+    parser.add_argument('-o', '--output',
+                        help='File to write the results to, default stdout.')
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, HERE)
+    report = {
+        'timestamp': time.time(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': {},
+    }
+    for name in args.benchmarks:
+        print('Running {0}...'.format(name), file=sys.stderr)
+        report['results'][name] = run_benchmark(name)
+
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
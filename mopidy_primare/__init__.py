@@ -22,6 +22,9 @@ class Extension(ext.Extension):
         schema['port'] = config.String()
         schema['source'] = config.String(optional=True)
         schema['volume'] = config.String(optional=True)
+        schema['stats_interval'] = config.Integer(optional=True, minimum=0)
+        schema['capture'] = config.Path(optional=True)
+        schema['daemon'] = config.Path(optional=True)
         return schema
 
     def setup(self, registry):
@@ -2,17 +2,16 @@
 
 from __future__ import unicode_literals
 
-from twisted.internet.defer import inlineCallbacks
-from twisted.protocols.basic import LineReceiver
-
-from autobahn.twisted.wamp import ApplicationSession
+import logging
+import os
 
 from mopidy import mixer
 
-import logging
-import primare_serial
 import pykka
 
+from mopidy_primare import (
+    Extension, primare_cache, primare_serial, primare_threaded)
+
 logger = logging.getLogger(__name__)
 
 
@@ -23,17 +22,35 @@ class PrimareMixer(pykka.ThreadingActor, mixer.Mixer):
     def __init__(self, config):
         super(PrimareMixer, self).__init__(config)
 
+        self.config = config
         self.port = config['primare']['port']
         self.source = config['primare']['source'] or None
         self.volume = config['primare']['volume'] or None
+        self.stats_interval = config['primare'].get('stats_interval')
+        self.capture = config['primare'].get('capture')
+        self.daemon = config['primare'].get('daemon')
 
         self._primare = None
+        self._reactor = None
+        self._transport = None
+        self._supervisor = None
+        self._cache = None
+        self._capture = None
 
     def on_start(self):
         self._connect_primare()
 
     def on_stop(self):
-        self._primare.stop_reader()
+        if self.daemon and self._primare is not None:
+            self._primare.close()
+        if self._supervisor is not None:
+            self._supervisor.close()
+        if self._reactor is not None:
+            self._reactor.stop()
+        if self._capture is not None:
+            self._capture.close()
+        if self._cache is not None:
+            self._cache.flush()
 
     def get_volume(self):
         """
@@ -50,20 +67,39 @@ class PrimareMixer(pykka.ThreadingActor, mixer.Mixer):
 
         :rtype: int in range [0..100] or :class:`None`
         """
-        return self._primare.volume_get()
+        return self._primare.volume_state()
 
     def set_volume(self, volume):
         """
         Set volume level of the mixer.
 
+        Returns as soon as the command is queued. A volume changed event is
+        sent once the amplifier confirms the new volume.
+
         :param volume: Volume in the range [0..100]
         :type volume: int
         :rtype: :class:`True` if success, :class:`False` if failure
         """
-        success = self._primare.volume_set(volume)
-        if success:
-            self.trigger_volume_changed(volume)
-        return success
+        self._primare.volume_set(volume).add_done_callback(
+            self._command_done)
+        return True
+
+    def volume_fade(self, volume, duration):
+        """
+        Fade the volume of the mixer to a new level.
+
+        Returns as soon as the fade has started. Volume changed events are
+        sent as the amplifier confirms each step.
+
+        :param volume: Volume in the range [0..100]
+        :type volume: int
+        :param duration: Length of the fade in seconds
+        :type duration: float
+        :rtype: :class:`True` if success, :class:`False` if failure
+        """
+        self._primare.volume_fade(volume, duration).add_done_callback(
+            self._command_done)
+        return True
 
     def get_mute(self):
         """
@@ -72,34 +108,103 @@ class PrimareMixer(pykka.ThreadingActor, mixer.Mixer):
         :rtype: :class:`True` if muted, :class:`False` if unmuted,
         :class:`None` if unknown.
         """
-        return self._primare.mute_get()
+        return self._primare.mute_state()
 
     def set_mute(self, mute):
         """
         Mute or unmute the mixer.
 
+        Returns as soon as the command is queued. A mute changed event is
+        sent once the amplifier confirms the new state.
+
         :param mute: :class:`True` to mute, :class:`False` to unmute
         :type mute: bool
         :rtype: :class:`True` if success, :class:`False` if failure
         """
-        success = self._primare.mute_set(mute)
-        if success:
-            self.trigger_mute_changed(mute)
-        return success
-
-    def unsolicited_updates(self, variable, data):
-        if variable == '03':
-            logger.info('Primare mixer: Unsolicited VOLUME - data: %s', data)
-            pass
-        if variable == '09':
-            logger.info('Primare mixer: Unsolicited MUTE - data: %s', data)
-            pass
+        self._primare.mute_set(mute).add_done_callback(self._command_done)
+        return True
+
+    def state_changed(self, field, value):
+        """Report changes confirmed by the amplifier to Mopidy.
+
+        Covers changes we asked for as well as ones made on the amplifier
+        itself, e.g. by turning the volume knob.
+        """
+        if field == 'volume':
+            logger.debug('Primare mixer: Volume changed: %s', value)
+            self.trigger_volume_changed(self._primare.volume_state())
+        elif field == 'mute':
+            logger.debug('Primare mixer: Mute changed: %s', value)
+            self.trigger_mute_changed(value)
+
+    def _command_done(self, future):
+        if not future.cancelled() and future.exception() is not None:
+            logger.warning('Primare mixer: Command failed: %s',
+                           future.exception())
 
     def _connect_primare(self):
+        if self.daemon:
+            self._connect_daemon()
+            return
         logger.info('Primare mixer: Connecting through "%s", using input: %s',
                     self.port,
                     self.source if self.source is not None else "<DEFAULT>")
-        self._primare = primare_serial.PrimareTalker(
-            unsolicited_cb=self.actor_ref.proxy().unsolicited_updates,
-            port=self.port, source=self.source, volume=self.volume
+        self._reactor = primare_threaded.ThreadedReactor()
+        if self.capture:
+            from mopidy_primare import primare_capture
+
+            logger.info('Primare mixer: Recording traffic to "%s"',
+                        self.capture)
+            self._capture = primare_capture.CaptureWriter(self.capture)
+        self._transport = primare_threaded.SerialTransport(
+            self.port, self._reactor, capture=self._capture)
+        # Reconnects when the amplifier or the serial adapter goes away
+        self._supervisor = primare_threaded.SerialSupervisor(
+            self._transport, self._reactor)
+        # Calibrated timings, identity and state are kept across restarts
+        self._cache = primare_cache.DeviceCache(
+            os.path.join(self._data_dir(), 'cache.json'))
+        self._primare = primare_serial.PrimareController(
+            source=self.source, volume=self.volume,
+            writer=self._supervisor.write, reactor=self._reactor,
+            stats_interval=self.stats_interval, timings=self._cache,
+            on_link_lost=self._supervisor.lost
         )
+        # Volume and mute are known right away, until the amplifier answers
+        primare_cache.attach(self._cache, self.port, self._primare)
+        self._primare.add_listener(self.actor_ref.proxy().state_changed)
+        self._supervisor.start(self._primare)
+        self._reactor.start()
+        # Setting up the amplifier runs in the background, the mixer is
+        # usable right away
+        self._primare.setup().add_done_callback(self._setup_done)
+
+    def _data_dir(self):
+        try:
+            return Extension.get_data_dir(self.config)
+        except AttributeError:
+            # Mopidy before 1.1 has no data dir for extensions
+            data_dir = self.config.get('core', {}).get(
+                'data_dir', os.path.join('~', '.local', 'share', 'mopidy'))
+            path = os.path.join(os.path.expanduser(data_dir), 'primare')
+            if not os.path.isdir(path):
+                os.makedirs(path)
+            return path
+
+    def _connect_daemon(self):
+        from mopidy_primare import primare_client
+
+        logger.info('Primare mixer: Connecting through daemon at "%s"',
+                    self.daemon)
+        self._primare = primare_client.PrimareClient(self.daemon)
+        self._primare.add_listener(self.actor_ref.proxy().state_changed)
+        self._primare.open()
+        self._primare.setup().add_done_callback(self._setup_done)
+
+    def _setup_done(self, future):
+        if future.exception() is not None:
+            logger.warning('Primare mixer: Setting up amplifier failed: %s',
+                           future.exception())
+        else:
+            logger.info('Primare mixer: Amplifier ready, volume: %s',
+                        self._primare.volume_state())
@@ -0,0 +1,180 @@
+"""Interface to Primare amplifiers using asyncio.
+
+This module lets an asyncio event loop drive :class:`PrimareController`
+without Twisted and without any thread of its own: timers and calls run on
+the loop, and the serial port is read when the loop sees it readable. The
+controller keeps its paced transmit queue and reply correlation, its
+futures can be awaited with :func:`asyncio.wrap_future`::
+
+    controller, supervisor = open_controller('/dev/ttyUSB0', loop)
+    volume = await asyncio.wrap_future(controller.volume_get())
+
+Needs Python 3.
+"""
+
+from __future__ import unicode_literals
+
+import asyncio
+import functools
+import logging
+
+from mopidy_primare.primare_clock import DelayedCall
+from mopidy_primare.primare_serial import BAUDRATE, PrimareController
+from mopidy_primare.primare_threaded import SerialSupervisor
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncioReactor(object):
+    """Run the controller's timers and calls on an asyncio loop."""
+
+    def __init__(self, loop):
+        """Initialization."""
+        self.loop = loop
+
+    def seconds(self):
+        """Return the current time of the loop's monotonic clock."""
+        return self.loop.time()
+
+    def callLater(self, delay, func, *args, **kwargs):
+        """Run ``func`` on the loop in ``delay`` seconds.
+
+        :rtype: :class:`DelayedCall`
+        """
+        delay = max(delay, 0)
+        call = DelayedCall(self.seconds() + delay, func, args, kwargs)
+        call.on_cancel = self.loop.call_later(delay, call.run).cancel
+        return call
+
+    def callFromThread(self, func, *args, **kwargs):
+        """Run ``func`` on the loop as soon as possible."""
+        call = functools.partial(func, *args, **kwargs)
+        if self.inReactorThread():
+            # No need to wake up the loop from the outside
+            self.loop.call_soon(call)
+        else:
+            self.loop.call_soon_threadsafe(call)
+
+    def inReactorThread(self):
+        """Return :class:`True` if called from the loop, while it runs."""
+        try:
+            return asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            return False
+
+
+class SerialTransport(object):
+    """Serial connection to the amplifier read by an asyncio loop.
+
+    The port is opened non-blocking and watched with ``loop.add_reader``,
+    received data is handed to ``reader`` on the loop. Writes happen on the
+    calling thread, which is the loop when used as the controller's writer.
+    """
+
+    def __init__(self, port, loop, baudrate=BAUDRATE, capture=None):
+        """Initialization.
+
+        :param capture: :class:`CaptureWriter` recording the traffic, if any
+        """
+        self.port = port
+        self._loop = loop
+        self._baudrate = baudrate
+        self._capture = capture
+        self._serial = None
+        self._reader = None
+        self._lost = None
+
+    def open(self, reader, lost=None):
+        """Open the serial port and pass received data to ``reader``.
+
+        :param lost: Called on the loop with the error if reading fails,
+          e.g. because the device was unplugged
+        """
+        import serial
+
+        connection = serial.serial_for_url(self.port,
+                                           baudrate=self._baudrate,
+                                           timeout=0)
+        self._reader = reader
+        self._lost = lost
+        self._serial = connection
+        self._loop.add_reader(connection.fileno(), self._readable)
+
+    def write(self, data):
+        """Write raw bytes to the serial port."""
+        connection = self._serial
+        if connection is None:
+            raise IOError('{} is not open'.format(self.port))
+        if self._capture is not None:
+            self._capture.sent(data)
+        connection.write(data)
+
+    def close(self):
+        """Stop reading and close the serial port."""
+        connection, self._serial = self._serial, None
+        if connection is None:
+            return
+        self._loop.remove_reader(connection.fileno())
+        connection.close()
+
+    def _readable(self):
+        connection = self._serial
+        try:
+            data = connection.read(connection.in_waiting or 1)
+        except (IOError, OSError) as e:
+            self._loop.remove_reader(connection.fileno())
+            if self._lost is not None:
+                self._lost(e)
+            return
+        if data:
+            if self._capture is not None:
+                self._capture.received(data)
+            self._reader(data)
+
+
+def open_controller(port, loop, capture=None, **kwargs):
+    """Connect a controller to an amplifier, driven by an asyncio loop.
+
+    The connection is kept up by a :class:`SerialSupervisor`, reconnecting
+    when the link fails. Call from the loop or before running it.
+
+    :param port: Serial port the amplifier is connected to
+    :param capture: :class:`CaptureWriter` recording the traffic, if any
+    :param kwargs: Further arguments for :class:`PrimareController`
+    :rtype: tuple of the :class:`PrimareController` and the
+      :class:`SerialSupervisor`, close the latter when done
+    """
+    reactor = AsyncioReactor(loop)
+    transport = SerialTransport(port, loop, capture=capture)
+    supervisor = SerialSupervisor(transport, reactor)
+    controller = PrimareController(writer=supervisor.write, reactor=reactor,
+                                   on_link_lost=supervisor.lost, **kwargs)
+    supervisor.start(controller)
+    return controller, supervisor
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(
+        description='Set up a Primare amplifier and print its state.')
+    parser.add_argument('-p', '--port', default='/dev/ttyUSB0',
+                        help='Serial port the amplifier is connected to.')
+    parser.add_argument('--source', default=None,
+                        help='Input to select on the amplifier.')
+    parser.add_argument('--volume', default=None,
+                        help='Volume to set on the amplifier, 0..100.')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    main_loop = asyncio.new_event_loop()
+    primare, link = open_controller(args.port, main_loop,
+                                    source=args.source, volume=args.volume)
+    try:
+        main_loop.run_until_complete(asyncio.wrap_future(primare.setup(),
+                                                         loop=main_loop))
+        print(json.dumps(primare.state.as_dict(), indent=2, sort_keys=True))
+    finally:
+        link.close()
+        main_loop.close()
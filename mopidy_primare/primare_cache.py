@@ -0,0 +1,143 @@
+"""Small file remembering what was learnt about amplifiers across restarts.
+
+The cache is a JSON file. The frame gap calibrated by the controller is kept
+per model and software version, as the timing depends on the firmware. The
+identity, input names and last confirmed state of the amplifier are kept per
+serial port, for a controller to start from while the amplifier is queried::
+
+    {"timings": {"I22/V1.0": 0.045},
+     "devices": {"/dev/ttyUSB0": {"modelname": "I22", "volume": 32, ...}}}
+"""
+
+from __future__ import unicode_literals
+
+import functools
+import io
+import json
+import logging
+import os
+import threading
+
+from mopidy_primare.primare_clock import monotonic
+
+logger = logging.getLogger(__name__)
+
+# Fields of PrimareState remembered per port
+DEVICE_FIELDS = frozenset([
+    'manufacturer', 'modelname', 'swversion', 'input', 'inputname',
+    'inputs', 'volume', 'mute'
+])
+
+
+class DeviceCache(object):
+    """Values remembered about amplifiers, saved to a JSON file.
+
+    Safe to use from several threads. A missing or unreadable file is
+    treated as an empty cache.
+    """
+
+    # Seconds between saves caused by state changes
+    SAVE_INTERVAL = 10
+
+    def __init__(self, path):
+        """Initialization.
+
+        :param path: File to keep the cache in
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._data = self._load()
+        # Changes not saved yet, and when the file was last written
+        self._dirty = False
+        self._saved_at = None
+
+    def _load(self):
+        try:
+            with io.open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (IOError, OSError, ValueError) as e:
+            logger.debug('Primare cache: Not using %s: %s', self.path, e)
+            return {}
+        if not isinstance(data, dict):
+            logger.warning('Primare cache: Ignoring invalid %s', self.path)
+            return {}
+        return data
+
+    def save(self):
+        """Write the cache to its file, replacing it in one go."""
+        with self._lock:
+            text = json.dumps(self._data, indent=2, sort_keys=True)
+            self._dirty = False
+            self._saved_at = monotonic()
+            temporary = self.path + '.tmp'
+            try:
+                with io.open(temporary, 'w', encoding='utf-8') as f:
+                    f.write(text)
+                os.rename(temporary, self.path)
+            except (IOError, OSError) as e:
+                logger.warning('Primare cache: Saving %s failed: %s',
+                               self.path, e)
+
+    def timing(self, model, swversion):
+        """Return the frame gap calibrated for a firmware.
+
+        :rtype: seconds, or :class:`None` if not calibrated yet
+        """
+        with self._lock:
+            return self._data.get('timings', {}).get(
+                '{}/{}'.format(model, swversion))
+
+    def store_timing(self, model, swversion, gap):
+        """Remember the frame gap calibrated for a firmware and save."""
+        with self._lock:
+            self._data.setdefault('timings', {})[
+                '{}/{}'.format(model, swversion)] = gap
+        self.save()
+
+    def device(self, port):
+        """Return the values remembered for the amplifier on a port.
+
+        :rtype: dict of :class:`PrimareState` field names and values
+        """
+        with self._lock:
+            return dict(self._data.get('devices', {}).get(port, {}))
+
+    def update_device(self, port, field, value):
+        """Remember a value reported by the amplifier on a port.
+
+        Usable as a controller listener. A different model on the port
+        replaces everything remembered for it. The file is saved at most
+        every :attr:`SAVE_INTERVAL` seconds, use :meth:`flush` to save the
+        latest changes.
+        """
+        if field not in DEVICE_FIELDS:
+            return
+        with self._lock:
+            device = self._data.setdefault('devices', {}).setdefault(port, {})
+            known = device.get(field)
+            if field == 'modelname' and known not in (None, value):
+                logger.info('Primare cache: %s now has a %s connected',
+                            port, value)
+                device.clear()
+            device[field] = value
+            self._dirty = True
+            saved_at = self._saved_at
+        if saved_at is None or monotonic() - saved_at >= self.SAVE_INTERVAL:
+            self.save()
+
+    def flush(self):
+        """Save the changes not saved yet."""
+        if self._dirty:
+            self.save()
+
+
+def attach(cache, port, controller):
+    """Let a controller start from the state cached for a port.
+
+    The cached values are restored as provisional state, and the cache
+    follows the changes reported by the amplifier from then on.
+    """
+    # Ports can be numbers, e.g. on Windows, JSON keys are text
+    port = '{}'.format(port)
+    controller.restore(cache.device(port))
+    controller.add_listener(functools.partial(cache.update_device, port))
@@ -0,0 +1,180 @@
+"""Capture and replay of the traffic on the serial link.
+
+A capture records every chunk written to or read from the amplifier, with
+the time it was seen, so problems seen in the field can be reproduced and
+profiled offline by replaying the capture into a :class:`PrimareController`.
+
+Captures are binary files starting with :data:`MAGIC`, followed by one
+record per chunk: a little endian header holding the monotonic timestamp in
+seconds as a double, the direction (:data:`TX` or :data:`RX`) as a byte and
+the length of the data as an unsigned int, then the data itself.
+
+Replay a capture and print the controller's statistics with::
+
+    python -m mopidy_primare.primare_capture capture.bin [--realtime]
+"""
+
+from __future__ import unicode_literals
+
+import io
+import struct
+import threading
+
+from concurrent.futures import Future
+
+from mopidy_primare.primare_clock import monotonic
+
+MAGIC = b'PRIMCAP1'
+
+# Chunks written to and read from the amplifier
+TX = 0
+RX = 1
+
+_RECORD = struct.Struct('<dBI')
+
+
+class CaptureError(Exception):
+    """The file is not a valid capture."""
+
+
+class CaptureWriter(object):
+    """Record the chunks sent and received on the serial link.
+
+    Safe to use from several threads, e.g. a reactor thread writing and a
+    reader thread receiving.
+    """
+
+    def __init__(self, path, clock=monotonic):
+        """Initialization.
+
+        :param path: File to write the capture to, replaced if it exists
+        :param clock: Callable returning the current time in seconds
+        """
+        self._file = io.open(path, 'wb')
+        self._file.write(MAGIC)
+        self._clock = clock
+        self._lock = threading.Lock()
+
+    def record(self, direction, data):
+        """Record a chunk of data seen on the link."""
+        header = _RECORD.pack(self._clock(), direction, len(data))
+        with self._lock:
+            if self._file is not None:
+                self._file.write(header + bytes(data))
+
+    def sent(self, data):
+        """Record a chunk written to the amplifier."""
+        self.record(TX, data)
+
+    def received(self, data):
+        """Record a chunk read from the amplifier."""
+        self.record(RX, data)
+
+    def wrap_writer(self, writer):
+        """Return a writer callback recording what it writes."""
+        def write(data):
+            self.sent(data)
+            writer(data)
+        return write
+
+    def wrap_reader(self, reader):
+        """Return a reader callback recording what it reads."""
+        def read(data):
+            self.received(data)
+            reader(data)
+        return read
+
+    def close(self):
+        """Flush and close the capture file."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def read_capture(path):
+    """Read the records of a capture.
+
+    :rtype: iterator of (timestamp, direction, data)
+    """
+    with io.open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise CaptureError('{} is not a Primare capture'.format(path))
+        while True:
+            header = f.read(_RECORD.size)
+            if not header:
+                return
+            if len(header) < _RECORD.size:
+                raise CaptureError('{} is truncated'.format(path))
+            timestamp, direction, length = _RECORD.unpack(header)
+            data = f.read(length)
+            if len(data) < length:
+                raise CaptureError('{} is truncated'.format(path))
+            yield timestamp, direction, data
+
+
+def replay(path, controller, reactor=None, speed=None):
+    """Feed the received chunks of a capture into a controller.
+
+    The chunks the controller writes in response go to its own writer and
+    are not compared against the capture.
+
+    :param path: Capture file to replay
+    :param controller: :class:`PrimareController` to feed
+    :param reactor: Reactor to schedule the chunks on, needed when replaying
+      at the original timing
+    :param speed: Factor to speed up the original timing by, e.g. 1 for the
+      original timing, :class:`None` to feed all chunks right away
+    :rtype: :class:`concurrent.futures.Future` resolved with the number of
+      chunks fed once the replay is done
+    """
+    received = [(timestamp, data) for timestamp, direction, data
+                in read_capture(path) if direction == RX]
+    future = Future()
+    if speed is None:
+        for _, data in received:
+            controller._primare_reader(data)
+        future.set_result(len(received))
+        return future
+
+    if not received:
+        future.set_result(0)
+        return future
+    first = received[0][0]
+    for timestamp, data in received:
+        reactor.callLater((timestamp - first) / speed,
+                          controller._primare_reader, data)
+    reactor.callLater((received[-1][0] - first) / speed,
+                      future.set_result, len(received))
+    return future
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+
+    from mopidy_primare.primare_serial import PrimareController
+    from mopidy_primare.primare_threaded import ThreadedReactor
+
+    parser = argparse.ArgumentParser(
+        description='Replay a capture into a Primare controller.')
+    parser.add_argument('capture', help='Capture file to replay.')
+    parser.add_argument('--realtime', action='store_true',
+                        help='Replay with the original timing.')
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help='Speed up the original timing by this factor.')
+    args = parser.parse_args()
+
+    replay_reactor = ThreadedReactor()
+    primare = PrimareController(writer=lambda data: None,
+                                reactor=replay_reactor)
+    started = monotonic()
+    if args.realtime:
+        replayed = replay(args.capture, primare, replay_reactor, args.speed)
+        replay_reactor.start()
+        chunks = replayed.result()
+        replay_reactor.stop()
+    else:
+        chunks = replay(args.capture, primare).result()
+    print(json.dumps({'chunks': chunks, 'seconds': monotonic() - started,
+                      'stats': primare.stats()}, indent=2, sort_keys=True))
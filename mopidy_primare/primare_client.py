@@ -0,0 +1,200 @@
+"""Client for an amplifier shared by :mod:`primare_daemon`.
+
+:class:`PrimareClient` offers the same methods as :class:`PrimareController`
+but sends them to the daemon owning the serial port, so several programs can
+use the amplifier at once. It only needs the standard library, the replies
+and state changes are read on a thread of its own.
+"""
+
+from __future__ import unicode_literals
+
+import functools
+import itertools
+import json
+import logging
+import socket
+import threading
+
+from concurrent.futures import Future
+
+from mopidy_primare.primare_clock import monotonic
+from mopidy_primare.primare_serial import (
+    PrimareController, PrimareError, PrimareState, PrimareTimeoutError,
+    _volume_percent)
+
+logger = logging.getLogger(__name__)
+
+# Errors reported by the daemon that are raised as themselves, any other is
+# raised as a PrimareError
+ERRORS = {
+    'PrimareTimeoutError': PrimareTimeoutError,
+    'PrimareError': PrimareError,
+}
+
+
+class PrimareClient(object):
+    """Connection to the daemon, used like a :class:`PrimareController`.
+
+    Any public method of the controller can be called, e.g.
+    ``client.volume_set(40)``, and returns a
+    :class:`concurrent.futures.Future` resolved with the daemon's answer.
+    :attr:`state` mirrors the state known by the daemon.
+    """
+
+    def __init__(self, path):
+        """Initialization.
+
+        :param path: Unix socket the daemon listens on
+        """
+        self.path = path
+        self.state = PrimareState()
+        self._listeners = []
+        self._socket = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        # Futures waiting for an answer, by message id
+        self._pending = {}
+        # Resolved once the daemon has sent the state it knows
+        self._synced = Future()
+        # Volume in range 0..100 last asked for through this client
+        self._requested_volume = None
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return functools.partial(self.call, name)
+
+    def open(self):
+        """Connect to the daemon."""
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.connect(self.path)
+        self._thread = threading.Thread(target=self._read_loop,
+                                        name='PrimareClientReader')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def close(self):
+        """Disconnect from the daemon."""
+        connection, self._socket = self._socket, None
+        if connection is None:
+            return
+        try:
+            connection.shutdown(socket.SHUT_RDWR)
+        except socket.error:
+            pass
+        if self._thread is not None:
+            self._thread.join()
+        connection.close()
+
+    def call(self, method, *args):
+        """Call a method of the daemon's controller.
+
+        :rtype: :class:`concurrent.futures.Future` resolved with the result
+        """
+        future = Future()
+        with self._lock:
+            message_id = next(self._ids)
+            self._pending[message_id] = future
+            message = {'id': message_id, 'method': method, 'args': args}
+            try:
+                self._socket.sendall(
+                    json.dumps(message).encode('utf-8') + b'\n')
+            except (socket.error, AttributeError) as e:
+                del self._pending[message_id]
+                future.set_exception(PrimareError(
+                    'Not connected to {}: {}'.format(self.path, e)))
+        return future
+
+    def add_listener(self, listener):
+        """Register a callable to be told about changes to :attr:`state`.
+
+        The listener is called from the client's reader thread with the
+        field name and new value.
+        """
+        self._listeners.append(listener)
+
+    def setup(self):
+        """Wait for the state known by the daemon.
+
+        The daemon sets up the amplifier itself.
+
+        :rtype: :class:`concurrent.futures.Future` resolved once
+          :attr:`state` holds the daemon's state
+        """
+        return self._synced
+
+    def volume_set(self, volume):
+        """Set the volume, like :meth:`PrimareController.volume_set`."""
+        self._requested_volume = int(volume)
+        return self.call('volume_set', volume)
+
+    def volume_fade(self, volume, duration):
+        """Fade the volume, like :meth:`PrimareController.volume_fade`."""
+        self._requested_volume = int(volume)
+        return self.call('volume_fade', volume, duration)
+
+    def volume_state(self):
+        """Return the last volume reported by the amplifier.
+
+        The volume last asked for is returned while the amplifier is at the
+        level it maps to, like :meth:`PrimareController.volume_state`.
+
+        :rtype: int in range [0..100] or :class:`None` if unknown
+        """
+        if self.state.volume is None:
+            return None
+        return _volume_percent(self.state.volume,
+                               PrimareController.VOLUME_LEVELS,
+                               self._requested_volume)
+
+    def mute_state(self):
+        """Return the last mute state reported by the amplifier.
+
+        :rtype: :class:`True` if muted, :class:`False` if unmuted,
+          :class:`None` if unknown
+        """
+        return self.state.mute
+
+    def _read_loop(self):
+        connection = self._socket
+        for line in connection.makefile('rb'):
+            try:
+                self._handle(json.loads(line.decode('utf-8')))
+            except Exception:
+                logger.exception('Primare client: Failed handling %r', line)
+
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            future.set_exception(PrimareError(
+                'Connection to {} lost'.format(self.path)))
+
+    def _handle(self, message):
+        if message.get('event') == 'state':
+            for field, value in message['state'].items():
+                self._update(field, value)
+            if not self._synced.done():
+                self._synced.set_result(None)
+        elif message.get('event') == 'changed':
+            self._update(message['field'], message['value'])
+        elif 'id' in message:
+            with self._lock:
+                future = self._pending.pop(message['id'], None)
+            if future is None:
+                return
+            if message.get('error') in ERRORS:
+                future.set_exception(
+                    ERRORS[message['error']](message['message']))
+            elif 'error' in message:
+                future.set_exception(PrimareError('{}: {}'.format(
+                    message['error'], message['message'])))
+            else:
+                future.set_result(message.get('result'))
+
+    def _update(self, field, value):
+        if field not in PrimareState.FIELDS:
+            return
+        if self.state.update(field, value, monotonic()):
+            for listener in self._listeners:
+                listener(field, value)
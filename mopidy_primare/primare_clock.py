@@ -0,0 +1,52 @@
+"""Timekeeping shared by the reactors and transports.
+
+:class:`PrimareController` only needs a small subset of Twisted's reactor
+interface: ``callLater``, ``callFromThread`` and ``seconds``. The reactors
+of :mod:`primare_threaded` and :mod:`primare_asyncio` implement it with the
+help of this module.
+"""
+
+from __future__ import unicode_literals
+
+import time
+
+# Clock not going backwards when the system time is set, Python 2 has none
+monotonic = getattr(time, 'monotonic', time.time)
+
+
+class DelayedCall(object):
+    """A call scheduled with a reactor's ``callLater``.
+
+    Like Twisted's ``IDelayedCall``, it can be cancelled until it has run.
+    """
+
+    def __init__(self, when, func, args, kwargs):
+        """Initialization.
+
+        :param when: Reactor time the call is due at
+        """
+        self.time = when
+        # Called without arguments once cancelled, e.g. to drop the call
+        # from an event loop
+        self.on_cancel = None
+        self._func = func
+        self._args = args
+        self._kwargs = kwargs
+        self._active = True
+
+    def active(self):
+        """Return :class:`True` if the call is still pending."""
+        return self._active
+
+    def cancel(self):
+        """Prevent the call from running."""
+        self._active = False
+        if self.on_cancel is not None:
+            self.on_cancel()
+
+    def run(self):
+        """Make the call, unless it was cancelled or has run already."""
+        if not self._active:
+            return
+        self._active = False
+        self._func(*self._args, **self._kwargs)
@@ -0,0 +1,227 @@
+"""Daemon sharing one Primare amplifier between several local clients.
+
+Only one process can own the serial port. The daemon opens it with Twisted,
+keeps the decoded state in a :class:`PrimareController` and serves any
+number of clients, such as the Mopidy mixer, over a Unix socket::
+
+    python -m mopidy_primare.primare_daemon --port /dev/ttyUSB0 \\
+        --socket /tmp/primare.sock
+
+Clients talk JSON, one message per line. A request names a public method of
+:class:`PrimareController` and its arguments::
+
+    {"id": 1, "method": "volume_set", "args": [40]}
+
+and is answered with its result, or the name and message of the error::
+
+    {"id": 1, "result": true}
+    {"id": 2, "error": "PrimareTimeoutError", "message": "No reply to ..."}
+
+On connecting, a client is sent the known state, and every change after
+that, whoever caused it::
+
+    {"event": "state", "state": {"volume": 32, "mute": false, ...}}
+    {"event": "changed", "field": "volume", "value": 33}
+
+Each client has at most one command in the controller's transmit queue at a
+time, the rest wait in the client's own queue until it has been written.
+Clients are thereby served in turn however many commands each of them sends,
+without waiting for the amplifier's replies, and a command setting a value
+replaces a queued one of the same client setting the same value.
+:class:`mopidy_primare.primare_client.PrimareClient` implements the client
+side.
+"""
+
+from __future__ import unicode_literals
+
+import collections
+import json
+import logging
+import os
+
+from concurrent.futures import Future
+
+from twisted.internet import protocol, reactor
+from twisted.internet.serialport import SerialPort
+from twisted.protocols.basic import LineReceiver
+
+from mopidy_primare.primare_cache import DeviceCache, attach
+from mopidy_primare.primare_capture import CaptureWriter
+from mopidy_primare.primare_serial import (
+    BAUDRATE, COALESCED_CMDS, PrimareController, _forward)
+from mopidy_primare.primare_twisted import PrimareProtocol
+
+logger = logging.getLogger(__name__)
+
+# Methods setting an absolute value, a newer call makes a queued one of the
+# same client redundant, like for the controller's own commands
+COALESCED_METHODS = COALESCED_CMDS
+
+
+class DaemonProtocol(LineReceiver):
+    """Connection to a single client."""
+
+    delimiter = b'\n'
+    MAX_LENGTH = 4096
+
+    def __init__(self):
+        """Initialization."""
+        # (message id, method, args, future) not handed to the controller yet
+        self.queue = collections.deque()
+        self.in_flight = False
+
+    def connectionMade(self):
+        self.factory.clients.append(self)
+        self.send({'event': 'state',
+                   'state': self.factory.controller.state.as_dict()})
+
+    def connectionLost(self, reason):
+        self.factory.clients.remove(self)
+        self.queue.clear()
+        self.connected = False
+
+    def lineReceived(self, line):
+        try:
+            message = json.loads(line.decode('utf-8'))
+            message_id = message.get('id')
+            method = message['method']
+            args = list(message.get('args', []))
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            logger.warning('Primare daemon: Invalid request %r: %s', line, e)
+            return
+        self.factory.enqueue(self, message_id, method, args)
+
+    def send(self, message):
+        if self.connected:
+            self.sendLine(json.dumps(message).encode('utf-8'))
+
+    def reply(self, message_id, future):
+        """Send the outcome of a future as the answer to a request."""
+        if future.cancelled():
+            self.send({'id': message_id, 'error': 'CancelledError',
+                       'message': 'Cancelled'})
+        elif future.exception() is not None:
+            error = future.exception()
+            self.send({'id': message_id, 'error': type(error).__name__,
+                       'message': str(error)})
+        else:
+            self.send({'id': message_id, 'result': future.result()})
+
+
+class PrimareDaemon(protocol.Factory):
+    """Serve a controller to the clients connecting to a Unix socket."""
+
+    protocol = DaemonProtocol
+
+    def __init__(self, controller):
+        """Initialization."""
+        self.controller = controller
+        self.clients = []
+        controller.add_listener(self._state_changed)
+
+    def enqueue(self, client, message_id, method, args):
+        """Queue a request of a client, from the reactor thread."""
+        command = getattr(self.controller, method, None)
+        private = PrimareController.PRIVATE_METHODS
+        hidden = method.startswith('_') or method in private
+        if hidden or not callable(command):
+            client.send({'id': message_id, 'error': 'AttributeError',
+                         'message': 'No such method: {}'.format(method)})
+            return
+
+        future = Future()
+        future.add_done_callback(
+            lambda future: client.reply(message_id, future))
+        if method in COALESCED_METHODS:
+            for queued in list(client.queue):
+                if queued[1] == method:
+                    logger.debug('Primare daemon: %s(%s) superseded',
+                                 method, queued[2])
+                    client.queue.remove(queued)
+                    _forward(future, queued[3])
+        client.queue.append((message_id, method, args, future))
+        self._pump(client)
+
+    def _pump(self, client):
+        """Hand the next command of a client to the controller.
+
+        The client's turn ends once the command has been written, long
+        running calls like ``volume_fade`` don't block its later commands.
+        """
+        if client.in_flight or not client.queue:
+            return
+        message_id, method, args, future = client.queue.popleft()
+        try:
+            result, sent = self.controller.call(method, *args)
+        except Exception as e:
+            future.set_exception(e)
+            self._pump(client)
+            return
+        if hasattr(result, 'add_done_callback'):
+            _forward(result, future)
+        else:
+            future.set_result(result)
+
+        client.in_flight = True
+
+        def turn_over(sent):
+            client.in_flight = False
+            self._pump(client)
+        sent.add_done_callback(turn_over)
+
+    def _state_changed(self, field, value):
+        for client in self.clients:
+            client.send({'event': 'changed', 'field': field, 'value': value})
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Share a Primare amplifier with local clients.')
+    parser.add_argument('-p', '--port', default='/dev/ttyUSB0',
+                        help='Serial port the amplifier is connected to.')
+    parser.add_argument('-s', '--socket', default='/tmp/primare.sock',
+                        help='Unix socket to serve the clients on.')
+    parser.add_argument('--source', default=None,
+                        help='Input to select on the amplifier.')
+    parser.add_argument('--volume', default=None,
+                        help='Volume to set on the amplifier, 0..100.')
+    parser.add_argument('--stats-interval', type=int, default=None,
+                        help='Log the link statistics every N seconds.')
+    parser.add_argument('--capture', default=None,
+                        help='Record the serial traffic to this file.')
+    parser.add_argument('--cache', default=None,
+                        help='Remember the amplifier between runs in this '
+                        'file.')
+    parser.add_argument('-d', '--debug', action='store_true',
+                        help='Enable debug output.')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.INFO)
+
+    serial_protocol = PrimareProtocol(args.debug)
+    if args.capture is not None:
+        serial_protocol.capture = CaptureWriter(args.capture)
+    cache = DeviceCache(args.cache) if args.cache else None
+    controller = PrimareController(source=args.source, volume=args.volume,
+                                   writer=serial_protocol.write,
+                                   reactor=reactor,
+                                   stats_interval=args.stats_interval,
+                                   timings=cache)
+    serial_protocol.primare_talker = controller
+    if cache is not None:
+        attach(cache, args.port, controller)
+        reactor.addSystemEventTrigger('before', 'shutdown', cache.flush)
+    SerialPort(serial_protocol, args.port, reactor, baudrate=BAUDRATE)
+
+    if os.path.exists(args.socket):
+        os.unlink(args.socket)
+    reactor.listenUNIX(args.socket, PrimareDaemon(controller))
+    logger.info('Primare daemon: Serving %s on %s', args.port, args.socket)
+    reactor.callWhenRunning(controller.setup)
+    reactor.run()
+
+
+if __name__ == '__main__':
+    main()
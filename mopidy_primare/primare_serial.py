@@ -8,9 +8,12 @@ amplifier.
 from __future__ import with_statement
 
 import binascii
+import bisect
+import collections
+import functools
 import logging
-import struct
-import time
+
+from concurrent.futures import CancelledError, Future
 
 # from twisted.logger import Logger
 
@@ -57,10 +60,19 @@ POS_DLE_ETX = slice(-2, None)
 POS_CMD_VAR = slice(2, 3)
 POS_REPLY_VAR = slice(1, 2)
 POS_REPLY_DATA = slice(2, -2)
-BYTE_STX = '\x02'
-BYTE_WRITE = '\x57'
-BYTE_READ = '\x52'
-BYTE_DLE_ETX = '\x10\x03'
+BYTE_STX = b'\x02'
+BYTE_ETX = b'\x03'
+BYTE_DLE = b'\x10'
+BYTE_WRITE = b'\x57'
+BYTE_READ = b'\x52'
+BYTE_DLE_ETX = b'\x10\x03'
+
+# Primare serial link config, a byte takes 10 bits on the wire
+BAUDRATE = 4800
+BITS_PER_BYTE = 10
+
+# Replies to volume_set are one step low from this level up
+VOLUME_QUIRK_LEVEL = 65
 
 INDEX_CMD = 0
 INDEX_VARIABLE = 1
@@ -112,19 +124,854 @@ PRIMARE_REPLY = {
     '14': 'inputname',
     '15': 'manufacturer',
     '16': 'modelname',
-    '17': 'swversion'
+    '17': 'swversion',
+    '94': 'inputname_specific'
 }
+
+# Binary frames for (command, option) pairs, filled in by command_frame()
+_FRAME_CACHE = {}
+
+
+def command_frame(variable, option=None):
+    """Return the escaped binary frame for a PRIMARE_CMD entry.
+
+    Frames only depend on the command and its option byte, so they are built
+    once and served from a cache afterwards.
+
+    :param variable: String key for the PRIMARE_CMD dict
+    :type variable: string
+    :param option: Value of the 'YY' byte for templated commands
+    :type option: int
+    :rtype: bytes
+    """
+    key = (variable, option)
+    try:
+        return _FRAME_CACHE[key]
+    except KeyError:
+        pass
+
+    cmd_type = PRIMARE_CMD[variable][INDEX_CMD]
+    data = PRIMARE_CMD[variable][INDEX_VARIABLE]
+    if data.endswith('YY'):
+        if option is None or not 0 <= option <= 0xff:
+            raise ValueError('{} needs an option in the range 0..255, '
+                             'got {!r}'.format(variable, option))
+        binary_variable = b''.join([binascii.unhexlify(data[:-2]),
+                                    bytes(bytearray([option]))])
+    else:
+        binary_variable = binascii.unhexlify(data)
+
+    # We need to replace single DLE (0x10) with double DLE to discern it
+    frame = b''.join([BYTE_STX,
+                      BYTE_WRITE if cmd_type == 'W' else BYTE_READ,
+                      binary_variable.replace(BYTE_DLE, BYTE_DLE + BYTE_DLE),
+                      BYTE_DLE_ETX])
+    _FRAME_CACHE[key] = frame
+    return frame
+
+
+class FrameDecoder(object):
+    r"""Incremental decoder for the frames sent by the amplifier.
+
+    Replies are framed as <STX> <variable> [<value>] <DLE> <ETX>, with any
+    <DLE> inside the frame sent twice. Raw chunks are passed to :meth:`feed`
+    in whatever sizes the serial port delivers them; the decoder unstuffs
+    '\x10\x10' and finds frame boundaries in the same pass, keeping partial
+    frames around until the next chunk arrives.
+    """
+
+    # Longest frame we accept before assuming we lost sync with the amp
+    MAX_FRAME_LENGTH = 256
+
+    def __init__(self):
+        """Initialization."""
+        self._frame = bytearray()
+        self._in_frame = False
+        self._pending_dle = False
+        # Number of frames dropped due to protocol violations
+        self.errors = 0
+
+    def _resync(self):
+        self.errors += 1
+        self._frame = bytearray()
+        self._in_frame = False
+
+    def feed(self, data):
+        """Decode a chunk of raw data.
+
+        :param data: Raw bytes as read from the serial port
+        :type data: bytes
+        :rtype: list of bytearray, the unstuffed <variable> [<value>] of every
+          frame completed by this chunk
+        """
+        frames = []
+        view = memoryview(data)
+        end = len(data)
+        pos = 0
+
+        if self._pending_dle and end:
+            # The previous chunk ended in the middle of a DLE sequence
+            self._pending_dle = False
+            pos = self._escaped(data[0:1], frames)
+
+        while pos < end:
+            if not self._in_frame:
+                start = data.find(BYTE_STX, pos)
+                if start < 0:
+                    break
+                self._in_frame = True
+                pos = start + 1
+                continue
+
+            dle = data.find(BYTE_DLE, pos)
+            if dle < 0:
+                self._frame += view[pos:]
+                pos = end
+            else:
+                self._frame += view[pos:dle]
+                if dle + 1 == end:
+                    self._pending_dle = True
+                    pos = end
+                else:
+                    pos = dle + 1 + self._escaped(data[dle + 1:dle + 2],
+                                                  frames)
+
+            if len(self._frame) > self.MAX_FRAME_LENGTH:
+                self._resync()
+
+        return frames
+
+    def _escaped(self, byte, frames):
+        """Handle the byte following a DLE, return number of bytes consumed."""
+        if byte == BYTE_DLE:
+            self._frame += BYTE_DLE
+            return 1
+        if byte == BYTE_ETX:
+            if self._frame:
+                frames.append(self._frame)
+            self._frame = bytearray()
+            self._in_frame = False
+            return 1
+        # Anything else is a protocol violation, drop the frame and let the
+        # byte be considered as the start of a new one
+        self._resync()
+        return 0
+
+
+class TransmitQueue(object):
+    """Frames waiting to be written to the amplifier.
+
+    The queue is owned by the I/O loop: :meth:`put` and :meth:`pause` must be
+    called from the reactor thread. Queued items are passed to ``writer`` by
+    reactor timers so that consecutive frames are at least ``gap`` seconds
+    apart, and nobody has to sleep while waiting for the line to become free.
+
+    The reactor only needs to provide ``callLater`` and ``seconds``, as
+    provided by Twisted's reactor.
+    """
+
+    # Things are wonky if we try to write too quickly
+    FRAME_GAP = 0.06
+
+    def __init__(self, writer, reactor, gap=FRAME_GAP):
+        """Initialization."""
+        self._writer = writer
+        self._reactor = reactor
+        self._gap = gap
+        self._queue = collections.deque()
+        self._timer = None
+        # Reactor time when the next frame may be written
+        self._line_free_at = 0
+        # Set while nothing may be written, e.g. the link is down
+        self._held = False
+
+    @property
+    def gap(self):
+        """Seconds kept between consecutive frames."""
+        return self._gap
+
+    @gap.setter
+    def gap(self, gap):
+        # Frames already queued keep the gap they were queued with
+        self._gap = gap
+
+    def __len__(self):
+        return len(self._queue)
+
+    def __iter__(self):
+        return (item for item, gap in self._queue if item is not None)
+
+    def put(self, item):
+        """Queue a frame, or any item understood by the writer, for writing."""
+        self._queue.append((item, self._gap))
+        self._schedule()
+
+    def requeue(self, items):
+        """Queue items ahead of everything else, in the given order."""
+        self._queue.extendleft((item, self._gap) for item in reversed(items))
+        self._schedule()
+
+    def hold(self):
+        """Stop writing, frames keep being queued until :meth:`resume`."""
+        self._held = True
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def resume(self):
+        """Write the frames queued while held."""
+        self._held = False
+        self._schedule()
+
+    def pause(self, seconds):
+        """Hold back any frames queued after this call for a while."""
+        self._queue.append((None, seconds))
+        self._schedule()
+
+    def supersede(self, item, matches):
+        """Queue an item in place of the queued items it makes redundant.
+
+        Every queued item for which ``matches`` returns :class:`True` is
+        dropped, and ``item`` takes the place of the first one in the queue.
+        If nothing matches the item is queued like with :meth:`put`.
+
+        :rtype: list of the dropped items
+        """
+        dropped = []
+        queue = collections.deque()
+        for entry in self._queue:
+            queued = entry[0]
+            if queued is None or not matches(queued):
+                queue.append(entry)
+            elif not dropped:
+                dropped.append(queued)
+                queue.append((item, self._gap))
+            else:
+                dropped.append(queued)
+
+        if not dropped:
+            self.put(item)
+        else:
+            self._queue = queue
+        return dropped
+
+    def take(self, matches):
+        """Remove the queued items for which ``matches`` returns True.
+
+        :rtype: list of the removed items, in queue order
+        """
+        taken = [entry[0] for entry in self._queue
+                 if entry[0] is not None and matches(entry[0])]
+        if taken:
+            self._queue = collections.deque(
+                entry for entry in self._queue
+                if entry[0] is None or entry[0] not in taken)
+        return taken
+
+    def clear(self):
+        """Drop all queued frames."""
+        self._queue.clear()
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _schedule(self):
+        if self._held or self._timer is not None or not self._queue:
+            return
+        delay = self._line_free_at - self._reactor.seconds()
+        if delay > 0:
+            self._timer = self._reactor.callLater(delay, self._release)
+        else:
+            self._release()
+
+    def _release(self):
+        self._timer = None
+        while self._queue and not self._held:
+            item, gap = self._queue.popleft()
+            if item is not None:
+                self._writer(item)
+            self._line_free_at = self._reactor.seconds() + gap
+            if gap > 0:
+                break
+        self._schedule()
+
+
+class PrimareState(object):
+    """Last known state of the amplifier.
+
+    Every field is :class:`None` until the amplifier has reported it, and
+    :attr:`updated` holds the reactor time of the last report per field.
+    Values are kept in the amplifier's own units, e.g. volume in the range
+    0..VOLUME_LEVELS. Fields in :attr:`provisional` hold values remembered
+    from an earlier run, not confirmed by the amplifier yet.
+    """
+
+    FIELDS = ('power', 'input', 'volume', 'balance', 'mute', 'dim', 'verbose',
+              'menu', 'ir_input', 'inputname', 'manufacturer', 'modelname',
+              'swversion')
+
+    # Fields holding on/off flags and text, the rest are numbers
+    BOOL_FIELDS = frozenset(['power', 'mute', 'verbose', 'ir_input'])
+    TEXT_FIELDS = frozenset(['inputname', 'manufacturer', 'modelname',
+                             'swversion'])
+
+    def __init__(self):
+        """Initialization."""
+        for field in self.FIELDS:
+            setattr(self, field, None)
+        self.updated = {}
+        self.provisional = set()
+        # Names of the inputs, by index
+        self.inputs = {}
+
+    def __repr__(self):
+        return 'PrimareState({})'.format(', '.join(
+            '{}={!r}'.format(field, getattr(self, field))
+            for field in self.FIELDS))
+
+    def update(self, field, value, timestamp):
+        """Record a value reported by the amplifier.
+
+        :rtype: :class:`True` if the value differs from the previous one
+        """
+        changed = getattr(self, field) != value
+        setattr(self, field, value)
+        self.updated[field] = timestamp
+        self.provisional.discard(field)
+        return changed
+
+    def provide(self, field, value):
+        """Use a remembered value until the amplifier reports one."""
+        setattr(self, field, value)
+        self.provisional.add(field)
+
+    def as_dict(self):
+        """Return the known fields and their values."""
+        return dict((field, getattr(self, field)) for field in self.FIELDS
+                    if getattr(self, field) is not None)
+
+
+def _parse_int(data):
+    return data[0] if data else None
+
+
+def _parse_bool(data):
+    return data[0] != 0 if data else None
+
+
+def _parse_text(data):
+    return data.decode('latin-1')
+
+
+def _parse_indexed_text(data):
+    return (data[0], data[1:].decode('latin-1')) if data else None
+
+
+def _parse_nothing(data):
+    return None
+
+
+def _reply_parser(field):
+    """Return the function decoding the value of a PRIMARE_REPLY field."""
+    if field in PrimareState.BOOL_FIELDS:
+        return _parse_bool
+    elif field in PrimareState.TEXT_FIELDS:
+        return _parse_text
+    elif field == 'inputname_specific':
+        # The input index followed by its name
+        return _parse_indexed_text
+    elif field == 'recall_factory_settings':
+        return _parse_nothing
+    return _parse_int
+
+
+# (field, parser) for every reply, by variable byte
+REPLY_TABLE = dict((int(variable, 16), (field, _reply_parser(field)))
+                   for variable, field in PRIMARE_REPLY.items())
+
+
+class Frame(object):
+    """A reply received from the amplifier, with its value decoded."""
+
+    __slots__ = ('variable', 'field', 'value')
+
+    def __init__(self, variable, field, value):
+        """Initialization."""
+        self.variable = variable
+        # PRIMARE_REPLY name of the variable, None if unknown
+        self.field = field
+        # Native value, or the raw bytes for unknown variables
+        self.value = value
+
+    def __repr__(self):
+        return 'Frame({!r}, {!r})'.format(
+            self.field or '{:02x}'.format(self.variable), self.value)
+
+
+def parse_frame(payload):
+    """Decode the unstuffed <variable> [<value>] of a reply.
+
+    :param payload: A frame as returned by :meth:`FrameDecoder.feed`
+    :type payload: bytearray
+    :rtype: :class:`Frame`
+    """
+    variable = payload[0]
+    entry = REPLY_TABLE.get(variable)
+    if entry is None:
+        return Frame(variable, None, bytes(payload[1:]))
+    return Frame(variable, entry[0], entry[1](payload[1:]))
+
+
+class VolumeFade(object):
+    """Remaining steps of a volume fade in progress."""
+
+    def __init__(self, steps, future, started):
+        """Initialization."""
+        # (seconds from start, command, option) for each frame
+        self.steps = collections.deque(steps)
+        self.future = future
+        self.started = started
+        self.timer = None
+
+
+class LatencyHistogram(object):
+    """Counts of durations in fixed buckets, cheap enough for every frame."""
+
+    # Upper bounds of the buckets in milliseconds, the last bucket holds
+    # everything slower
+    BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000)
+
+    def __init__(self):
+        """Initialization."""
+        self.counts = [0] * (len(self.BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, seconds):
+        """Record a duration."""
+        ms = seconds * 1000
+        self.counts[bisect.bisect_left(self.BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total += ms
+        self._extend(ms)
+
+    def merge(self, other):
+        """Add the durations recorded by another histogram."""
+        self.counts = [mine + theirs for mine, theirs
+                       in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.total += other.total
+        for ms in (other.min, other.max):
+            if ms is not None:
+                self._extend(ms)
+
+    def _extend(self, ms):
+        if self.min is None or ms < self.min:
+            self.min = ms
+        if self.max is None or ms > self.max:
+            self.max = ms
+
+    def percentile(self, fraction):
+        """Return the upper bound in ms of the bucket holding a percentile.
+
+        The bucket for everything slower than the last bound reports the
+        slowest duration seen.
+        """
+        if not self.count:
+            return None
+        wanted = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= wanted and count:
+                if index < len(self.BUCKETS_MS):
+                    return min(self.BUCKETS_MS[index], self.max)
+                return self.max
+        return self.max
+
+    def as_dict(self):
+        """Return a summary suitable for logging or JSON."""
+        labels = ['<={}'.format(bound) for bound in self.BUCKETS_MS]
+        labels.append('>{}'.format(self.BUCKETS_MS[-1]))
+        return {
+            'count': self.count,
+            'mean_ms': self.total / self.count if self.count else None,
+            'min_ms': self.min,
+            'max_ms': self.max,
+            'p50_ms': self.percentile(0.5),
+            'p95_ms': self.percentile(0.95),
+            'buckets': dict((label, count) for label, count
+                            in zip(labels, self.counts) if count),
+        }
+
+
+class PacingCalibration(object):
+    """Frame gap adapted to how fast the amplifier replies.
+
+    The gap follows a moving average of the time from writing a command to
+    its reply, with some margin, within :attr:`MIN_GAP` and :attr:`MAX_GAP`.
+    It grows right away when replies get slower and shrinks a little per
+    reply when they get faster. A missing or garbled reply doubles it.
+    """
+
+    # Bounds of the gap in seconds, the lower one leaves room for a command
+    # and its reply on the wire
+    MIN_GAP = 0.03
+    MAX_GAP = 0.3
+    # Weight of a new sample in the moving average
+    SMOOTHING = 0.2
+    # Gap kept as a multiple of the average reply delay
+    MARGIN = 1.5
+    # Factor the gap shrinks by per reply at most
+    DECAY = 0.95
+    # Factor the gap grows by on a missing or garbled reply
+    BACKOFF = 2.0
+
+    def __init__(self, gap):
+        """Initialization.
+
+        :param gap: Seconds to start with
+        """
+        self.gap = self._bounded(gap)
+        # Moving average of the reply delay in seconds
+        self.average = None
+        self.samples = 0
+        self.backoffs = 0
+
+    def _bounded(self, gap):
+        return min(self.MAX_GAP, max(self.MIN_GAP, gap))
+
+    def reply(self, seconds):
+        """Record the delay of a reply.
+
+        :rtype: the new gap
+        """
+        if self.average is None:
+            self.average = seconds
+        else:
+            self.average += self.SMOOTHING * (seconds - self.average)
+        self.samples += 1
+        self.gap = self._bounded(max(self.average * self.MARGIN,
+                                     self.gap * self.DECAY))
+        return self.gap
+
+    def restore(self, gap):
+        """Continue from a gap calibrated earlier.
+
+        :rtype: the new gap
+        """
+        self.gap = self._bounded(gap)
+        return self.gap
+
+    def failure(self):
+        """Record a missing or garbled reply.
+
+        :rtype: the new gap
+        """
+        self.backoffs += 1
+        self.gap = self._bounded(self.gap * self.BACKOFF)
+        return self.gap
+
+    def as_dict(self):
+        """Return a summary suitable for logging or JSON."""
+        return {
+            'gap_ms': self.gap * 1000,
+            'reply_delay_ms':
+                self.average * 1000 if self.average is not None else None,
+            'samples': self.samples,
+            'backoffs': self.backoffs,
+        }
+
+
+class LinkStats(object):
+    """Counters for the traffic on the serial link.
+
+    Frames sent are counted by PRIMARE_CMD name, frames received by the
+    PRIMARE_REPLY name of their variable.
+    """
+
+    def __init__(self, started):
+        """Initialization."""
+        # Reactor time the counting started at
+        self.started = started
+        self.bytes_sent = collections.Counter()
+        self.frames_sent = collections.Counter()
+        # Raw bytes, including any noise outside of frames
+        self.bytes_received = 0
+        self.frames_received = collections.Counter()
+        self.unsolicited = collections.Counter()
+        self.retries = collections.Counter()
+        self.timeouts = collections.Counter()
+        self.skipped = collections.Counter()
+        self.superseded = collections.Counter()
+        self.deduplicated = collections.Counter()
+        self.max_queue_depth = 0
+        # Times the link was lost, and how long it took to get it back
+        self.outages = 0
+        self.recovery = LatencyHistogram()
+        # Times the amplifier was powered on for a command sent in standby
+        self.wakeups = 0
+        # Time from a command being queued until it is written
+        self.queue_wait = LatencyHistogram()
+        # Time from a command being written until its reply, per command
+        self.round_trip = collections.defaultdict(LatencyHistogram)
+
+    def as_dict(self, now):
+        """Return all counters as plain dicts, suitable for JSON."""
+        uptime = now - self.started
+        unsolicited = sum(self.unsolicited.values())
+        return {
+            'uptime': uptime,
+            'bytes_sent': dict(self.bytes_sent),
+            'frames_sent': dict(self.frames_sent),
+            'bytes_received': self.bytes_received,
+            'frames_received': dict(self.frames_received),
+            'unsolicited': dict(self.unsolicited),
+            'unsolicited_per_minute':
+                unsolicited * 60.0 / uptime if uptime > 0 else None,
+            'retries': dict(self.retries),
+            'timeouts': dict(self.timeouts),
+            'skipped': dict(self.skipped),
+            'superseded': dict(self.superseded),
+            'deduplicated': dict(self.deduplicated),
+            'max_queue_depth': self.max_queue_depth,
+            'outages': self.outages,
+            'wakeups': self.wakeups,
+            'recovery': self.recovery.as_dict(),
+            'queue_wait': self.queue_wait.as_dict(),
+            'round_trip': dict((name, histogram.as_dict()) for name, histogram
+                               in self.round_trip.items()),
+        }
+
+
+class PrimareError(Exception):
+    """Base class for errors reported by the Primare controller."""
+
+
+class PrimareTimeoutError(PrimareError):
+    """The amplifier did not reply to a command in time."""
+
+
+class PrimareBatchError(PrimareError):
+    """Some of the commands of a batch failed.
+
+    :attr:`results` holds the reply of every command of the batch, in the
+    order given, or the exception it failed with.
+    """
+
+    def __init__(self, results):
+        """Initialization."""
+        failed = [result for result in results
+                  if isinstance(result, Exception)]
+        super(PrimareBatchError, self).__init__(
+            '{} of {} commands failed: {}'.format(len(failed), len(results),
+                                                  failed[0]))
+        self.results = results
+
+
+# Commands writing an absolute value, a newer one makes any queued command on
+# the same variable redundant
+COALESCED_CMDS = frozenset([
+    'power_set', 'input_set', 'volume_set', 'balance_set', 'mute_set',
+    'dim_set', 'verbose_set', 'ir_input_set'
+])
+
+
+# Commands only reading a value, asking again while one is in flight gives
+# the same answer
+READ_CMDS = frozenset([
+    'volume_get', 'inputname_current_get',
+    'inputname_specific_get', 'manufacturer_get', 'modelname_get',
+    'swversion_get'
+])
+
+
+# Commands the amplifier ignores in standby, sending one powers it on first
+WAKE_CMDS = frozenset([
+    'input_set', 'input_next', 'input_prev', 'volume_set', 'volume_up',
+    'volume_down', 'balance_adjust', 'balance_set', 'mute_toggle',
+    'mute_set'
+])
+
+
+def _target_variable(variable):
+    """Return the variable byte affected by a command."""
+    return int(PRIMARE_CMD[variable][INDEX_VARIABLE][:2], 16) & 0x7f
+
+
+def _reply_variable(variable):
+    """Return the reply variable byte to wait for after sending a command."""
+    reply = PRIMARE_CMD[variable][INDEX_REPLY][:2]
+    if not PRIMARE_CMD[variable][INDEX_WAIT] or reply in ('', 'YY'):
+        return None
+    return int(reply, 16)
+
+
+def _is_idempotent(variable):
+    """Return :class:`True` if a command may safely be sent again."""
+    cmd_type, data = PRIMARE_CMD[variable][:INDEX_REPLY]
+    if cmd_type == 'R' or variable == 'volume_get':
+        return True
+    # Writes of absolute values
+    return int(data[:2], 16) & 0x80 != 0
+
+
+def _forward(future, to):
+    """Resolve the future ``to`` with the outcome of ``future``."""
+    def done(future):
+        if future.cancelled():
+            to.cancel()
+        elif future.exception() is not None:
+            to.set_exception(future.exception())
+        else:
+            to.set_result(future.result())
+
+    future.add_done_callback(done)
+
+
+def _mark_sent(request, future=None):
+    """Resolve the :attr:`Request.sent` future of a request, once."""
+    if not request.sent.done():
+        request.sent.set_result(None)
+
+
+def _volume_confirmed(target, reply):
+    """Check if a volume reply confirms the volume level we asked for."""
+    # There's a crazy bug where setting the volume to 65 and above will
+    # generate a reply indicating a volume of 1 less!?
+    # Hence the work-around
+    if target >= VOLUME_QUIRK_LEVEL:
+        return reply in (target, target - 1)
+    return reply == target
+
+
+def _volume_level(volume, levels):
+    """Convert a volume in range 0..100 to one of the amplifier's levels."""
+    return int(round(volume * levels / 100.0))
+
+
+def _volume_percent(level, levels, requested=None):
+    """Convert an amplifier volume level to the range 0..100.
+
+    There are fewer levels than volumes, so converting back and forth may
+    not give the volume asked for, e.g. 40 is level 32 which is 41. The
+    ``requested`` volume is returned as long as it maps to ``level``.
+    """
+    if requested is not None and _volume_level(requested, levels) == level:
+        return requested
+    return int(round(level * 100.0 / levels))
+
+
+def _run_steps(steps, future):
+    """Run a generator that yields futures, like Twisted's inlineCallbacks.
+
+    The generator is resumed with the result of every future it yields, or
+    has the exception thrown into it. ``future`` is resolved once the
+    generator is exhausted.
+    """
+    def step(value=None, error=None):
+        try:
+            if error is not None:
+                yielded = steps.throw(error)
+            else:
+                yielded = steps.send(value)
+        except StopIteration:
+            future.set_result(None)
+            return
+        except Exception as e:
+            future.set_exception(e)
+            return
+
+        def resume(yielded):
+            if yielded.exception() is not None:
+                step(error=yielded.exception())
+            else:
+                step(yielded.result())
+
+        yielded.add_done_callback(resume)
+
+    step()
+
+
+def _chain(future, func):
+    """Return a future resolved with ``func`` applied to a future's result."""
+    chained = Future()
+
+    def done(future):
+        try:
+            value = func(future.result())
+        except Exception as e:
+            chained.set_exception(e)
+        else:
+            chained.set_result(value)
+
+    future.add_done_callback(done)
+    return chained
+
+
+def _gather(futures):
+    """Return a future resolved with the results of several futures.
+
+    The results are listed in the order of ``futures``. If any of them
+    failed, the future fails with a :class:`PrimareBatchError` instead.
+    """
+    gathered = Future()
+    results = [None] * len(futures)
+    remaining = [len(futures)]
+
+    def done(index, future):
+        if future.cancelled():
+            results[index] = CancelledError()
+        elif future.exception() is not None:
+            results[index] = future.exception()
+        else:
+            results[index] = future.result()
+        remaining[0] -= 1
+        if remaining[0]:
+            return
+        if any(isinstance(result, Exception) for result in results):
+            gathered.set_exception(PrimareBatchError(results))
+        else:
+            gathered.set_result(results)
+
+    if not futures:
+        gathered.set_result(results)
+    for index, future in enumerate(futures):
+        future.add_done_callback(functools.partial(done, index))
+    return gathered
+
+
+class Request(object):
+    """A command sent to the amplifier and its pending reply."""
+
+    def __init__(self, variable, option, retries):
+        """Initialization."""
+        self.variable = variable
+        self.option = option
+        self.frame = command_frame(variable, option)
+        # Reply variable as used in PRIMARE_REPLY, None if no reply expected
+        self.reply = _reply_variable(variable)
+        self.target = _target_variable(variable)
+        self.retries = retries if _is_idempotent(variable) else 0
+        self.future = Future()
+        # Set for the steps of a volume fade
+        self.fade = False
+        # Set once held back while powering on, it is not held again
+        self.held = False
+        # Resolved once written or answered otherwise, if tracked by
+        # PrimareController.call()
+        self.sent = None
+        self.queued_at = None
+        self.sent_at = None
+        self.timer = None
+
+
 # TODO:
 # FIXING Better reply handling than table?
-# * Better error handling
-#       After suspend/resume, if volume up/down fails (or similar),
-#       try turning amp on
 #
 # LATER
-# * v2: Implement as module(?), not class, for multiple writers/subscribers
-#       (singleton)
-#       Seems like a factory would be better, so 'import primare_serial' then
-#       primare_serial.initComs() which then creates the single Serial object.
 # * v2: Add notification callback mechanism to notify users of changes on
 #       amp (dials or other SW)
 #       http://bit.ly/WGRn0g
@@ -140,212 +987,1004 @@ class PrimareController():
     # Primare amplifiers have 79 levels
     VOLUME_LEVELS = 79
 
-    def __init__(self, source=None, volume=None, writer=None):
-        """Initialization."""
-        self._bytes_read = bytearray()
+    # Seconds to wait for the reply to a command
+    REPLY_TIMEOUT = 0.5
+    # Number of times a command that is safe to repeat is resent on timeout
+    REPLY_RETRIES = 2
+    # Seconds to wait for the amplifier to report it has powered on
+    POWER_ON_TIMEOUT = 5
+    # Replies measured before a calibrated gap is first stored
+    CALIBRATION_SAMPLES = 20
+    # Relative change of the calibrated gap worth storing again
+    CALIBRATION_CHANGE = 0.1
+    # Number of inputs, the names of all of them are fetched by setup()
+    INPUTS = 8
+    # Fields identifying the amplifier, queried once
+    IDENTITY_FIELDS = ('manufacturer', 'modelname', 'swversion')
+    # Commands in a row failing for lack of replies before the link is
+    # considered lost
+    LINK_TIMEOUTS = 2
+    # Commands rebuilding the state once the link is back, the amplifier may
+    # have been power cycled and forgotten about verbose mode
+    RESYNC_CMDS = [('verbose_set', 0x01), 'volume_get',
+                   'inputname_current_get']
+    # Public methods for the code driving the controller, not exported to
+    # remote clients of the daemon or WAMP
+    PRIVATE_METHODS = frozenset([
+        'add_listener', 'call', 'restore', 'link_lost', 'link_restored'
+    ])
+
+    def __init__(self, source=None, volume=None, writer=None, reactor=None,
+                 unsolicited_cb=None, coalesce=True, stats_interval=None,
+                 adaptive=True, timings=None, on_link_lost=None):
+        """Initialization.
+
+        :param writer: Callable writing raw bytes to the serial port, called
+          from the reactor thread
+        :param reactor: Reactor driving the serial port, providing
+          ``callLater``, ``callFromThread`` and ``seconds`` like Twisted's
+        :param unsolicited_cb: Called with the PRIMARE_REPLY name and value
+          of every reply that doesn't answer one of our own commands
+        :param coalesce: If :class:`True`, a command setting an absolute value
+          replaces any commands on the same variable still waiting to be sent,
+          so only the newest value goes out once the line is free, and a read
+          already queued or waiting for its reply is not sent again
+        :param stats_interval: Seconds between summaries of the link
+          statistics in the log, :class:`None` to not log them
+        :param adaptive: If :class:`True`, the gap between frames follows how
+          fast the amplifier replies, see :class:`PacingCalibration`
+        :param timings: :class:`primare_cache.DeviceCache` to start from the
+          gap calibrated earlier for the same model and software version,
+          and to store it in
+        :param on_link_lost: Called from the reactor thread with a reason
+          when the amplifier stopped replying, for the transport to
+          reconnect and call :meth:`link_lost` and :meth:`link_restored`
+        """
+        self._decoder = FrameDecoder()
+        self._reactor = reactor
         self._write_cb = writer
+        self._unsolicited_cb = unsolicited_cb
+        self._coalesce = coalesce
+        self._tx_queue = TransmitQueue(self._write, reactor)
+        self._pacing = (PacingCalibration(self._tx_queue.gap) if adaptive
+                        else None)
+        self._timings = timings
+        # Gap last stored in timings for the connected amplifier
+        self._stored_gap = None
+        self._on_link_lost = on_link_lost
+        self._timeouts_in_row = 0
+        # Reactor time the link was lost at, None while it is up
+        self._link_lost_at = None
+        # Requests held while powering on, None unless powering on
+        self._wake_held = None
+        # Requests sent by the current call(), None outside of it
+        self._tracked = None
+        # Requests waiting for a reply, by reply variable, oldest first
+        self._pending = {}
+        # The volume fade in progress
+        self._fade = None
+        # (field, value, future) waiting for the state to change
+        self._state_waiters = []
+        self._listeners = []
+        self._stats = LinkStats(reactor.seconds())
+        self._stats_interval = stats_interval
+        if stats_interval:
+            reactor.callLater(stats_interval, self._log_stats)
 
         self._boot_print = True
-        self._manufacturer = ''
-        self._modelname = ''
-        self._swversion = ''
-        self._inputname = ''
+        self.state = PrimareState()
         self._source = source
-        # Volume in range 0..VOLUME_LEVELS. :class:`None` before calibration.
-        if volume:
-            self.volume_set(volume)
-
-        # Setup logging so that is available
-        logging.basicConfig(level=logging.DEBUG)
+        # Volume in range 0..100 applied by setup(), None to leave it be
+        self._volume = int(volume) if volume else None
+        # Volume in range 0..100 last asked for, reported as long as the
+        # amplifier is at the level it maps to
+        self._requested_volume = self._volume
 
     # Private methods
+    def _volume_to_primare(self, volume):
+        return _volume_level(volume, self.VOLUME_LEVELS)
+
+    def _volume_from_primare(self, level):
+        return _volume_percent(level, self.VOLUME_LEVELS,
+                               self._requested_volume)
+
     def _set_device_to_known_state(self):
+        """Steps for :func:`_run_steps` setting up a known state.
+
+        Sets that match the state we already know about are skipped by
+        :meth:`_enqueue`, so only the differences are sent.
+        """
         logger.debug('_set_device_to_known_state')
-        self.verbose_set(True)
-        self.power_on()
-        time.sleep(1)
+        try:
+            yield self.verbose_set(True)
+        except PrimareTimeoutError:
+            logger.debug('_set_device_to_known_state - verbose unconfirmed')
+        if self.state.power is not True or 'power' in self.state.provisional:
+            # There is no command reading the power state, in verbose mode
+            # the amplifier reports it in reply to power_set
+            self.power_on()
+            try:
+                yield self._wait_for_state('power', True,
+                                           self.POWER_ON_TIMEOUT)
+            except PrimareTimeoutError:
+                logger.warning('Amplifier did not report being powered on')
+        if len(self.state.inputs) < self.INPUTS:
+            try:
+                yield self.batch([('inputname_specific_get', index)
+                                  for index in range(self.INPUTS)])
+            except PrimareError as e:
+                logger.debug('_set_device_to_known_state - input names '
+                             'incomplete: %s', e)
+        commands = []
         if self._source is not None:
-            self.input_set(self._source)
-        self.mute_set(False)
+            try:
+                commands.extend(self._input_commands(
+                    'input_set', self._input_index(self._source)))
+            except PrimareError as e:
+                logger.warning('Not selecting input: %s', e)
+        commands.append(('mute_set', 0))
+        if self._volume is not None:
+            commands.append(('volume_set',
+                             self._volume_to_primare(self._volume)))
+        elif self.state.volume is None or 'volume' in self.state.provisional:
+            commands.append('volume_get')
+        yield self.batch(commands)
 
     def _print_device_info(self):
-        self.manufacturer_get()
-        self.modelname_get()
-        self.swversion_get()
         # We always get inputname last, this represents our initialization
-        self.inputname_current_get()
+        commands = [field + '_get' for field in self.IDENTITY_FIELDS
+                    if getattr(self.state, field) is None]
+        commands.append('inputname_current_get')
+        self.batch(commands)
+        # An identity remembered from an earlier run is only checked now, in
+        # case another amplifier was connected to the port meanwhile
+        remembered = [field + '_get' for field in ('modelname', 'swversion')
+                      if field in self.state.provisional]
+        if remembered:
+            self.batch(remembered)
 
     def _primare_reader(self, rawdata):
-        r"""Take raw data and finds the EOL sequence \x10\x03."""
-        eol = BYTE_DLE_ETX
-        leneol = len(eol)
-
-        for index, c in enumerate(rawdata):
-            self._bytes_read += c
-
-            # TODO: Need to do conversion of \x10\x10 before looking for EOL!
-            # Doing it after is actually wrong, move code up here from
-            # _decode_raw_data
-            if self._bytes_read[-leneol:] == eol:
-                logger.debug('_primare_reader - decoded: %s',
-                             binascii.hexlify(self._bytes_read))
-
-                variable_char, decoded_data = self._decode_raw_data(
-                    self._bytes_read)
-                # We found a data sequence, extract remaining data and start
-                # again
-                rawdata = rawdata[index + 1:]
-                self._bytes_read = bytearray()
-
-                self._parse_and_store(variable_char, decoded_data)
-            else:
-                # logger.debug('_primare_reader - not-eol: %s',
-                #              binascii.hexlify(self._bytes_read[-leneol:]))
-                pass
-
-    def _decode_raw_data(self, rawdata):
-        r"""Decode raw data from the serial port.
-
-        Replace any '\x10\x10' sequences with '\x10'.
-        Returns the variable char and the data received between the STX and
-        DLE+ETX markers
-        """
-        variable_char = ''
-        data = ''
-
-        # logger.debug('Read: "%s"', binascii.hexlify(rawdata))
-        byte_string = struct.unpack('c' * len(rawdata), rawdata)
-        variable_char = binascii.hexlify(''.join(byte_string[POS_REPLY_VAR]))
-        byte_string = byte_string[POS_REPLY_DATA]
-
-        # We need to replace double DLE (0x10) with single DLE
-        for byte_pairs in zip(byte_string[0:None:2],
-                              byte_string[1:None:2]):
-            # Convert binary tuple to str to ascii
-            str_pairs = binascii.hexlify(''.join(byte_pairs))
-            if str_pairs == '1010':
-                data += '10'
+        """Take raw data from the serial port and handle complete frames."""
+        stats = self._stats
+        stats.bytes_received += len(rawdata)
+        debug = logger.isEnabledFor(logging.DEBUG)
+        errors = self._decoder.errors
+        payloads = self._decoder.feed(rawdata)
+        if self._decoder.errors > errors:
+            # Garbled replies, the amplifier may not keep up
+            self._pace(None)
+        if payloads:
+            self._timeouts_in_row = 0
+        for payload in payloads:
+            frame = parse_frame(payload)
+            name = frame.field or '{:02x}'.format(frame.variable)
+            stats.frames_received[name] += 1
+            if debug:
+                logger.debug('Read %r', frame)
+            request = self._pop_pending(frame.variable)
+            value = self._parse_and_store(frame, request)
+
+            if request is not None:
+                request.timer.cancel()
+                round_trip = self._reactor.seconds() - request.sent_at
+                stats.round_trip[request.variable].add(round_trip)
+                self._pace(round_trip)
+                logger.debug('Reply to %s after %.1f ms', request.variable,
+                             round_trip * 1000)
+                request.future.set_result(value)
             else:
-                data += str_pairs
-        # Very often we have an odd amount of data which not handled by
-        # the zip above, manually append that one byte
-        if len(byte_string) % 2 != 0:
-            data += binascii.hexlify(byte_string[-1])
-
-        logger.debug('Read(%s) = %s (%s)', PRIMARE_REPLY[variable_char], data,
-                     binascii.hexlify(rawdata))
-        return variable_char, data
-
-    def _parse_and_store(self, variable_char, data):
-        if variable_char in ['01', '14', '15', '16', '17']:
-            if variable_char in ['14', '15', '16', '17']:
-                logger.debug('_parse_and_store - index: "%s" - %s',
-                             variable_char,
-                             binascii.unhexlify(data))
-            if variable_char == '01':
-                self._power_state = int(data, 16)
-            elif variable_char == '14':
-                self._inputname = data
-                if self._boot_print is True:
-                    self._boot_print = False
-                    logger.info("""Connected to:
-                                Manufacturer:  %s
-                                Model:         %s
-                                SW Version:    %s
-                                Current input: %s """,
-                                binascii.unhexlify(self._manufacturer),
-                                binascii.unhexlify(self._modelname),
-                                binascii.unhexlify(self._swversion),
-                                binascii.unhexlify(self._inputname))
-            elif variable_char == '15':
-                self._manufacturer = data
-            elif variable_char == '16':
-                self._modelname = data
-            elif variable_char == '17':
-                self._swversion = data
+                stats.unsolicited[name] += 1
+                if self._unsolicited_cb is not None:
+                    self._unsolicited_cb(frame.field, value)
+
+    def _pop_pending(self, variable):
+        pending = self._pending.get(variable)
+        if pending:
+            return pending.popleft()
+        return None
+
+    def _reply_timeout(self, request):
+        self._pending[request.reply].remove(request)
+        # Back off before queueing the retry, so it gets the longer gap
+        self._pace(None)
+        if request.retries > 0:
+            request.retries -= 1
+            logger.debug('No reply to %s, retrying', request.variable)
+            self._stats.retries[request.variable] += 1
+            request.queued_at = self._reactor.seconds()
+            self._tx_queue.put(request)
+        else:
+            self._stats.timeouts[request.variable] += 1
+            request.future.set_exception(PrimareTimeoutError(
+                'No reply to {}'.format(request.variable)))
+            self._timeouts_in_row += 1
+            link_up = self._link_lost_at is None
+            watched = link_up and self._on_link_lost is not None
+            if watched and self._timeouts_in_row >= self.LINK_TIMEOUTS:
+                self._timeouts_in_row = 0
+                self._on_link_lost('No replies from the amplifier')
+
+    def _pace(self, delay):
+        """Adapt the frame gap to how fast the amplifier replied.
+
+        :param delay: Seconds from writing a command to its reply,
+          :class:`None` if the reply was missing or garbled
+        """
+        pacing = self._pacing
+        if pacing is None:
+            return
+        if delay is None:
+            gap = pacing.failure()
+            logger.debug('Backing off, frame gap now %.1f ms', gap * 1000)
+        else:
+            gap = pacing.reply(delay)
+        self._tx_queue.gap = gap
+        self._store_timing()
+
+    def _store_timing(self):
+        """Store the calibrated gap once it settled or moved noticeably."""
+        model, swversion = self.state.modelname, self.state.swversion
+        if self._timings is None or model is None or swversion is None:
+            return
+        gap = self._pacing.gap
+        if self._stored_gap is None:
+            if self._pacing.samples < self.CALIBRATION_SAMPLES:
+                return
+        else:
+            change = abs(gap - self._stored_gap) / self._stored_gap
+            if change < self.CALIBRATION_CHANGE:
+                return
+        logger.debug('Storing frame gap of %.1f ms for %s %s', gap * 1000,
+                     model, swversion)
+        self._stored_gap = gap
+        self._timings.store_timing(model, swversion, gap)
+
+    def _load_timing(self):
+        """Start from the gap stored for the connected amplifier."""
+        model, swversion = self.state.modelname, self.state.swversion
+        if self._timings is None or self._pacing is None:
+            return
+        if model is None or swversion is None:
+            return
+        gap = self._timings.timing(model, swversion)
+        if gap is None:
+            return
+        logger.debug('Using frame gap of %.1f ms stored for %s %s',
+                     gap * 1000, model, swversion)
+        self._stored_gap = gap
+        self._tx_queue.gap = self._pacing.restore(gap)
+
+    def _parse_and_store(self, frame, request=None):
+        """Store the value of a frame in :attr:`state`.
+
+        :rtype: the value, as confirmed for ``request``
+        """
+        field, value = frame.field, frame.value
+        if field == 'inputname_specific' and value is not None:
+            self._store_input_name(*value)
+            return value
+        if field not in PrimareState.FIELDS:
+            return value
+        volume_set = request is not None and request.variable == 'volume_set'
+        if field == 'volume' and volume_set:
+            if _volume_confirmed(request.option, value):
+                # Replies to volume_set are one step low from 65 and up, the
+                # volume did end up where we asked for
+                value = request.option
+        self._store(field, value)
+        if field == 'input' and value in self.state.inputs:
+            # No need to ask for the name of the new input
+            self._store('inputname', self.state.inputs[value])
+        return value
+
+    def _store(self, field, value):
+        """Record a value in :attr:`state` and tell who waits for it."""
+        remembered = field in self.state.provisional
+        if self.state.update(field, value, self._reactor.seconds()):
+            for listener in self._listeners:
+                listener(field, value)
+            if field in ('modelname', 'swversion'):
+                self._load_timing()
+                if remembered:
+                    self._identity_changed(field, value)
+        for waiter in [waiter for waiter in self._state_waiters
+                       if waiter[:2] == (field, value)]:
+            self._state_waiters.remove(waiter)
+            waiter[2].set_result(True)
+
+        if field == 'inputname' and self._boot_print is True:
+            self._boot_print = False
+            logger.info("""Connected to:
+                        Manufacturer:  %s
+                        Model:         %s
+                        SW Version:    %s
+                        Current input: %s """,
+                        self.state.manufacturer,
+                        self.state.modelname,
+                        self.state.swversion,
+                        self.state.inputname)
+
+    def _identity_changed(self, field, value):
+        """Forget what was remembered about a different amplifier.
+
+        The input names depend on the model and software, they are read
+        again.
+        """
+        logger.info('Amplifier %s is now %s, reading input names again',
+                    field, value)
+        self.state.inputs = {}
+        for listener in self._listeners:
+            listener('inputs', {})
+        self.batch([('inputname_specific_get', index)
+                    for index in range(self.INPUTS)])
+
+    def _store_input_name(self, index, name):
+        name = name.strip()
+        if self.state.inputs.get(index) == name:
+            return
+        inputs = dict(self.state.inputs)
+        inputs[index] = name
+        self.state.inputs = inputs
+        for listener in self._listeners:
+            listener('inputs', dict(inputs))
+
+    def _input_index(self, source):
+        """Return the index of an input given by number or name."""
+        try:
+            return int(source) % self.INPUTS
+        except ValueError:
+            pass
+        for index, name in self.state.inputs.items():
+            if name.lower() == source.strip().lower():
+                return index
+        raise PrimareError('Unknown input: {}'.format(source))
+
+    def _input_commands(self, variable, index=None):
+        """Return the batch for an input change.
+
+        The name of the new input is only read if it isn't in the input name
+        table.
+        """
+        if index is None:
+            commands = [variable]
+            known = len(self.state.inputs) >= self.INPUTS
+        else:
+            commands = [(variable, index)]
+            known = index in self.state.inputs
+        if not known:
+            commands.append('inputname_current_get')
+        return commands
 
     def _send_command(self, variable, option=None):
         """Send the specified command to the amplifier.
 
         :param variable: String key for the PRIMARE_CMD dict
         :type variable: string
-        :param option: String value needed for some of the commands
-        :type option: string
-        :rtype: :class:`True` if success, :class:`False` if failure
-        """
-        command = PRIMARE_CMD[variable][INDEX_CMD]
-        data = PRIMARE_CMD[variable][INDEX_VARIABLE]
-        if option is not None:
-            data = data.replace('YY', option)
-        logger.debug('_send_command(%s), data: "%s"', variable, data)
-        self._write(command, data)
-
-    def _write(self, cmd_type, data):
-        r"""Write data to the serial port.
-
-        Any occurences of '\x10' must be replaced with '\x10\x10' and add
-        the STX and DLE+ETX markers
-        """
-        # We need to replace single DLE (0x10) with double DLE to discern it
-        data_safe = ''
-        for index in range(0, len(data) - 1, 2):
-            pair = data[index:index + 2]
-            if pair == '10':
-                data_safe += '1010'
+        :param option: Value of the 'YY' byte needed for some of the commands
+        :type option: int
+        :rtype: :class:`concurrent.futures.Future` resolved with the value
+          replied, or :class:`None` for commands without a reply
+
+        Safe to call from any thread, the request is handed to the transmit
+        queue on the reactor thread which paces the actual writes.
+        """
+        logger.debug('_send_command(%s), option: %s', variable, option)
+        request = Request(variable, option, self.REPLY_RETRIES)
+        self._track([request])
+        self._reactor.callFromThread(self._enqueue, request)
+        return request.future
+
+    def _track(self, requests):
+        """Record the requests sent by the current :meth:`call`."""
+        if self._tracked is None:
+            return
+        for request in requests:
+            request.sent = Future()
+            request.future.add_done_callback(
+                functools.partial(_mark_sent, request))
+            self._tracked.append(request)
+
+    def _enqueue(self, request):
+        if request.target == 0x03 and not request.fade:
+            # Any other volume command takes over from a fade, reading the
+            # volume leaves it be
+            if request.variable not in READ_CMDS:
+                self._cancel_fade()
+
+        if not request.held:
+            if self._wake_held is not None:
+                # Everything after the held commands waits with them, to
+                # keep the order
+                request.held = True
+                self._wake_held.append(request)
+                return
+            if request.variable in WAKE_CMDS and self.state.power is False:
+                self._wake(request)
+                return
+
+        if request.variable in COALESCED_CMDS and self._is_current(request):
+            logger.debug('%s(%s) skipped, already the current state',
+                         request.variable, request.option)
+            self._stats.skipped[request.variable] += 1
+            request.future.set_result(getattr(
+                self.state, REPLY_TABLE[request.target][0]))
+            return
+
+        if self._coalesce and request.variable in READ_CMDS:
+            in_flight = self._in_flight(request)
+            if in_flight is not None:
+                logger.debug('%s(%s) already in flight', request.variable,
+                             request.option)
+                self._stats.deduplicated[request.variable] += 1
+                _forward(in_flight.future, request.future)
+                return
+
+        request.queued_at = self._reactor.seconds()
+        if not self._coalesce or request.variable not in COALESCED_CMDS:
+            self._tx_queue.put(request)
+        else:
+            superseded = self._tx_queue.supersede(
+                request, lambda queued: queued.target == request.target)
+            for queued in superseded:
+                logger.debug('%s(%s) superseded by %s(%s)', queued.variable,
+                             queued.option, request.variable, request.option)
+                self._stats.superseded[queued.variable] += 1
+                _forward(request.future, queued.future)
+        self._stats.max_queue_depth = max(self._stats.max_queue_depth,
+                                          len(self._tx_queue))
+
+    def _collapse(self, requests):
+        """Drop the requests of a batch made redundant by later ones.
+
+        Like in the transmit queue, a command setting an absolute value makes
+        the commands before it on the same variable redundant. A read
+        repeating one since the last write is not sent again either. The
+        dropped requests are resolved with the outcome of the request that
+        made them redundant.
+
+        :rtype: list of the requests to send, in order
+        """
+        if not self._coalesce:
+            return list(requests)
+        kept = []
+        # Index in kept of the newest write, reads before it may be stale
+        last_write = -1
+        for request in requests:
+            if request.variable in READ_CMDS:
+                repeated = self._find(kept[last_write + 1:], request)
+                if repeated is not None:
+                    logger.debug('%s(%s) repeated in batch',
+                                 request.variable, request.option)
+                    self._stats.deduplicated[request.variable] += 1
+                    _forward(repeated.future, request.future)
+                else:
+                    kept.append(request)
+                continue
+
+            if request.variable in COALESCED_CMDS:
+                for other in [other for other in kept
+                              if other.target == request.target]:
+                    logger.debug('%s(%s) superseded in batch by %s(%s)',
+                                 other.variable, other.option,
+                                 request.variable, request.option)
+                    self._stats.superseded[other.variable] += 1
+                    kept.remove(other)
+                    _forward(request.future, other.future)
+            kept.append(request)
+            last_write = len(kept) - 1
+        return kept
+
+    def _enqueue_batch(self, requests):
+        for request in self._collapse(requests):
+            self._enqueue(request)
+
+    def _wake(self, request):
+        """Power on the amplifier for a request sent while in standby.
+
+        The request and any sent after it are held until the amplifier
+        reports being on, then sent in order, collapsed to their final
+        values.
+        """
+        logger.info('Powering on amplifier for %s(%s)', request.variable,
+                    request.option)
+        self._stats.wakeups += 1
+        request.held = True
+        self._wake_held = [request]
+        started = self._reactor.seconds()
+        power = Request('power_set', 0x01, self.REPLY_RETRIES)
+        power.held = True
+        self._enqueue(power)
+
+        def powered(future):
+            held, self._wake_held = self._wake_held, None
+            if future.exception() is not None:
+                logger.warning('Amplifier did not report being powered on, '
+                               'sending %d held commands anyway', len(held))
             else:
-                data_safe += pair
-        # Convert ascii string to binary
-        binary_variable = binascii.unhexlify(data_safe)
+                logger.debug('Amplifier on after %.1f s',
+                             self._reactor.seconds() - started)
+            for held_request in self._collapse(held):
+                self._enqueue(held_request)
 
-        binary_data = BYTE_STX
-        binary_data += BYTE_WRITE if cmd_type == 'W' else BYTE_READ
-        binary_data += binary_variable + BYTE_DLE_ETX
+        self._wait_for_state('power', True,
+                             self.POWER_ON_TIMEOUT).add_done_callback(powered)
 
-        logger.debug('WriteHex: %s', binascii.hexlify(binary_data))
-        self._write_cb(binary_data)
-        # Things are wonky if we try to write too quickly
-        time.sleep(0.06)
+    def _wait_for_state(self, field, value, timeout):
+        """Wait for the amplifier to report a value, from the reactor thread.
+
+        :rtype: :class:`concurrent.futures.Future` resolved with
+          :class:`True` once :attr:`state` has the value, or failing with
+          :class:`PrimareTimeoutError`
+        """
+        future = Future()
+        if getattr(self.state, field) == value:
+            future.set_result(True)
+            return future
+
+        waiter = (field, value, future)
+        self._state_waiters.append(waiter)
+
+        def expired():
+            if waiter in self._state_waiters:
+                self._state_waiters.remove(waiter)
+                future.set_exception(PrimareTimeoutError(
+                    'No {} state {!r} reported'.format(field, value)))
+
+        timer = self._reactor.callLater(timeout, expired)
+        future.add_done_callback(
+            lambda future: timer.cancel() if timer.active() else None)
+        return future
+
+    def _frame_interval(self, variable, option=None):
+        """Return the shortest time between two frames of a command."""
+        frame = command_frame(variable, option)
+        on_wire = len(frame) * BITS_PER_BYTE / float(BAUDRATE)
+        return self._tx_queue.gap + on_wire
+
+    def _plan_fade(self, start, target, duration):
+        """Plan the frames for a volume fade.
+
+        :rtype: list of (seconds from start, command, option)
+        """
+        steps = abs(target - start)
+        if steps == 0:
+            return []
+        interval = self._frame_interval('volume_set', target)
+        frames = max(1, min(steps, int(duration / interval) + 1))
+
+        plan = []
+        level = start
+        for index in range(frames):
+            offset = duration * index / (frames - 1) if frames > 1 else 0
+            progress = (index + 1) / float(frames)
+            next_level = start + int(round(progress * (target - start)))
+            if next_level == target:
+                plan.append((offset, 'volume_set', target))
+                break
+            elif next_level == level + 1:
+                plan.append((offset, 'volume_up', None))
+            elif next_level == level - 1:
+                plan.append((offset, 'volume_down', None))
+            else:
+                plan.append((offset, 'volume_set', next_level))
+            level = next_level
+        return plan
+
+    def _start_fade(self, target, duration, future):
+        self._cancel_fade()
+        start = self.state.volume
+        if start is None:
+            # Without a known volume there is nothing to fade from
+            plan = [(0, 'volume_set', target)]
+        else:
+            plan = self._plan_fade(start, target, duration)
+        if not plan:
+            future.set_result(True)
+            return
+        logger.debug('volume_fade - %d frames from %s to %d over %.1f s',
+                     len(plan), start, target, duration)
+        self._fade = VolumeFade(plan, future, self._reactor.seconds())
+        self._fade_step()
+
+    def _fade_step(self):
+        fade = self._fade
+        offset, variable, option = fade.steps.popleft()
+        request = Request(variable, option, self.REPLY_RETRIES)
+        request.fade = True
+        self._enqueue(request)
+
+        if not fade.steps:
+            self._fade = None
+            _forward(_chain(request.future,
+                            lambda reply: _volume_confirmed(option, reply)),
+                     fade.future)
+            return
+        delay = fade.started + fade.steps[0][0] - self._reactor.seconds()
+        fade.timer = self._reactor.callLater(max(delay, 0), self._fade_step)
+
+    def _cancel_fade(self):
+        fade, self._fade = self._fade, None
+        if fade is None:
+            return
+        logger.debug('volume_fade - cancelled')
+        if fade.timer is not None:
+            fade.timer.cancel()
+        fade.future.cancel()
+
+    def _is_current(self, request):
+        """Check if a set command would leave the amplifier as it is.
+
+        Only trusted if no other command on the same variable is queued or
+        waiting for its reply, as those may still change it.
+        """
+        field = REPLY_TABLE[request.target][0]
+        if getattr(self.state, field) != request.option:
+            return False
+        if field in self.state.provisional:
+            return False
+        if self._pending.get(request.target):
+            return False
+        return not any(queued.target == request.target
+                       for queued in self._tx_queue)
+
+    def _answered_by_queued(self, request):
+        """Check if a queued request makes resending a request redundant.
+
+        A queued read identical to the request, or a queued write of an
+        absolute value to the same variable, gives the answer the request
+        waits for. The request is resolved with the outcome of that one.
+        """
+        for queued in self._tx_queue:
+            writes = COALESCED_CMDS.issuperset([queued.variable,
+                                                request.variable])
+            if self._find([queued], request) is not None:
+                self._stats.deduplicated[request.variable] += 1
+            elif writes and queued.target == request.target:
+                self._stats.superseded[request.variable] += 1
+            else:
+                continue
+            logger.debug('%s(%s) not resent, %s(%s) is queued',
+                         request.variable, request.option, queued.variable,
+                         queued.option)
+            _forward(queued.future, request.future)
+            return True
+        return False
+
+    def _find(self, requests, request):
+        """Return the first of some requests identical to a request."""
+        for other in requests:
+            if (other.variable, other.option) == (request.variable,
+                                                  request.option):
+                return other
+        return None
+
+    def _in_flight(self, request):
+        """Return an identical request queued or waiting for its reply.
+
+        Requests followed by a queued write don't count, the write may
+        change the answer.
+        """
+        candidates = list(self._pending.get(request.reply, ()))
+        for queued in self._tx_queue:
+            if queued.variable in READ_CMDS:
+                candidates.append(queued)
+            else:
+                candidates = []
+        return self._find(candidates, request)
+
+    def _write(self, request):
+        """Write the frame of a request to the serial port."""
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('WriteHex: %s', binascii.hexlify(request.frame))
+        self._write_cb(request.frame)
+        request.sent_at = self._reactor.seconds()
+        if request.sent is not None:
+            _mark_sent(request)
+        stats = self._stats
+        stats.bytes_sent[request.variable] += len(request.frame)
+        stats.frames_sent[request.variable] += 1
+        stats.queue_wait.add(request.sent_at - request.queued_at)
+        if request.reply is None:
+            request.future.set_result(None)
+            return
+        self._pending.setdefault(request.reply,
+                                 collections.deque()).append(request)
+        request.timer = self._reactor.callLater(self.REPLY_TIMEOUT,
+                                                self._reply_timeout, request)
+
+    def _log_stats(self):
+        stats = self.stats()
+        round_trip = LatencyHistogram()
+        for histogram in self._stats.round_trip.values():
+            round_trip.merge(histogram)
+        logger.info('Link: %d frames sent, %d received (%d unsolicited), '
+                    '%d retries, %d timeouts, %d decode errors, queue depth '
+                    'max %d, queue wait p95 %s ms, round trip p95 %s ms, '
+                    'frame gap %.1f ms',
+                    sum(stats['frames_sent'].values()),
+                    sum(stats['frames_received'].values()),
+                    sum(stats['unsolicited'].values()),
+                    sum(stats['retries'].values()),
+                    sum(stats['timeouts'].values()),
+                    stats['decode_errors'], stats['max_queue_depth'],
+                    stats['queue_wait']['p95_ms'],
+                    round_trip.percentile(0.95),
+                    stats['pacing']['gap_ms'])
+        self._reactor.callLater(self._stats_interval, self._log_stats)
 
     # Public methods
+    def stats(self):
+        """Return statistics about the traffic on the serial link.
+
+        Counts bytes and frames sent and received per variable, commands
+        retried, timed out, skipped or superseded, the time commands spend in
+        the transmit queue, round trip latency histograms per command,
+        frames dropped by the decoder and the current frame gap.
+
+        :rtype: dict, suitable for JSON
+        """
+        stats = self._stats.as_dict(self._reactor.seconds())
+        stats['decode_errors'] = self._decoder.errors
+        stats['queue_depth'] = len(self._tx_queue)
+        stats['link'] = 'up' if self._link_lost_at is None else 'down'
+        stats['pacing'] = (self._pacing.as_dict() if self._pacing is not None
+                           else {'gap_ms': self._tx_queue.gap * 1000})
+        return stats
+
+    def restore(self, values):
+        """Start from the state remembered from an earlier run.
+
+        The values are served right away as provisional :attr:`state`, and
+        replaced as the amplifier reports its own. Sets are not skipped on
+        account of provisional values. A remembered identity is used right
+        away, :meth:`setup` only checks the model and software version once
+        done. Call before starting the reactor or from the reactor thread.
+
+        :param values: Values by :class:`PrimareState` field name
+        :type values: dict
+        """
+        for field, value in values.items():
+            if field == 'inputs':
+                # JSON keys are text
+                self.state.inputs = dict((int(index), name)
+                                         for index, name in value.items())
+            elif field in PrimareState.FIELDS and value is not None:
+                self.state.provide(field, value)
+        logger.debug('Restored %s', self.state)
+        self._load_timing()
+
+    def link_lost(self, reason):
+        """Hold all commands until :meth:`link_restored`.
+
+        Called by the transport, from the reactor thread, when the serial
+        link failed. Commands sent in the meantime are queued, coalesced like
+        any others, and commands waiting for their reply are sent again
+        once the link is back, except those not safe to repeat, which fail,
+        and those a queued command answers as well.
+        """
+        if self._link_lost_at is not None:
+            return
+        logger.warning('Link to amplifier lost: %s', reason)
+        self._link_lost_at = self._reactor.seconds()
+        self._stats.outages += 1
+        self._tx_queue.hold()
+        self._cancel_fade()
+
+        pending = sorted((request for requests in self._pending.values()
+                          for request in requests),
+                         key=lambda request: request.sent_at)
+        self._pending = {}
+        resend = []
+        for request in pending:
+            request.timer.cancel()
+            if not _is_idempotent(request.variable):
+                request.future.set_exception(PrimareError(
+                    'Link lost waiting for reply to {}'.format(
+                        request.variable)))
+            elif not self._answered_by_queued(request):
+                request.queued_at = self._link_lost_at
+                resend.append(request)
+        self._tx_queue.requeue(resend)
+        # The amplifier may come back with defaults, and the mute state
+        # can't be read back, so don't skip mute_set on account of it
+        self.state.verbose = None
+        if self.state.mute is not None:
+            self.state.provisional.add('mute')
+
+    def link_restored(self):
+        """Resync the state and send the commands held since the link was lost.
+
+        Called by the transport, from the reactor thread, once the serial
+        link works again. Only the state that may have changed meanwhile is
+        queried, ahead of the held commands.
+
+        :rtype: :class:`concurrent.futures.Future` resolved once the state
+          has been resynced
+        """
+        lost_at, self._link_lost_at = self._link_lost_at, None
+        future = Future()
+        if lost_at is None:
+            future.set_result(None)
+            return future
+
+        requests = []
+        for command in self.RESYNC_CMDS:
+            variable, option = (command if isinstance(command, tuple)
+                                else (command, None))
+            # A resync left over from an earlier attempt is moved ahead
+            # instead, repeated outages don't pile up requests
+            queued = self._tx_queue.take(
+                lambda queued: (queued.variable, queued.option) == (
+                    variable, option))
+            if queued:
+                request = queued[0]
+                for other in queued[1:]:
+                    self._stats.deduplicated[variable] += 1
+                    _forward(request.future, other.future)
+            else:
+                request = Request(variable, option, self.REPLY_RETRIES)
+            request.retries = self.REPLY_RETRIES
+            request.queued_at = self._reactor.seconds()
+            requests.append(request)
+        self._tx_queue.requeue(requests)
+        self._tx_queue.resume()
+
+        def resynced(gathered):
+            # The link is back as soon as the amplifier answers at all, e.g.
+            # it ignores volume reads in standby
+            if any(request.future.exception() is None
+                   for request in requests):
+                recovery = self._reactor.seconds() - lost_at
+                self._stats.recovery.add(recovery)
+                logger.info('Link to amplifier restored after %.1f s',
+                            recovery)
+            if gathered.exception() is not None:
+                logger.warning('Resyncing amplifier failed: %s',
+                               gathered.exception())
+                future.set_exception(gathered.exception())
+            else:
+                future.set_result(None)
+
+        _gather([request.future for request in requests]).add_done_callback(
+            resynced)
+        return future
+
+    def add_listener(self, listener):
+        """Register a callable to be told about changes to :attr:`state`.
+
+        The listener is called from the reactor thread with the field name
+        and new value whenever the amplifier reports a value different from
+        the one we knew, whether in reply to our own commands or not.
+        """
+        self._listeners.append(listener)
+
+    def submit(self, variable, option=None):
+        """Send any PRIMARE_CMD command to the amplifier.
+
+        Safe to call from any thread: the command is handed to the reactor,
+        and the caller gets a future instead of waiting for the serial line.
+
+        :param variable: String key for the PRIMARE_CMD dict
+        :type variable: string
+        :param option: Value of the 'YY' byte needed for some of the commands
+        :type option: int
+        :rtype: :class:`concurrent.futures.Future` resolved with the value
+          replied
+        """
+        return self._send_command(variable, option)
+
+    def call(self, method, *args):
+        """Call a public method and tell when its commands have gone out.
+
+        Lets a caller feeding the amplifier on behalf of others, like
+        :mod:`primare_daemon`, take turns at the transmit queue without
+        waiting for replies. Call from the reactor thread.
+
+        :param method: Name of the public method
+        :type method: string
+        :rtype: tuple of the method's result and a
+          :class:`concurrent.futures.Future` resolved once every command the
+          call sent has been written, or answered without being written,
+          e.g. skipped or superseded. Commands sent later on behalf of the
+          call, like the steps of a volume fade, are not waited for
+        """
+        self._tracked = []
+        try:
+            result = getattr(self, method)(*args)
+        finally:
+            tracked, self._tracked = self._tracked, None
+        return result, _gather([request.sent for request in tracked])
+
+    def batch(self, commands):
+        """Send several PRIMARE_CMD commands to the amplifier as one unit.
+
+        The commands are handed to the transmit queue together, in the order
+        given, so they go out back to back with only the frame gap between
+        them. Commands made redundant by later ones in the same batch are
+        not sent, e.g. a ``mute_toggle`` followed by a ``mute_set`` or two
+        ``volume_set``, they get the reply of the command replacing them.
+        Safe to call from any thread.
+
+        :param commands: PRIMARE_CMD keys, or (key, option) tuples for the
+          commands needing the 'YY' byte
+        :type commands: iterable
+        :rtype: :class:`concurrent.futures.Future` resolved with the list of
+          replies, in the order of ``commands``, or failing with
+          :class:`PrimareBatchError` if any of the commands failed
+        """
+        requests = []
+        for command in commands:
+            if isinstance(command, (tuple, list)):
+                variable, option = command
+            else:
+                variable, option = command, None
+            requests.append(Request(variable, option, self.REPLY_RETRIES))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('batch(%s)', ', '.join(
+                request.variable for request in requests))
+        self._track(requests)
+        self._reactor.callFromThread(self._enqueue_batch, requests)
+        return _gather([request.future for request in requests])
+
     def setup(self):
         """Setup the amplifier.
 
         Set the receiver to a known state and print information about the
-        amplifier
+        amplifier. Returns right away, the commands are sent in the
+        background.
+
+        :rtype: :class:`concurrent.futures.Future` resolved once the
+          amplifier is in the known state
         """
-        self._set_device_to_known_state()
-        self._print_device_info()
+        future = Future()
+        self._reactor.callFromThread(_run_steps,
+                                     self._set_device_to_known_state(),
+                                     future)
+        future.add_done_callback(lambda future: self._print_device_info())
+        return future
 
     def power_on(self):
         """Power on the Primare amplifier."""
-        self._send_command('power_set', '01')
+        return self._send_command('power_set', 0x01)
 
     def power_off(self):
         """Power off the Primare amplifier."""
-        self._send_command('power_set', '00')
+        return self._send_command('power_set', 0x00)
 
     def power_toggle(self):
         """Toggle the power to the Primare amplifier.
 
-        :rtype: :class:True if amplifier turned on as result of toggle,
-          :class:False otherwise
+        :rtype: :class:`concurrent.futures.Future` resolved with the reply
         """
-        self._send_command('power_toggle')
+        return self._send_command('power_toggle')
 
     def input_set(self, source):
-        """Set the current input used by the Primare amplifier."""
-        self._send_command('input_set', '{:02X}'.format(int(source) % 8))
-        self.inputname_current_get()
+        """Set the current input used by the Primare amplifier.
+
+        :param source: Number of the input, or its name as shown by
+          :meth:`input_names`, e.g. "CD"
+        :raises PrimareError: if there is no input with that name
+        """
+        return _chain(self.batch(self._input_commands(
+            'input_set', self._input_index(source))),
+            lambda replies: replies[0])
 
     def input_next(self):
         """Select next input on device."""
-        self._send_command('input_next')
-        self.inputname_current_get()
+        return _chain(self.batch(self._input_commands('input_next')),
+                      lambda replies: replies[0])
 
     def input_prev(self):
         """Select previous input on device."""
-        self._send_command('input_prev')
-        self.inputname_current_get()
+        return _chain(self.batch(self._input_commands('input_prev')),
+                      lambda replies: replies[0])
+
+    def input_names(self):
+        """Return the names of the inputs fetched by :meth:`setup`.
+
+        :rtype: dict of input names by index
+        """
+        return dict(self.state.inputs)
 
     def volume_get(self):
         """
@@ -360,9 +1999,32 @@ class PrimareController():
         :class:`None`:
         Volume is unknown.
 
-        :rtype: int in range [0..100] or :class:`None`
+        :rtype: :class:`concurrent.futures.Future` resolved with an int in
+          range [0..100]
+        """
+        return _chain(self._send_command('volume_get'),
+                      self._volume_from_primare)
+
+    def volume_state(self):
+        """Return the last volume reported by the amplifier.
+
+        Answered from :attr:`state` without any serial I/O. The volume last
+        asked for is returned while the amplifier is at the level it maps to,
+        e.g. 40 after ``volume_set(40)`` rather than 41.
+
+        :rtype: int in range [0..100] or :class:`None` if unknown
         """
-        self._send_command('volume_get')
+        if self.state.volume is None:
+            return None
+        return self._volume_from_primare(self.state.volume)
+
+    def mute_state(self):
+        """Return the last mute state reported by the amplifier.
+
+        :rtype: :class:`True` if muted, :class:`False` if unmuted,
+          :class:`None` if unknown
+        """
+        return self.state.mute
 
     def volume_set(self, volume):
         """
@@ -370,32 +2032,47 @@ class PrimareController():
 
         :param volume: Volume in the range [0..100]
         :type volume: int
-        :rtype: :class:`True` if success, :class:`False` if failure
-        """
-        target_primare_volume = int(round(volume * self.VOLUME_LEVELS / 100.0))
-        logger.debug("volume_set - target volume: {}".format(
-            target_primare_volume))
-        self._send_command('volume_set',
-                           '{:02X}'.format(target_primare_volume))
-        # There's a crazy bug where setting the volume to 65 and above will
-        # generate a reply indicating a volume of 1 less!?
-        # Hence the work-around
-        # if reply and (int(reply, 16) == target_primare_volume or
-        #              int(reply, 16) == target_primare_volume - 1):
-        #    self._volume = volume
-        #    logger.debug("LASSE - target volume SUCCESS, _volume: %d",
-        #                 self._volume)
-        #    return True
-        # else:
-        #    return False
+        :rtype: :class:`concurrent.futures.Future` resolved with
+          :class:`True` if success, :class:`False` if failure
+        """
+        target_primare_volume = self._volume_to_primare(volume)
+        logger.debug("volume_set - target volume: %s", target_primare_volume)
+        self._requested_volume = int(volume)
+
+        return _chain(self._send_command('volume_set', target_primare_volume),
+                      lambda reply: _volume_confirmed(target_primare_volume,
+                                                      reply))
+
+    def volume_fade(self, volume, duration):
+        """
+        Fade the volume of the amplifier to a new level.
+
+        The fade uses as few frames as the serial link allows for a smooth
+        change over ``duration`` seconds. It is cancelled by any other volume
+        command, and a new fade starts from wherever this one got to.
+
+        :param volume: Volume in the range [0..100]
+        :type volume: int
+        :param duration: Length of the fade in seconds
+        :type duration: float
+        :rtype: :class:`concurrent.futures.Future` resolved with
+          :class:`True` if the amplifier confirmed the final volume,
+          cancelled if the fade was interrupted
+        """
+        future = Future()
+        self._requested_volume = int(volume)
+        self._reactor.callFromThread(self._start_fade,
+                                     self._volume_to_primare(volume),
+                                     duration, future)
+        return future
 
     def volume_up(self):
         """Increase volume by one step."""
-        self._send_command('volume_up')
+        return self._send_command('volume_up')
 
     def volume_down(self):
         """Decrease volume by one step."""
-        self._send_command('volume_down')
+        return self._send_command('volume_down')
 
     def balance_adjust(self, adjustment):
         """Modify volume balance settings."""
@@ -412,11 +2089,21 @@ class PrimareController():
 
     def mute_toggle(self):
         """Toggle mute on device."""
-        self._send_command('mute_toggle')
+        return self._send_command('mute_toggle')
 
     def mute_get(self):
-        """Get mute state of the mixer."""
-        self._send_command('mute_toggle')
+        """Get mute state of the mixer.
+
+        The protocol has no command reading the mute state, the answer is
+        the state last reported by the amplifier, see :meth:`mute_state`.
+
+        :rtype: :class:`concurrent.futures.Future` resolved with
+          :class:`True` if muted, :class:`False` if unmuted,
+          :class:`None` if unknown
+        """
+        future = Future()
+        future.set_result(self.state.mute)
+        return future
 
     def mute_set(self, mute):
         """
@@ -424,19 +2111,21 @@ class PrimareController():
 
         :param mute: :class:`True` to mute, :class:`False` to unmute
         :type mute: bool
-        :rtype: :class:`True` if success, :class:`False` if failure
+        :rtype: :class:`concurrent.futures.Future` resolved with
+          :class:`True` if success, :class:`False` if failure
         """
-        mute_value = '01' if mute is True else '00'
-        self._send_command('mute_set', mute_value)
+        mute_value = 0x01 if mute is True else 0x00
+        return _chain(self._send_command('mute_set', mute_value),
+                      lambda muted: muted == bool(mute_value))
 
     def dim_cycle(self):
         """Cycle through the different dim levels on device."""
-        self._send_command('dim_cycle')
+        return self._send_command('dim_cycle')
 
     def dim_set(self, level):
         """Select a specific dim level on device."""
         if level >= 0:
-            self._send_command('dim_set', '{:02X}'.format(int(level) % 4))
+            return self._send_command('dim_set', int(level) % 4)
 
     def verbose_toggle(self):
         """Toggle verbose mode on device.
@@ -444,16 +2133,16 @@ class PrimareController():
         When verbose is active, device will respond to commands and inform
         about changes to variables.
         """
-        self._send_command('verbose_toggle')
+        return self._send_command('verbose_toggle')
 
     def verbose_set(self, verbose):
         """Enable or disables verbose mode on device."""
-        verbose_value = '01' if verbose is True else '00'
-        self._send_command('verbose_set', verbose_value)
+        verbose_value = 0x01 if verbose is True else 0x00
+        return self._send_command('verbose_set', verbose_value)
 
     def menu_toggle(self):
         """Enter or leaves menu of device."""
-        self._send_command('menu_toggle')
+        return self._send_command('menu_toggle')
 
     def menu_set(self, menu):
         """Control menus on the amplifier.
@@ -461,7 +2150,7 @@ class PrimareController():
         Allow closing of the menu or stepping into or out of a submenu if the
         menu is active.
         """
-        self._send_command('menu_set', '{:02X}'.format(int(menu)))
+        return self._send_command('menu_set', int(menu))
 
     def remote_cmd(self, cmd):
         """Send an IR command to the device.
@@ -474,38 +2163,38 @@ class PrimareController():
 
     def ir_input_toggle(self):
         """Toggle IR input source on device between front and back."""
-        self._send_command('ir_input_toggle')
+        return self._send_command('ir_input_toggle')
 
     def ir_input_set(self, ir_input):
         """Select either front or back as current IR input source on device."""
-        ir_value = '01' if ir_input is True else '00'
-        self._send_command('ir_input_set', ir_value)
+        ir_value = 0x01 if ir_input is True else 0x00
+        return self._send_command('ir_input_set', ir_value)
 
     def recall_factory_settings(self):
         """Perform a factory reset.
 
         Restore default values and restart the device.
         """
-        self._send_command('recall_factory_settings')
+        return self._send_command('recall_factory_settings')
 
     def manufacturer_get(self):
         """Read manufacturer name from the device."""
-        self._send_command('manufacturer_get')
+        return self._send_command('manufacturer_get')
 
     def modelname_get(self):
         """Read model name from device."""
-        self._send_command('modelname_get')
+        return self._send_command('modelname_get')
 
     def swversion_get(self):
         """Read current software version from device."""
-        self._send_command('swversion_get')
+        return self._send_command('swversion_get')
 
     def inputname_current_get(self):
         """Read current input name from device."""
-        self._send_command('inputname_current_get')
+        return self._send_command('inputname_current_get')
 
     def inputname_specific_get(self, input):
         """Read specified input name from device."""
         if input >= 0:
-            self._send_command('inputname_specific_get',
-                               '{:02X}'.format((int(input) % 8)))
+            return self._send_command('inputname_specific_get',
+                                      int(input) % 8)
@@ -0,0 +1,353 @@
+"""Virtual Primare amplifier on a pseudo-terminal.
+
+This module simulates a Primare I22/I32 amplifier speaking the binary RS232
+protocol described in :mod:`primare_serial`, so the controller, the
+transports and the mixer can be exercised without the real hardware. Point
+the mixer or the CLI at the path printed on startup::
+
+    python -m mopidy_primare.primare_simulator --response-delay 0.02
+
+The simulator honours the PRIMARE_CMD semantics, sends verbose replies and
+unsolicited updates, reproduces the volume reply that is one step low at
+65 and above, and can model 4800 baud byte timing, slow responses, dropped
+bytes and line noise.
+"""
+
+from __future__ import unicode_literals
+
+import logging
+import os
+import random
+import select
+import threading
+import time
+import tty
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from mopidy_primare.primare_clock import monotonic
+from mopidy_primare.primare_serial import (
+    BAUDRATE, BITS_PER_BYTE, BYTE_DLE, BYTE_DLE_ETX, BYTE_READ, BYTE_STX,
+    FrameDecoder)
+
+logger = logging.getLogger(__name__)
+
+
+def reply_frame(variable, value=b''):
+    """Build a frame as sent by the amplifier, escaping any DLE."""
+    payload = bytes(bytearray([variable])) + value
+    return BYTE_STX + payload.replace(BYTE_DLE, BYTE_DLE + BYTE_DLE) + \
+        BYTE_DLE_ETX
+
+
+class PrimareSimulator(object):
+    """A simulated amplifier attached to the slave end of a pty."""
+
+    VOLUME_LEVELS = 79
+    # Volume from which the reply to a volume set is one step low
+    VOLUME_QUIRK_LEVEL = 65
+    INPUTS = 8
+    DIM_LEVELS = 4
+    BALANCE_CENTER = 10
+    BALANCE_MAX = 20
+    # Only power and verbose can be written in standby, nothing works while
+    # the amplifier is powering up
+    STANDBY_VARIABLES = (0x01, 0x0d)
+
+    def __init__(self, byte_time=BITS_PER_BYTE / float(BAUDRATE),
+                 response_delay=0.01, power_on_delay=0.5, drop_rate=0.0,
+                 noise_rate=0.0, seed=None, model='i22', swversion='1.07'):
+        """Initialization.
+
+        :param byte_time: Seconds it takes to send one byte, 0 to send
+          replies as fast as possible
+        :param response_delay: Seconds between receiving a command and
+          starting to send the reply
+        :param power_on_delay: Seconds the amplifier needs to power up,
+          commands are ignored meanwhile
+        :param drop_rate: Probability of each sent byte being lost
+        :param noise_rate: Probability of each sent byte being garbled
+        :param seed: Seed for the random drops and noise
+        """
+        self.byte_time = byte_time
+        self.response_delay = response_delay
+        self.power_on_delay = power_on_delay
+        self.drop_rate = drop_rate
+        self.noise_rate = noise_rate
+        self._random = random.Random(seed)
+
+        self.manufacturer = 'Primare'
+        self.model = model
+        self.swversion = swversion
+        self.reset()
+
+        self.port = None
+        self._master = None
+        self._slave = None
+        self._running = False
+        self._threads = []
+        self._outgoing = queue.Queue()
+        self._decoder = FrameDecoder()
+        self._booted_at = 0
+        # Every command frame received, for tests and benchmarks
+        self.received = []
+
+    def reset(self):
+        """Restore the factory settings."""
+        self.power = True
+        self.input = 1
+        self.volume = 20
+        self.balance = self.BALANCE_CENTER
+        self.mute = False
+        self.dim = 0
+        self.verbose = False
+        self.menu = False
+        self.ir_input = False
+        self.input_names = ['INPUT{}'.format(index)
+                            for index in range(self.INPUTS)]
+        self.input_names[1:4] = ['CD', 'DAC', 'TUNER']
+
+    def open(self):
+        """Open the pty and start answering commands.
+
+        :rtype: string, the path of the serial port to connect to
+        """
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)
+        self.port = os.ttyname(self._slave)
+        self._running = True
+        for target in (self._read_loop, self._write_loop):
+            thread = threading.Thread(target=target,
+                                      name='PrimareSimulator')
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+        logger.info('Primare simulator listening on %s', self.port)
+        return self.port
+
+    def close(self):
+        """Stop the simulator and close the pty."""
+        self._running = False
+        self._outgoing.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        for fd in (self._master, self._slave):
+            if fd is not None:
+                os.close(fd)
+        self._master = self._slave = None
+
+    # Things a user could do on the amplifier itself
+    def turn_knob(self, steps, interval=0.05):
+        """Turn the volume knob, reporting every step if verbose is on."""
+        due = monotonic()
+        for _ in range(abs(steps)):
+            step = 1 if steps > 0 else -1
+            self.volume = self._clamp_volume(self.volume + step)
+            due += interval
+            self._notify(0x03, self.volume, due)
+
+    def press_mute(self):
+        """Press the mute button."""
+        self.mute = not self.mute
+        self._notify(0x09, int(self.mute))
+
+    def press_power(self):
+        """Press the power button."""
+        self.power = not self.power
+        if self.power:
+            self._booted_at = monotonic() + self.power_on_delay
+        self._notify(0x01, int(self.power), self._booted_at)
+
+    # Protocol handling
+    def _read_loop(self):
+        while self._running:
+            readable = select.select([self._master], [], [], 0.1)[0]
+            if not readable:
+                continue
+            try:
+                data = os.read(self._master, 1024)
+            except OSError:
+                break
+            # Model the time the command takes to arrive at 4800 baud
+            received = monotonic() + len(data) * self.byte_time
+            for frame in self._decoder.feed(data):
+                self.received.append(frame)
+                self._handle(frame, received)
+
+    def _write_loop(self):
+        while True:
+            item = self._outgoing.get()
+            if item is None or not self._running:
+                break
+            due, data = item
+            delay = due - monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            data = self._corrupt(data)
+            if data:
+                os.write(self._master, data)
+            if self.byte_time:
+                time.sleep(len(data) * self.byte_time)
+
+    def _corrupt(self, data):
+        if not self.drop_rate and not self.noise_rate:
+            return data
+        corrupted = bytearray()
+        for byte in bytearray(data):
+            if self._random.random() < self.drop_rate:
+                continue
+            if self._random.random() < self.noise_rate:
+                byte = self._random.randint(0, 0xff)
+            corrupted.append(byte)
+        return bytes(corrupted)
+
+    def _send(self, frame, due=None):
+        if due is None:
+            due = monotonic() + self.response_delay
+        self._outgoing.put((due, frame))
+
+    def _notify(self, variable, value, due=None):
+        """Report a change if verbose is on."""
+        if self.verbose:
+            self._send(reply_frame(variable, bytes(bytearray([value]))), due)
+
+    def _reply_text(self, variable, text):
+        if self.verbose:
+            self._send(reply_frame(variable, text.encode('latin-1')))
+
+    def _clamp_volume(self, volume):
+        return max(0, min(self.VOLUME_LEVELS, volume))
+
+    def _handle(self, frame, received):
+        if len(frame) < 2:
+            return
+        command, variable = frame[0:1], bytearray(frame[1:2])[0]
+        value = bytearray(frame[2:3])[0] if len(frame) > 2 else 0
+
+        booting = received < self._booted_at
+        standby = not self.power and command != BYTE_READ and \
+            variable & 0x7f not in self.STANDBY_VARIABLES
+        if booting or standby:
+            logger.debug('Simulator ignoring %r', frame)
+            return
+        if command == BYTE_READ:
+            self._handle_read(variable, value)
+        else:
+            self._handle_write(variable, value)
+
+    def _handle_read(self, variable, value):
+        if variable == 0x13:
+            self.reset()
+        elif variable == 0x14:
+            self._reply_text(0x14, self.input_names[self.input])
+        elif variable == 0x94:
+            index = value % self.INPUTS
+            if self.verbose:
+                name = self.input_names[index].encode('latin-1')
+                self._send(reply_frame(
+                    0x94, b''.join([bytes(bytearray([index])), name])))
+        elif variable == 0x15:
+            self._reply_text(0x15, self.manufacturer)
+        elif variable == 0x16:
+            self._reply_text(0x16, self.model)
+        elif variable == 0x17:
+            self._reply_text(0x17, self.swversion)
+
+    def _values(self):
+        return {
+            0x01: int(self.power),
+            0x02: self.input,
+            0x03: self.volume,
+            0x04: self.balance,
+            0x09: int(self.mute),
+            0x0a: self.dim,
+            0x0d: int(self.verbose),
+            0x0e: int(self.menu),
+            0x12: int(self.ir_input),
+        }
+
+    def _handle_write(self, variable, value):
+        absolute = variable & 0x80 != 0
+        variable &= 0x7f
+        signed = value - 0x100 if value & 0x80 else value
+
+        if variable == 0x01:
+            power = bool(value) if absolute else not self.power
+            if power and not self.power:
+                self._booted_at = monotonic() + self.power_on_delay
+            self.power = power
+            self._notify(0x01, int(self.power),
+                         max(self._booted_at, monotonic()))
+            return
+        elif variable == 0x02:
+            self.input = (value if absolute else self.input + signed) % \
+                self.INPUTS
+        elif variable == 0x03:
+            self.volume = self._clamp_volume(value if absolute else
+                                             self.volume + signed)
+            if absolute and self.volume >= self.VOLUME_QUIRK_LEVEL:
+                # The real amplifier replies with one step less
+                self._notify(0x03, self.volume - 1)
+                return
+        elif variable == 0x04:
+            self.balance = max(0, min(self.BALANCE_MAX, value if absolute
+                                      else self.balance + signed))
+        elif variable == 0x09:
+            self.mute = bool(value) if absolute else not self.mute
+        elif variable == 0x0a:
+            self.dim = (value if absolute else self.dim + 1) % \
+                self.DIM_LEVELS
+        elif variable == 0x0d:
+            self.verbose = bool(value) if absolute else not self.verbose
+        elif variable == 0x0e:
+            self.menu = bool(value) if absolute else not self.menu
+        elif variable == 0x0f:
+            # IR remote commands are acknowledged without a reply
+            return
+        elif variable == 0x12:
+            self.ir_input = bool(value) if absolute else not self.ir_input
+        else:
+            return
+        self._notify(variable, self._values()[variable])
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Simulate a Primare amplifier on a pseudo-terminal.')
+    parser.add_argument('--byte-time', type=float,
+                        default=BITS_PER_BYTE / float(BAUDRATE),
+                        help='Seconds per byte sent, 0 for no delay.')
+    parser.add_argument('--response-delay', type=float, default=0.01,
+                        help='Seconds before the amplifier replies.')
+    parser.add_argument('--power-on-delay', type=float, default=0.5,
+                        help='Seconds the amplifier needs to power up.')
+    parser.add_argument('--drop-rate', type=float, default=0.0,
+                        help='Probability of dropping each sent byte.')
+    parser.add_argument('--noise-rate', type=float, default=0.0,
+                        help='Probability of garbling each sent byte.')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='Seed for dropped bytes and noise.')
+    parser.add_argument('-d', '--debug', action='store_true',
+                        help='Enable debug output.')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.INFO)
+    simulator = PrimareSimulator(byte_time=args.byte_time,
+                                 response_delay=args.response_delay,
+                                 power_on_delay=args.power_on_delay,
+                                 drop_rate=args.drop_rate,
+                                 noise_rate=args.noise_rate,
+                                 seed=args.seed)
+    print(simulator.open())
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    simulator.close()
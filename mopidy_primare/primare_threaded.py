@@ -0,0 +1,302 @@
+"""Interface to Primare amplifiers using pyserial and plain threads.
+
+This module provides what :class:`PrimareController` needs from an I/O loop
+for users that don't run a Twisted reactor, such as the Mopidy mixer: a
+small single-threaded reactor for timers and cross-thread calls, a
+serial transport feeding the controller from a reader thread, and a
+supervisor reconnecting the transport when the link fails.
+"""
+
+from __future__ import unicode_literals
+
+import heapq
+import itertools
+import logging
+import os
+import threading
+
+from mopidy_primare.primare_clock import DelayedCall, monotonic
+
+logger = logging.getLogger(__name__)
+
+
+class ThreadedReactor(object):
+    """Run timers and calls from other threads on a single thread."""
+
+    def __init__(self, name='PrimareReactor'):
+        """Initialization."""
+        self._name = name
+        self._calls = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._running = False
+        self._thread = None
+
+    def seconds(self):
+        """Return the current time of the reactor's monotonic clock."""
+        return monotonic()
+
+    def callLater(self, delay, func, *args, **kwargs):
+        """Run ``func`` on the reactor thread in ``delay`` seconds.
+
+        :rtype: :class:`DelayedCall`
+        """
+        call = DelayedCall(self.seconds() + max(delay, 0), func, args,
+                           kwargs)
+        with self._condition:
+            heapq.heappush(self._calls,
+                           (call.time, next(self._sequence), call))
+            self._condition.notify()
+        return call
+
+    def callFromThread(self, func, *args, **kwargs):
+        """Run ``func`` on the reactor thread as soon as possible."""
+        self.callLater(0, func, *args, **kwargs)
+
+    def inReactorThread(self):
+        """Return :class:`True` if called from the reactor thread."""
+        return threading.current_thread() is self._thread
+
+    def start(self):
+        """Start running calls on a daemon thread."""
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name=self._name)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stop the reactor thread, dropping any pending calls."""
+        with self._condition:
+            self._running = False
+            self._calls = []
+            self._condition.notify()
+        if self._thread is not None and not self.inReactorThread():
+            self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._running:
+                    if self._calls:
+                        delay = self._calls[0][0] - self.seconds()
+                        if delay <= 0:
+                            break
+                        self._condition.wait(delay)
+                    else:
+                        self._condition.wait()
+                if not self._running:
+                    return
+                call = heapq.heappop(self._calls)[2]
+            try:
+                call.run()
+            except Exception:
+                logger.exception('Primare reactor: Unhandled error in %r',
+                                 call._func)
+
+
+class SerialTransport(object):
+    """Serial connection to the amplifier using pyserial.
+
+    Writes happen on the calling thread, which is the reactor thread when
+    used as the controller's writer. Data is read on a separate thread and
+    handed to ``reader`` on the reactor thread.
+    """
+
+    # Primare serial link config
+    BAUDRATE = 4800
+
+    def __init__(self, port, reactor, baudrate=BAUDRATE, capture=None):
+        """Initialization.
+
+        :param capture: :class:`CaptureWriter` recording the traffic, if any
+        """
+        self.port = port
+        self._reactor = reactor
+        self._baudrate = baudrate
+        self._capture = capture
+        self._serial = None
+        self._reader = None
+        self._lost = None
+        self._thread = None
+
+    def open(self, reader, lost=None):
+        """Open the serial port and pass received data to ``reader``.
+
+        :param lost: Called on the reactor thread with the error if reading
+          fails, e.g. because the device was unplugged
+        """
+        import serial
+
+        self._reader = reader
+        self._lost = lost
+        self._serial = serial.serial_for_url(self.port,
+                                             baudrate=self._baudrate,
+                                             timeout=0.5)
+        self._thread = threading.Thread(target=self._read_loop,
+                                        name='PrimareSerialReader')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def write(self, data):
+        """Write raw bytes to the serial port."""
+        connection = self._serial
+        if connection is None:
+            raise IOError('{} is not open'.format(self.port))
+        if self._capture is not None:
+            self._capture.sent(data)
+        connection.write(data)
+
+    def close(self):
+        """Stop reading and close the serial port."""
+        connection, self._serial = self._serial, None
+        if connection is None:
+            return
+        if hasattr(connection, 'cancel_read'):
+            connection.cancel_read()
+        if self._thread is not None:
+            self._thread.join()
+        connection.close()
+
+    def _read_loop(self):
+        connection = self._serial
+        while self._serial is connection:
+            try:
+                data = connection.read(connection.in_waiting or 1)
+            except (IOError, OSError) as e:
+                if self._serial is connection and self._lost is not None:
+                    self._reactor.callFromThread(self._lost, e)
+                return
+            if data:
+                if self._capture is not None:
+                    self._capture.received(data)
+                self._reactor.callFromThread(self._reader, data)
+
+
+class SerialSupervisor(object):
+    """Keep the serial link to the amplifier up.
+
+    Stands between a :class:`SerialTransport` and the controller, which it
+    writes for. The link counts as lost when writing or reading fails, the
+    device node disappears, e.g. a USB serial adapter being unplugged, or
+    the controller reports the amplifier stopped replying. The transport is
+    then reopened after a delay growing with every failed attempt, until
+    the amplifier answers again. The controller holds its commands while
+    the link is down and resyncs once it is back.
+    """
+
+    # Seconds to wait before reconnecting, doubled per failed attempt
+    RETRY_MIN = 0.5
+    RETRY_MAX = 30
+    # Seconds between checks that the device node still exists
+    WATCH_INTERVAL = 2
+
+    def __init__(self, transport, reactor):
+        """Initialization."""
+        self._transport = transport
+        self._reactor = reactor
+        self._controller = None
+        self._connected = False
+        self._closed = False
+        self._retry_delay = self.RETRY_MIN
+        self._retry = None
+        self._watch = None
+
+    @property
+    def connected(self):
+        """:class:`True` while the transport is open and working."""
+        return self._connected
+
+    def start(self, controller):
+        """Open the transport for a controller, from any thread."""
+        self._controller = controller
+        self._reactor.callFromThread(self._connect)
+
+    def write(self, data):
+        """Write raw bytes, reporting the link as lost if that fails."""
+        try:
+            self._transport.write(data)
+        except (IOError, OSError) as e:
+            # Let the controller finish handling the write first
+            self._reactor.callFromThread(
+                self.lost, 'Writing failed: {}'.format(e))
+
+    def lost(self, reason):
+        """Report the link as lost and reconnect, from the reactor thread."""
+        if self._closed or not self._connected:
+            return
+        self._connected = False
+        if self._watch is not None:
+            self._watch.cancel()
+            self._watch = None
+        self._controller.link_lost(reason)
+        self._disconnect()
+        self._schedule_retry()
+
+    def close(self):
+        """Stop reconnecting and close the transport."""
+        self._closed = True
+        for call in (self._retry, self._watch):
+            if call is not None:
+                call.cancel()
+        self._disconnect()
+
+    def _connect(self):
+        self._retry = None
+        if self._closed:
+            return
+        try:
+            self._transport.open(self._controller._primare_reader,
+                                 lost=self._read_failed)
+        except (IOError, OSError) as e:
+            reason = 'Opening {} failed: {}'.format(self._transport.port, e)
+            logger.debug('Primare link: %s', reason)
+            self._controller.link_lost(reason)
+            self._schedule_retry()
+            return
+        logger.info('Primare link: Connected to %s', self._transport.port)
+        self._connected = True
+        self._controller.link_restored().add_done_callback(self._resynced)
+        self._watch_device()
+
+    def _resynced(self, future):
+        # Opening the port says nothing about the amplifier, e.g. one
+        # switched off at the mains, the delays keep growing until it
+        # answers
+        error = future.exception()
+        results = getattr(error, 'results', [])
+        if error is None or not all(isinstance(result, Exception)
+                                    for result in results):
+            self._retry_delay = self.RETRY_MIN
+
+    def _disconnect(self):
+        try:
+            self._transport.close()
+        except (IOError, OSError) as e:
+            logger.debug('Primare link: Closing failed: %s', e)
+
+    def _read_failed(self, error):
+        self.lost('Reading failed: {}'.format(error))
+
+    def _schedule_retry(self):
+        if self._closed:
+            return
+        logger.info('Primare link: Reconnecting to %s in %.1f s',
+                    self._transport.port, self._retry_delay)
+        self._retry = self._reactor.callLater(self._retry_delay,
+                                              self._connect)
+        self._retry_delay = min(self._retry_delay * 2, self.RETRY_MAX)
+
+    def _watch_device(self):
+        """Check the device node is still there, for ports that are files."""
+        self._watch = None
+        port = self._transport.port
+        if not self._connected or not os.path.isabs(str(port)):
+            return
+        if not os.path.exists(port):
+            self.lost('{} disappeared'.format(port))
+            return
+        self._watch = self._reactor.callLater(self.WATCH_INTERVAL,
+                                              self._watch_device)
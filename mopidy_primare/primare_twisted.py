@@ -6,13 +6,14 @@ amplifier.
 """
 
 import click
+import json
 import logging
 
 from threading import Thread
 
 from twisted.internet.serialport import SerialPort
 from twisted.protocols.basic import LineReceiver
-from twisted.internet import reactor
+from twisted.internet import reactor, threads
 
 # from twisted.logger import (
 #     FilteringLogObserver,
@@ -32,13 +33,18 @@ from twisted.internet import reactor
 #     )
 # ])
 
-from primare_serial import PrimareController
+from mopidy_primare.primare_cache import DeviceCache, attach
+from mopidy_primare.primare_capture import RX, TX, CaptureWriter
+from mopidy_primare.primare_serial import (
+    PRIMARE_CMD, PrimareController, PrimareError)
 
 logger = logging.getLogger(__name__)
-# Setup logging so that is available
-logging.basicConfig(level=logging.DEBUG)
 
-primare_talker = None
+try:
+    # Python 2's input() evaluates what was typed
+    _input = raw_input
+except NameError:
+    _input = input
 
 
 class PrimareProtocol(LineReceiver):
@@ -47,7 +53,10 @@ class PrimareProtocol(LineReceiver):
     def __init__(self, debug=False):
         """Initialization."""
         self._debug = debug
-        self._primare_talker = primare_talker
+        # PrimareController fed with the data received
+        self.primare_talker = None
+        # CaptureWriter recording the traffic, if any
+        self.capture = None
 
         self.setRawMode()
         self._rawBuffer = bytearray()
@@ -59,7 +68,15 @@ class PrimareProtocol(LineReceiver):
         """Handle raw data received by Twisted's SerialPort."""
         if self._debug:
             logger.debug("Serial RawRX({0}): {1}".format(len(data), data))
-        _primare_talker._primare_reader(data)
+        if self.capture is not None:
+            self.capture.record(RX, data)
+        self.primare_talker._primare_reader(data)
+
+    def write(self, data):
+        """Write raw bytes to the serial port."""
+        if self.capture is not None:
+            self.capture.record(TX, data)
+        self.transport.write(data)
 
 
 @click.group()
@@ -89,10 +106,25 @@ class PrimareProtocol(LineReceiver):
               help="Serial port to use (e.g. 3 for a COM port on Windows, "
               "/dev/ttyATH0 for Arduino Yun, /dev/ttyACM0 for Serial-over-USB "
               "on RaspberryPi.")
-def cli(amp_info, baudrate, debug, port):
+@click.option("--stats-interval",
+              default=None,
+              type=int,
+              help="Log a summary of the link statistics every N seconds.")
+@click.option("--capture",
+              default=None,
+              type=click.Path(dir_okay=False, writable=True),
+              help="Record the traffic on the serial port to this file.")
+@click.option("--cache",
+              default=None,
+              type=click.Path(dir_okay=False, writable=True),
+              help="Remember the amplifier between runs in this file.")
+def cli(amp_info, baudrate, debug, port, stats_interval, capture, cache):
     """Prototype."""
     global _primare_talker
 
+    # Setup logging so that is available
+    logging.basicConfig(level=logging.DEBUG if debug else logging.INFO)
+
     try:
         # on Windows, we need port to be an integer
         port = int(port)
@@ -100,9 +132,20 @@ def cli(amp_info, baudrate, debug, port):
         pass
 
     serial_protocol = PrimareProtocol(debug)
+    if capture is not None:
+        serial_protocol.capture = CaptureWriter(capture)
+    device_cache = DeviceCache(cache) if cache is not None else None
     _primare_talker = PrimareController(source=None,
                                         volume=None,
-                                        writer=serial_protocol.sendLine)
+                                        writer=serial_protocol.write,
+                                        reactor=reactor,
+                                        stats_interval=stats_interval,
+                                        timings=device_cache)
+    serial_protocol.primare_talker = _primare_talker
+    if device_cache is not None:
+        attach(device_cache, port, _primare_talker)
+        reactor.addSystemEventTrigger('before', 'shutdown',
+                                      device_cache.flush)
 
     logger.debug('About to open serial port {0} [{1} baud] ..'.format(
         port,
@@ -158,16 +201,84 @@ def main(ctx):
 #     reactor.callFromThread(reactor.stop)
 
 
+def _parse_arg(arg):
+    """Convert an argument typed at the interactive prompt."""
+    if arg.lower() == "true":
+        return True
+    elif arg.lower() == "false":
+        return False
+    try:
+        return int(arg)
+    except ValueError:
+        pass
+    try:
+        return float(arg)
+    except ValueError:
+        # Such as an input name
+        return arg
+
+
+def _parse_batch_cmd(parsed_cmd):
+    """Convert a command of a batch typed at the interactive prompt.
+
+    Options are given like to the controller's methods: inputs by number or
+    name, volumes in the range 0..100.
+
+    :raises PrimareError: if there is no input with the name given
+    :raises ValueError: if the option is not valid for the command
+    """
+    variable = parsed_cmd[0]
+    if variable not in PRIMARE_CMD:
+        raise KeyError(variable)
+    if len(parsed_cmd) == 1:
+        return variable
+    option = _parse_arg(parsed_cmd[1])
+    if variable == 'input_set':
+        option = _primare_talker._input_index(option)
+    elif variable == 'volume_set':
+        number = isinstance(option, (int, float))
+        if not number or isinstance(option, bool) or not 0 <= option <= 100:
+            raise ValueError('{} needs a volume in the range 0..100, '
+                             'got {!r}'.format(variable, option))
+        option = _primare_talker._volume_to_primare(option)
+    elif not isinstance(option, int):
+        raise ValueError('{} needs a number as option, got {!r}'.format(
+            variable, option))
+    return (variable, int(option))
+
+
+def _print_reply(future):
+    """Log the outcome of a command sent from the interactive prompt."""
+    if future.exception() is not None:
+        logger.error("Command failed: {}".format(future.exception()))
+    else:
+        logger.info("Reply: {}".format(future.result()))
+
+
 @cli.command()
 def interactive():
     """Waah."""
     try:
         nb = ''
         while True:
-            nb = raw_input('Cmd: ').strip()
+            nb = _input('Cmd: ').strip()
             if not nb or nb == 'q':
                 logger.info("Quit: '{}'".format(nb))
                 break
+            elif nb == 'stats':
+                stats = threads.blockingCallFromThread(reactor,
+                                                       _primare_talker.stats)
+                click.echo(json.dumps(stats, indent=2, sort_keys=True))
+            elif ';' in nb:
+                # Several PRIMARE_CMD commands, sent as one batch
+                try:
+                    commands = [_parse_batch_cmd(cmd.split())
+                                for cmd in nb.split(';') if cmd.strip()]
+                    _primare_talker.batch(commands).add_done_callback(
+                        _print_reply)
+                except (KeyError, ValueError, TypeError,
+                        PrimareError) as e:
+                    logger.error("Invalid batch: {}".format(e))
             else:
                 parsed_cmd = nb.split()
                 logger.info("Input rcv: {} - len: {}".format(parsed_cmd,
@@ -175,25 +286,23 @@ def interactive():
                 command = getattr(_primare_talker, parsed_cmd[0], None)
                 if command:
                     try:
-                        if len(parsed_cmd) > 1:
-                            if parsed_cmd[1].lower() == "true":
-                                parsed_cmd[1] = True
-                            elif parsed_cmd[1].lower() == "false":
-                                parsed_cmd[1] = False
-                            else:
-                                parsed_cmd[1] = int(parsed_cmd[1])
-                            command(parsed_cmd[1])
-                        else:
-                            command()
+                        result = command(*[_parse_arg(arg)
+                                           for arg in parsed_cmd[1:]])
+                        if hasattr(result, 'add_done_callback'):
+                            result.add_done_callback(_print_reply)
                     except TypeError as e:
                         logger.error("You called a method with an incorrect"
                                      "number of parameters: {}".format(e))
+                    except (PrimareError, ValueError) as e:
+                        # Such as an unknown input name
+                        logger.error("Invalid command: {}".format(e))
                 else:
                     logger.info("No such function - try again")
     except KeyboardInterrupt:
         logger.info("User aborted")
-    # in a non-main thread:
-    reactor.callFromThread(reactor.stop)
+    finally:
+        # in a non-main thread:
+        reactor.callFromThread(reactor.stop)
 
 
 # cli_dynamic = PrimareCommands(help='Blah blah')
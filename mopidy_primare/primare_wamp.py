@@ -17,75 +17,160 @@
 ###############################################################################
 
 
+"""WAMP gateway for Primare amplifiers.
+
+Every change to the amplifier's state is published on a topic of its own,
+e.g. ``com.mopidy.primare.volume`` with the new value in the amplifier's
+units. Publications are throttled per topic: when changes come in faster
+than ``max_rate`` per second, e.g. while the volume knob is being turned,
+only the newest value is published once the interval has passed.
+
+Late joiners get the state known so far from the ``com.mopidy.primare.state``
+RPC, which is answered without querying the amplifier.
+
+Every public method of :class:`PrimareController` is registered as an RPC of
+the same name, e.g. ``com.mopidy.primare.volume_set``, and every command of
+PRIMARE_CMD as ``com.mopidy.primare.cmd.<name>`` taking the optional value
+byte. They answer with the amplifier's reply once it is confirmed. Calls
+never block the reactor, so any number of callers can have commands queued
+for the serial link at once. Failures are reported as
+``com.mopidy.primare.error.timeout`` when the amplifier did not answer and
+``com.mopidy.primare.error`` otherwise.
+"""
+
+from __future__ import unicode_literals
+
+import functools
+import logging
+
+from twisted.internet import defer
 from twisted.internet.defer import inlineCallbacks
 from twisted.internet.serialport import SerialPort
-from twisted.protocols.basic import LineReceiver
 
 from autobahn.twisted.wamp import ApplicationSession
 from autobahn.wamp.exception import ApplicationError
 
-from primare_serial import PrimareTalker
+from mopidy_primare.primare_serial import (
+    PRIMARE_CMD, PrimareController, PrimareError, PrimareTimeoutError)
+from mopidy_primare.primare_twisted import PrimareProtocol
 
+logger = logging.getLogger(__name__)
 
-class McuProtocol(LineReceiver):
+URI_PREFIX = 'com.mopidy.primare.'
 
+# Most events published per second and topic
+MAX_RATE = 10
+
+
+def controller_methods():
+    """Return the names of the controller methods exported as RPCs."""
+    private = PrimareController.PRIVATE_METHODS
+    public = [name for name in dir(PrimareController)
+              if not name.startswith('_') and name not in private]
+    return sorted(name for name in public
+                  if callable(getattr(PrimareController, name)))
+
+
+def to_deferred(future, reactor):
+    """Return a Deferred fired on the reactor thread with a future's outcome.
+
+    Errors of the controller become :class:`ApplicationError`, so WAMP
+    callers get a meaningful error URI.
     """
-    MCU serial communication protocol.
-    """
+    deferred = defer.Deferred()
 
-    # need a reference to our WS-MCU gateway factory to dispatch PubSub events
-    #
-    def __init__(self, session, primare_talker, debug=False):
-        self._debug = debug
-        self._session = session
-        self._primare_talker = primare_talker
+    def done(future):
+        if future.cancelled():
+            reactor.callFromThread(deferred.errback, defer.CancelledError())
+        elif future.exception() is not None:
+            reactor.callFromThread(deferred.errback, future.exception())
+        else:
+            reactor.callFromThread(deferred.callback, future.result())
 
-        self.setRawMode()
-        self._rawBuffer = bytearray()
+    future.add_done_callback(done)
+    return deferred.addErrback(_application_error)
 
-    def wrapSendLine(self, line):
-        print('LASSE wrapLine: %s', line)
-        self.sendLine(line)
 
-    def connectionMade(self):
-        print('Serial port connected.')
-
-    def lineReceived(self, line):
-        print('LASSE - BOOOOM!!! ERROR')
-        # if self._debug:
-        #     print("Serial LineRX({0}): {1}".format(len(line), line))
-
-        # try:
-        #     # parse data received from MCU
-        #     #
-        #     data = [int(x) for x in line.split()]
-
-        #     # create payload for WAMP event
-        #     #
-        #     payload = {u'variable_char': data[0], u'value': data[1]}
-
-        #     # publish WAMP event to all subscribers on topic
-        #     #
-        #     self._session.publish(u"com.mopidy.primare.lineData", payload)
-        # except ValueError:
-        #     print('Unable to parse value {0}'.format(line))
-
-    def rawDataReceived(self, data):
-        if self._debug:
-            print("Serial RawRX({0}): {1}".format(len(data), data))
-        self._primare_talker._primare_reader(data)
-
-    def randomFunc(self, turn_on):
-        """
-        This method is exported as RPC and can be called by connected clients
+def _application_error(failure):
+    if failure.check(PrimareTimeoutError):
+        raise ApplicationError(URI_PREFIX + 'error.timeout',
+                               failure.getErrorMessage())
+    if failure.check(PrimareError, ValueError, TypeError):
+        raise ApplicationError(URI_PREFIX + 'error',
+                               failure.getErrorMessage())
+    return failure
+
+
+class TopicThrottle(object):
+    """Publish the newest value of each topic at most ``rate`` times a second.
+
+    A change is published right away if the topic was quiet for long enough.
+    Otherwise it is held back until the interval has passed, and replaced by
+    any newer change to the same topic in the meantime.
+    """
+
+    def __init__(self, publish, reactor, rate=MAX_RATE):
+        """Initialization.
+
+        :param publish: Callable taking the topic and value to publish
+        :param reactor: Reactor providing ``callLater`` and ``seconds``
+        :param rate: Most publications per second and topic, 0 for no limit
         """
-        if turn_on:
-            payload = b'1'
+        self._publish = publish
+        self._reactor = reactor
+        self._interval = 1.0 / rate if rate else 0
+        # Reactor time of the last publication per topic
+        self._published = {}
+        # Newest value held back per topic, and the timer releasing it
+        self._held = {}
+        self._timers = {}
+        # Number of changes replaced by a newer one before being published
+        self.coalesced = 0
+
+    def update(self, topic, value):
+        """Publish a new value of a topic, subject to the rate limit."""
+        if topic in self._timers:
+            self.coalesced += 1
+            self._held[topic] = value
+            return
+        now = self._reactor.seconds()
+        wait = self._published.get(topic, now - self._interval) + \
+            self._interval - now
+        if wait <= 0:
+            self._send(topic, value, now)
         else:
-            payload = b'0'
-        if self._debug:
-            print("Serial TX: {0}".format(payload))
-            self.transport.write(payload)
+            self._held[topic] = value
+            self._timers[topic] = self._reactor.callLater(wait, self._release,
+                                                          topic)
+
+    def stop(self):
+        """Drop any values held back."""
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+        self._held.clear()
+
+    def _release(self, topic):
+        del self._timers[topic]
+        self._send(topic, self._held.pop(topic), self._reactor.seconds())
+
+    def _send(self, topic, value, now):
+        self._published[topic] = now
+        self._publish(topic, value)
+
+
+class McuProtocol(PrimareProtocol):
+
+    """
+    MCU serial communication protocol.
+    """
+
+    def __init__(self, session, debug=False):
+        PrimareProtocol.__init__(self, debug)
+        self._session = session
+
+    def connectionMade(self):
+        logger.info('Serial port connected.')
 
 
 class McuComponent(ApplicationSession):
@@ -96,55 +181,88 @@ class McuComponent(ApplicationSession):
 
     def __init__(self, config=None):
         ApplicationSession.__init__(self, config)
-        self._primare_talker = PrimareTalker(source=None, volume=None)
+        self._primare_talker = None
+        self._reactor = None
+        self._throttle = None
 
     @inlineCallbacks
     def onJoin(self, details):
-        print("MyComponent ready! Configuration: {}".format(self.config.extra))
+        from twisted.internet import reactor
+
+        logger.info("MyComponent ready! Configuration: %s", self.config.extra)
 
         port = self.config.extra['port']
         baudrate = self.config.extra['baudrate']
         debug = self.config.extra['debug']
-
-        serial_protocol = McuProtocol(self, self._primare_talker, debug)
-        self._primare_talker.register_mcu_write_cb(serial_protocol.wrapSendLine)
-
-        print('About to open serial port {0} [{1} baud] ..'.format(port,
-                                                                   baudrate))
+        max_rate = self.config.extra.get('max_rate', MAX_RATE)
+
+        self._reactor = reactor
+        serial_protocol = McuProtocol(self, debug)
+        self._primare_talker = PrimareController(
+            source=None, volume=None, writer=serial_protocol.write,
+            reactor=reactor)
+        serial_protocol.primare_talker = self._primare_talker
+        self._throttle = TopicThrottle(self.publish, reactor, max_rate)
+        self._primare_talker.add_listener(self.state_changed)
+
+        logger.info('About to open serial port %s [%s baud] ..', port,
+                    baudrate)
         try:
-            # Prototype:
-            # SerialPort(protocol, deviceNameOrPortNumber, reactor,
-            #    baudrate=9600, bytesize=EIGHTBITS, parity=PARITY_NONE,
-            #    stopbits=STOPBITS_ONE, xonxoff=0, rtscts=0)
-
             # Primare serial link config
             # BAUDRATE = 4800
             # BYTESIZE = 8
             # PARITY = 'N'
             # STOPBITS = 1
-
-            # TODO: Try changing the name once everything works
-            serialPort = SerialPort(
-                serial_protocol, port, reactor, baudrate=baudrate)
-
-            # self._primare_talker.setup()
-            # yield self._primare_talker._set_device_to_known_state()
-            yield self._primare_talker._print_device_info1()
-            yield self._primare_talker._print_device_info2()
-            #yield self._primare_talker._print_device_info2()
-            #yield self._primare_talker._print_device_info3()
-            yield self._primare_talker._print_device_info3()
-            yield self._primare_talker._print_device_info4()
-            yield self._primare_talker._print_device_info4()
-            yield self._primare_talker._print_device_info4()
-            yield self._primare_talker._print_device_info4()
-
+            SerialPort(serial_protocol, port, reactor, baudrate=baudrate)
         except Exception as e:
-            print('Could not open serial port: {0}'.format(e))
+            logger.error('Could not open serial port: %s', e)
             self.leave()
         else:
-            yield self.register(serial_protocol.randomFunc,
-                                u"com.mopidy.primare.randomFunc")
+            yield self.register(self.state_snapshot, URI_PREFIX + 'state')
+            for name in sorted(PRIMARE_CMD):
+                yield self.register(functools.partial(self.call_command, name),
+                                    URI_PREFIX + 'cmd.' + name)
+            for name in controller_methods():
+                yield self.register(functools.partial(self.call_method, name),
+                                    URI_PREFIX + name)
+            self._primare_talker.setup()
+
+    def onLeave(self, details):
+        if self._throttle is not None:
+            self._throttle.stop()
+        ApplicationSession.onLeave(self, details)
+
+    def state_changed(self, field, value):
+        """Publish a change of the amplifier's state on its topic."""
+        self._throttle.update(URI_PREFIX + field, value)
+
+    def call_command(self, variable, option=None):
+        """Send a PRIMARE_CMD command, exported as ``cmd.<variable>`` RPCs.
+
+        :rtype: :class:`Deferred` fired with the reply data
+        """
+        return self.call_method('submit', variable, option)
+
+    def call_method(self, name, *args):
+        """Call a controller method, exported as an RPC of the same name.
+
+        :rtype: :class:`Deferred` fired with the method's result
+        """
+        try:
+            result = getattr(self._primare_talker, name)(*args)
+        except (PrimareError, ValueError, TypeError) as e:
+            # Such as an unknown input name
+            return defer.fail(e).addErrback(_application_error)
+        if hasattr(result, 'add_done_callback'):
+            return to_deferred(result, self._reactor)
+        return result
+
+    def state_snapshot(self):
+        """Return the state known so far, without querying the amplifier.
+
+        Exported as the ``com.mopidy.primare.state`` RPC.
+        """
+        return self._primare_talker.state.as_dict()
 
 
 if __name__ == '__main__':
@@ -172,6 +290,10 @@ if __name__ == '__main__':
                         help='Web port to use for embedded Web server. \
                         Use 0 to disable.')
 
+    parser.add_argument("--max-rate", type=float, default=MAX_RATE,
+                        help='Most events published per second and topic, \
+                        0 for no limit.')
+
     parser.add_argument("--router", type=str, default=None,
                         help='If given, connect to this WAMP router. \
                         Else run an embedded router on 8998.')
@@ -186,6 +308,7 @@ if __name__ == '__main__':
 
     from twisted.python import log
     log.startLogging(sys.stdout)
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.INFO)
 
     # import Twisted reactor
     #
@@ -212,7 +335,8 @@ if __name__ == '__main__':
     router = args.router or u'ws://localhost:8998/ws'
 
     params = {
-        'port': args.port, 'baudrate': args.baudrate, 'debug': args.debug}
+        'port': args.port, 'baudrate': args.baudrate, 'debug': args.debug,
+        'max_rate': args.max_rate}
     runner = ApplicationRunner(router, u"realm1", extra=params,
                                serializers=None,
                                debug=args.debug, debug_wamp=args.debug,
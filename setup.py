@@ -26,6 +26,7 @@ setup(
         'setuptools',
         'Mopidy >= 0.19',
         'Pykka >= 1.1',
+        'futures; python_version < "3"',
         'pyserial',
     ],
     test_suite='nose.collector',
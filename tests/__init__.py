@@ -0,0 +1,43 @@
+from __future__ import unicode_literals
+
+import functools
+
+from mopidy_primare.primare_clock import DelayedCall
+
+
+class Clock(object):
+    """Deterministic stand-in for the reactor, like Twisted's task.Clock.
+
+    Calls from other threads run immediately, timers run when the clock is
+    advanced.
+    """
+
+    def __init__(self):
+        self.now = 0.0
+        self.calls = []
+
+    def seconds(self):
+        return self.now
+
+    def callLater(self, delay, func, *args, **kwargs):
+        call = DelayedCall(self.now + delay, func, args, kwargs)
+        call.on_cancel = functools.partial(self.calls.remove, call)
+        self.calls.append(call)
+        return call
+
+    def callFromThread(self, func, *args, **kwargs):
+        func(*args, **kwargs)
+
+    def advance(self, seconds):
+        self.now += seconds
+        while True:
+            due = [call for call in self.calls if call.time <= self.now]
+            if not due:
+                break
+            call = min(due, key=lambda call: call.time)
+            self.calls.remove(call)
+            call.run()
+
+    def pump(self, seconds, step=0.01):
+        for _ in range(int(round(seconds / step))):
+            self.advance(step)
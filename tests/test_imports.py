@@ -0,0 +1,61 @@
+from __future__ import unicode_literals
+
+import os
+import subprocess
+import sys
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# Our own modules should take next to no time to import, the budget leaves
+# plenty of room for slow machines
+IMPORT_BUDGET_US = 50000
+
+
+def imported_modules(module):
+    output = subprocess.check_output(
+        [sys.executable, '-c',
+         'import sys, {0}; print("\\n".join(sys.modules))'.format(module)],
+        cwd=ROOT)
+    return set(output.decode('utf-8').split())
+
+
+def own_import_time(module):
+    output = subprocess.check_output(
+        [sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+        stderr=subprocess.STDOUT, cwd=ROOT)
+    total = 0
+    for line in output.decode('utf-8').splitlines():
+        if line.startswith('import time:') and '| mopidy_primare' in line:
+            total += int(line[len('import time:'):].split('|')[0])
+    return total
+
+
+class ImportTest(unittest.TestCase):
+
+    def assertNotImported(self, module, packages):
+        loaded = set(name.split('.')[0] for name in imported_modules(module))
+        self.assertEqual(loaded & set(packages), set())
+
+    def test_mixer_does_not_import_twisted_or_autobahn(self):
+        self.assertNotImported('mopidy_primare.mixer',
+                               ['twisted', 'autobahn', 'click'])
+
+    def test_mixer_does_not_import_optional_modules(self):
+        loaded = imported_modules('mopidy_primare.mixer')
+        self.assertNotIn('mopidy_primare.primare_client', loaded)
+        self.assertNotIn('mopidy_primare.primare_capture', loaded)
+
+    def test_controller_does_not_import_transports(self):
+        self.assertNotImported('mopidy_primare.primare_serial',
+                               ['twisted', 'autobahn', 'serial'])
+
+    @unittest.skipIf(sys.version_info < (3, 7), 'needs -X importtime')
+    def test_mixer_import_time(self):
+        self.assertLess(own_import_time('mopidy_primare.mixer'),
+                        IMPORT_BUDGET_US)
+
+    @unittest.skipIf(sys.version_info < (3, 7), 'needs asyncio')
+    def test_asyncio_transport_does_not_import_twisted(self):
+        self.assertNotImported('mopidy_primare.primare_asyncio',
+                               ['twisted', 'autobahn'])
@@ -1,17 +1,172 @@
 from __future__ import unicode_literals
 
+import json
+import os
+import shutil
+import tempfile
+import time
 import unittest
 
-import pygst
-pygst.require('0.10')
-import gst
+from concurrent.futures import Future
 
-from mopidy_nad import mixer
+import mock
 
+from mopidy_primare import Extension
+from mopidy_primare.mixer import PrimareMixer
+from mopidy_primare.primare_simulator import PrimareSimulator
 
-class MixerTest(unittest.TestCase):
+TIMEOUT = 5
 
-    def test_is_a_gstreamer_mixer(self):
-        self.assert_(issubclass(mixer.NadMixer, gst.Element))
 
-    # TODO Add more tests
+class RecordingMixer(PrimareMixer):
+    """Mixer recording the changes reported to Mopidy."""
+
+    def __init__(self, config, changes):
+        super(RecordingMixer, self).__init__(config)
+        self._changes = changes
+
+    def trigger_volume_changed(self, volume):
+        self._changes.append(('volume', volume))
+
+    def trigger_mute_changed(self, mute):
+        self._changes.append(('mute', mute))
+
+
+def make_config(data_dir, **primare):
+    config = {'port': None, 'source': None, 'volume': None,
+              'stats_interval': None, 'capture': None, 'daemon': None}
+    config.update(primare)
+    return {'core': {'data_dir': data_dir}, 'primare': config}
+
+
+class PrimareMixerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.simulator = PrimareSimulator(byte_time=0, response_delay=0,
+                                          power_on_delay=0.1)
+        self.port = self.simulator.open()
+        self.changes = []
+        self.mixer = RecordingMixer.start(
+            config=make_config(self.data_dir, port=self.port),
+            changes=self.changes).proxy()
+
+    def tearDown(self):
+        if self.mixer.actor_ref.is_alive():
+            self.mixer.actor_ref.stop()
+        self.simulator.close()
+        shutil.rmtree(self.data_dir)
+
+    def wait_for(self, condition):
+        deadline = time.time() + TIMEOUT
+        while not condition() and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertTrue(condition())
+
+    def wait_for_setup(self):
+        # Setup unmutes the amplifier and reads the volume last
+        self.wait_for(lambda: ('mute', False) in self.changes)
+        self.wait_for(lambda: self.mixer.get_volume().get() is not None)
+
+    def test_setup_powers_on_amplifier(self):
+        self.simulator.power = False
+
+        self.wait_for(lambda: self.simulator.power)
+        self.wait_for_setup()
+
+    def test_set_volume_is_reported_once_confirmed(self):
+        self.wait_for_setup()
+
+        self.assertTrue(self.mixer.set_volume(40).get())
+
+        self.wait_for(lambda: ('volume', 40) in self.changes)
+        self.assertEqual(self.simulator.volume, 32)
+        self.assertEqual(self.mixer.get_volume().get(), 40)
+
+    def test_set_mute_is_reported_once_confirmed(self):
+        self.wait_for_setup()
+
+        self.assertTrue(self.mixer.set_mute(True).get())
+
+        self.wait_for(lambda: ('mute', True) in self.changes)
+        self.assertTrue(self.simulator.mute)
+        self.assertTrue(self.mixer.get_mute().get())
+
+    def test_knob_changes_are_reported(self):
+        self.wait_for_setup()
+
+        self.simulator.turn_knob(2, interval=0.01)
+
+        self.wait_for(lambda: ('volume', 28) in self.changes)
+
+    def test_stop_keeps_amplifier_in_cache(self):
+        self.wait_for_setup()
+
+        self.mixer.actor_ref.stop()
+
+        path = os.path.join(Extension.get_data_dir(
+            make_config(self.data_dir)), 'cache.json')
+        with open(path) as f:
+            device = json.load(f)['devices'][self.port]
+        self.assertEqual(device['volume'], self.simulator.volume)
+
+
+class PrimareMixerDaemonTest(unittest.TestCase):
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        patcher = mock.patch('mopidy_primare.primare_client.PrimareClient')
+        self.client = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+        setup = Future()
+        setup.set_result(None)
+        self.client.setup.return_value = setup
+        self.client.volume_set.return_value = Future()
+        self.mixer = PrimareMixer.start(config=make_config(
+            self.data_dir, daemon='/tmp/primare.sock')).proxy()
+
+    def tearDown(self):
+        if self.mixer.actor_ref.is_alive():
+            self.mixer.actor_ref.stop()
+        shutil.rmtree(self.data_dir)
+
+    def test_commands_go_to_daemon(self):
+        self.assertTrue(self.mixer.set_volume(40).get())
+
+        self.client.open.assert_called_once_with()
+        self.client.volume_set.assert_called_once_with(40)
+
+    def test_stop_closes_connection(self):
+        self.mixer.actor_ref.stop()
+
+        self.client.close.assert_called_once_with()
+
+
+class DataDirTest(unittest.TestCase):
+
+    def setUp(self):
+        self.home = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.home)
+        patcher = mock.patch.object(Extension, 'get_data_dir', create=True,
+                                    side_effect=AttributeError)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_falls_back_for_old_mopidy(self):
+        config = make_config(None, port='/dev/null')
+        del config['core']
+        mixer = PrimareMixer(config)
+
+        with mock.patch('os.path.expanduser',
+                        lambda path: path.replace('~', self.home)):
+            data_dir = mixer._data_dir()
+
+        self.assertEqual(data_dir, os.path.join(
+            self.home, '.local', 'share', 'mopidy', 'primare'))
+        self.assertTrue(os.path.isdir(data_dir))
+
+    def test_fallback_uses_configured_data_dir(self):
+        mixer = PrimareMixer(make_config(self.home, port='/dev/null'))
+
+        self.assertEqual(mixer._data_dir(),
+                         os.path.join(self.home, 'primare'))
@@ -0,0 +1,103 @@
+from __future__ import unicode_literals
+
+import sys
+import threading
+import unittest
+
+from mopidy_primare.primare_serial import PrimareController
+from mopidy_primare.primare_simulator import PrimareSimulator
+
+if sys.version_info >= (3, 7):
+    import asyncio
+
+    from mopidy_primare.primare_asyncio import (
+        AsyncioReactor, SerialTransport, open_controller)
+
+TIMEOUT = 5
+
+
+@unittest.skipIf(sys.version_info < (3, 7), 'needs asyncio')
+class AsyncioReactorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.reactor = AsyncioReactor(self.loop)
+
+    def tearDown(self):
+        self.loop.close()
+
+    def test_call_later_runs_on_loop(self):
+        calls = []
+        call = self.reactor.callLater(0.01, calls.append, 1)
+        self.assertTrue(call.active())
+
+        self.loop.run_until_complete(asyncio.sleep(0.05))
+
+        self.assertEqual(calls, [1])
+        self.assertFalse(call.active())
+
+    def test_cancelled_call_does_not_run(self):
+        calls = []
+        call = self.reactor.callLater(0.01, calls.append, 1)
+
+        call.cancel()
+        self.loop.run_until_complete(asyncio.sleep(0.05))
+
+        self.assertEqual(calls, [])
+        self.assertFalse(call.active())
+
+    def test_call_from_thread_wakes_loop(self):
+        done = self.loop.create_future()
+
+        def other_thread():
+            self.reactor.callFromThread(done.set_result, 'woken')
+        threading.Thread(target=other_thread).start()
+
+        self.assertEqual(
+            self.loop.run_until_complete(asyncio.wait_for(done, TIMEOUT)),
+            'woken')
+
+
+@unittest.skipIf(sys.version_info < (3, 7), 'needs asyncio')
+class AsyncioSimulatorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.simulator = PrimareSimulator(byte_time=0, response_delay=0,
+                                          power_on_delay=0.1)
+        self.simulator.open()
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+        self.simulator.close()
+
+    def run_future(self, future):
+        return self.loop.run_until_complete(asyncio.wait_for(
+            asyncio.wrap_future(future, loop=self.loop), TIMEOUT))
+
+    def test_commands_are_answered(self):
+        reactor = AsyncioReactor(self.loop)
+        transport = SerialTransport(self.simulator.port, self.loop)
+        controller = PrimareController(writer=transport.write,
+                                       reactor=reactor)
+        transport.open(controller._primare_reader)
+        try:
+            self.run_future(controller.verbose_set(True))
+            self.assertTrue(self.run_future(controller.volume_set(90)))
+            self.assertEqual(self.simulator.volume, 71)
+            self.assertEqual(self.run_future(controller.modelname_get()),
+                             'i22')
+        finally:
+            transport.close()
+
+    def test_open_controller_sets_up_amplifier(self):
+        self.simulator.power = False
+        controller, supervisor = open_controller(self.simulator.port,
+                                                 self.loop)
+        try:
+            self.run_future(controller.setup())
+            self.assertTrue(supervisor.connected)
+            self.assertTrue(self.simulator.power)
+            self.assertEqual(controller.state.volume, self.simulator.volume)
+        finally:
+            supervisor.close()
@@ -0,0 +1,72 @@
+from __future__ import unicode_literals
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from mopidy_primare.primare_cache import DeviceCache, attach
+from mopidy_primare.primare_serial import PrimareController
+
+from tests import Clock
+
+
+class DeviceCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'cache.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_timings_survive_restarts(self):
+        DeviceCache(self.path).store_timing('I22', 'V1', 0.045)
+
+        cache = DeviceCache(self.path)
+
+        self.assertEqual(cache.timing('I22', 'V1'), 0.045)
+        self.assertIsNone(cache.timing('I22', 'V2'))
+
+    def test_missing_file_is_empty(self):
+        self.assertIsNone(DeviceCache(self.path).timing('I22', 'V1'))
+
+    def test_invalid_file_is_empty(self):
+        with io.open(self.path, 'w', encoding='utf-8') as f:
+            f.write('{"timings": ')
+
+        self.assertIsNone(DeviceCache(self.path).timing('I22', 'V1'))
+
+    def test_device_state_survives_restarts(self):
+        cache = DeviceCache(self.path)
+        cache.update_device('/dev/ttyUSB0', 'modelname', 'I22')
+        cache.update_device('/dev/ttyUSB0', 'volume', 32)
+        cache.update_device('/dev/ttyUSB0', 'verbose', True)
+        cache.flush()
+
+        self.assertEqual(DeviceCache(self.path).device('/dev/ttyUSB0'),
+                         {'modelname': 'I22', 'volume': 32})
+
+    def test_other_model_replaces_device(self):
+        cache = DeviceCache(self.path)
+        cache.update_device('/dev/ttyUSB0', 'modelname', 'I22')
+        cache.update_device('/dev/ttyUSB0', 'volume', 32)
+
+        cache.update_device('/dev/ttyUSB0', 'modelname', 'I32')
+
+        self.assertEqual(cache.device('/dev/ttyUSB0'), {'modelname': 'I32'})
+
+    def test_attached_controller_starts_from_cache(self):
+        cache = DeviceCache(self.path)
+        for field, value in [('manufacturer', 'Primare'), ('modelname', 'I22'),
+                             ('swversion', 'V1'), ('volume', 32)]:
+            cache.update_device('/dev/ttyUSB0', field, value)
+        written = []
+        controller = PrimareController(writer=written.append, reactor=Clock())
+
+        attach(cache, '/dev/ttyUSB0', controller)
+        controller._primare_reader(b'\x02\x03\x28\x10\x03')
+
+        self.assertEqual(controller.state.modelname, 'I22')
+        self.assertEqual(cache.device('/dev/ttyUSB0')['volume'], 0x28)
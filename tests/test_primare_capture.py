@@ -0,0 +1,86 @@
+from __future__ import unicode_literals
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from mopidy_primare.primare_capture import (
+    RX, TX, CaptureError, CaptureWriter, read_capture, replay)
+from mopidy_primare.primare_serial import PrimareController
+
+from tests import Clock
+
+
+class CaptureTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'capture.bin')
+        self.now = 10.0
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write_capture(self, records):
+        capture = CaptureWriter(self.path, clock=lambda: self.now)
+        for timestamp, direction, data in records:
+            self.now = timestamp
+            capture.record(direction, data)
+        capture.close()
+
+    def test_records_are_read_back(self):
+        records = [(10.0, TX, b'\x02W\x83\x28\x10\x03'),
+                   (10.05, RX, b'\x02\x03\x28'),
+                   (10.06, RX, b'\x10\x03')]
+
+        self.write_capture(records)
+
+        self.assertEqual(list(read_capture(self.path)), records)
+
+    def test_wrapped_callbacks_are_recorded(self):
+        written = []
+        capture = CaptureWriter(self.path, clock=lambda: self.now)
+
+        capture.wrap_writer(written.append)(b'\x02R\x03\x10\x03')
+        capture.wrap_reader(written.append)(b'\x02\x03\x28\x10\x03')
+        capture.close()
+
+        self.assertEqual(len(written), 2)
+        self.assertEqual([direction for _, direction, _
+                          in read_capture(self.path)], [TX, RX])
+
+    def test_truncated_capture_is_an_error(self):
+        self.write_capture([(10.0, RX, b'\x02\x03\x28\x10\x03')])
+        with open(self.path, 'rb+') as f:
+            f.truncate(os.path.getsize(self.path) - 1)
+
+        self.assertRaises(CaptureError, list, read_capture(self.path))
+
+    def test_replay_at_maximum_speed(self):
+        self.write_capture([(10.0, TX, b'\x02R\x03\x10\x03'),
+                            (10.1, RX, b'\x02\x03\x28\x10\x03'),
+                            (12.0, RX, b'\x02\x09\x01\x10\x03')])
+        controller = PrimareController(writer=lambda data: None,
+                                       reactor=Clock())
+
+        self.assertEqual(replay(self.path, controller).result(), 2)
+        self.assertEqual(controller.state.volume, 0x28)
+        self.assertTrue(controller.state.mute)
+
+    def test_replay_keeps_timing(self):
+        self.write_capture([(10.0, RX, b'\x02\x03\x28\x10\x03'),
+                            (12.0, RX, b'\x02\x03\x29\x10\x03')])
+        clock = Clock()
+        controller = PrimareController(writer=lambda data: None,
+                                       reactor=clock)
+
+        future = replay(self.path, controller, clock, speed=2)
+
+        clock.advance(0)
+        self.assertEqual(controller.state.volume, 0x28)
+        clock.advance(0.9)
+        self.assertEqual(controller.state.volume, 0x28)
+        clock.advance(0.1)
+        self.assertEqual(controller.state.volume, 0x29)
+        self.assertEqual(future.result(), 2)
@@ -0,0 +1,86 @@
+from __future__ import unicode_literals
+
+import json
+import os
+import shutil
+import socket
+import tempfile
+import time
+import unittest
+
+from mopidy_primare.primare_client import PrimareClient
+from mopidy_primare.primare_serial import PrimareTimeoutError
+
+TIMEOUT = 5
+
+
+class PrimareClientTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        path = os.path.join(self.directory, 'primare.sock')
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(path)
+        listener.listen(1)
+        self.client = PrimareClient(path)
+        self.client.open()
+        self.daemon, _ = listener.accept()
+        self.daemon.settimeout(TIMEOUT)
+        self.requests = self.daemon.makefile('rb')
+        listener.close()
+
+    def tearDown(self):
+        self.client.close()
+        self.requests.close()
+        self.daemon.close()
+        shutil.rmtree(self.directory)
+
+    def send(self, message):
+        self.daemon.sendall(json.dumps(message).encode('utf-8') + b'\n')
+
+    def test_state_is_mirrored(self):
+        changes = []
+        self.client.add_listener(lambda *args: changes.append(args))
+
+        self.send({'event': 'state', 'state': {'volume': 0x28}})
+        self.send({'event': 'changed', 'field': 'mute', 'value': True})
+        self.client.setup().result(TIMEOUT)
+        deadline = time.time() + TIMEOUT
+        while len(changes) < 2 and time.time() < deadline:
+            time.sleep(0.01)
+
+        self.assertEqual(self.client.volume_state(), 51)
+        self.assertTrue(self.client.mute_state())
+        self.assertEqual(changes, [('volume', 0x28), ('mute', True)])
+
+    def test_methods_are_sent_to_the_daemon(self):
+        future = self.client.volume_set(40)
+
+        request = json.loads(self.requests.readline().decode('utf-8'))
+        self.assertEqual(request['method'], 'volume_set')
+        self.assertEqual(request['args'], [40])
+        self.send({'id': request['id'], 'result': True})
+        self.assertTrue(future.result(TIMEOUT))
+
+    def test_volume_state_reports_requested_volume(self):
+        self.client.volume_set(40)
+        self.send({'event': 'state', 'state': {'volume': 0x20}})
+        self.client.setup().result(TIMEOUT)
+
+        self.assertEqual(self.client.volume_state(), 40)
+
+    def test_errors_are_raised(self):
+        future = self.client.volume_get()
+
+        request = json.loads(self.requests.readline().decode('utf-8'))
+        self.send({'id': request['id'], 'error': 'PrimareTimeoutError',
+                   'message': 'No reply to volume_get'})
+        self.assertIsInstance(future.exception(TIMEOUT), PrimareTimeoutError)
+
+    def test_pending_calls_fail_when_the_daemon_goes_away(self):
+        future = self.client.volume_get()
+        self.requests.readline()
+
+        self.daemon.shutdown(socket.SHUT_RDWR)
+
+        self.assertIsNotNone(future.exception(TIMEOUT))
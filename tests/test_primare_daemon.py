@@ -0,0 +1,151 @@
+from __future__ import unicode_literals
+
+import json
+import unittest
+
+try:
+    from twisted.internet.testing import StringTransport
+except ImportError:
+    from twisted.test.proto_helpers import StringTransport
+
+from mopidy_primare.primare_daemon import PrimareDaemon
+from mopidy_primare.primare_serial import PrimareController, command_frame
+
+from tests import Clock
+
+
+class PrimareDaemonTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        self.written = []
+        self.controller = PrimareController(writer=self.written.append,
+                                            reactor=self.clock)
+        self.daemon = PrimareDaemon(self.controller)
+
+    def connect(self):
+        client = self.daemon.buildProtocol(None)
+        client.makeConnection(StringTransport())
+        return client
+
+    def request(self, client, message_id, method, *args):
+        client.dataReceived(json.dumps(
+            {'id': message_id, 'method': method, 'args': args}
+        ).encode('utf-8') + b'\n')
+
+    def messages(self, client):
+        lines = client.transport.value().decode('utf-8').splitlines()
+        client.transport.clear()
+        return [json.loads(line) for line in lines]
+
+    def test_clients_get_the_state_on_connecting(self):
+        self.controller._primare_reader(b'\x02\x03\x28\x10\x03')
+
+        client = self.connect()
+
+        self.assertEqual(self.messages(client),
+                         [{'event': 'state', 'state': {'volume': 0x28}}])
+
+    def test_requests_are_answered(self):
+        client = self.connect()
+        self.messages(client)
+
+        self.request(client, 1, 'volume_get')
+        self.controller._primare_reader(b'\x02\x03\x28\x10\x03')
+
+        self.assertEqual(self.messages(client), [
+            {'event': 'changed', 'field': 'volume', 'value': 0x28},
+            {'id': 1, 'result': 51},
+        ])
+
+    def test_unknown_methods_are_errors(self):
+        client = self.connect()
+        self.messages(client)
+
+        self.request(client, 1, '_write')
+        self.request(client, 2, 'add_listener')
+
+        self.assertEqual([message['error'] for message
+                          in self.messages(client)],
+                         ['AttributeError', 'AttributeError'])
+
+    def test_changes_are_sent_to_every_client(self):
+        clients = [self.connect(), self.connect()]
+
+        self.controller._primare_reader(b'\x02\x09\x01\x10\x03')
+
+        for client in clients:
+            self.assertEqual(self.messages(client)[-1],
+                             {'event': 'changed', 'field': 'mute',
+                              'value': True})
+
+    def test_clients_take_turns(self):
+        first, second = self.connect(), self.connect()
+        for message_id in range(3):
+            self.request(first, message_id, 'volume_up')
+        self.request(second, 1, 'modelname_get')
+
+        self.clock.advance(0.06)
+        self.clock.advance(0.06)
+        self.clock.advance(0.06)
+
+        self.assertEqual(self.written, [command_frame('volume_up'),
+                                        command_frame('volume_up'),
+                                        command_frame('modelname_get'),
+                                        command_frame('volume_up')])
+
+    def test_turn_ends_once_command_is_written(self):
+        client = self.connect()
+        self.request(client, 1, 'modelname_get')
+        self.request(client, 2, 'volume_up')
+
+        self.clock.advance(0.06)
+
+        self.assertEqual(self.written, [command_frame('modelname_get'),
+                                        command_frame('volume_up')])
+
+    def test_volume_set_cancels_fade_of_same_client(self):
+        self.controller._primare_reader(b'\x02\x03\x28\x10\x03')
+        client = self.connect()
+        self.messages(client)
+
+        self.request(client, 1, 'volume_fade', 80, 5)
+        self.request(client, 2, 'volume_set', 20)
+        self.clock.advance(0.5)
+
+        self.assertIn(command_frame('volume_set', 16), self.written)
+        self.assertIsNone(self.controller._fade)
+        self.assertEqual([message['error'] for message
+                          in self.messages(client)
+                          if message.get('id') == 1], ['CancelledError'])
+
+    def test_queued_sets_of_a_client_are_replaced(self):
+        client = self.connect()
+        self.messages(client)
+        self.request(client, 1, 'volume_up')
+        self.request(client, 2, 'volume_up')
+        self.request(client, 3, 'mute_set', True)
+        self.request(client, 4, 'mute_set', False)
+
+        self.clock.advance(0.06)
+        self.clock.advance(0.06)
+        self.controller._primare_reader(b'\x02\x09\x00\x10\x03')
+
+        self.assertEqual(self.written, [command_frame('volume_up'),
+                                        command_frame('volume_up'),
+                                        command_frame('mute_set', 0)])
+        self.assertEqual([message.get('id') for message
+                          in self.messages(client)
+                          if 'id' in message], [4, 3])
+
+    def test_menu_steps_are_not_replaced(self):
+        client = self.connect()
+        self.request(client, 1, 'volume_up')
+        self.request(client, 2, 'volume_up')
+        for message_id in range(3, 6):
+            self.request(client, message_id, 'menu_set', 1)
+
+        for _ in range(5):
+            self.clock.advance(0.06)
+
+        self.assertEqual(self.written.count(command_frame('menu_set', 1)), 3)
@@ -0,0 +1,842 @@
+from __future__ import unicode_literals
+
+import unittest
+
+import mock
+
+from mopidy_primare.primare_serial import (
+    PRIMARE_REPLY, FrameDecoder, LatencyHistogram, PacingCalibration,
+    PrimareBatchError, PrimareController, PrimareError, PrimareTimeoutError,
+    TransmitQueue, command_frame, parse_frame)
+
+from tests import Clock
+
+
+class FrameDecoderTest(unittest.TestCase):
+
+    def test_decodes_complete_frames(self):
+        decoder = FrameDecoder()
+
+        frames = decoder.feed(b'\x02\x03\x20\x10\x03\x02\x14CD\x10\x03')
+
+        self.assertEqual(frames, [b'\x03\x20', b'\x14CD'])
+
+    def test_unstuffs_dle(self):
+        decoder = FrameDecoder()
+
+        frames = decoder.feed(b'\x02\x03\x10\x10\x10\x03')
+
+        self.assertEqual(frames, [b'\x03\x10'])
+
+    def test_frames_split_across_chunks(self):
+        decoder = FrameDecoder()
+        stream = b'\x02\x03\x10\x10\x10\x03\x02\x09\x01\x10\x03'
+
+        frames = []
+        for index in range(len(stream)):
+            frames += decoder.feed(stream[index:index + 1])
+
+        self.assertEqual(frames, [b'\x03\x10', b'\x09\x01'])
+
+    def test_skips_garbage_before_stx(self):
+        decoder = FrameDecoder()
+
+        frames = decoder.feed(b'\xff\x00\x02\x01\x01\x10\x03')
+
+        self.assertEqual(frames, [b'\x01\x01'])
+
+    def test_resyncs_on_invalid_escape(self):
+        decoder = FrameDecoder()
+
+        frames = decoder.feed(b'\x02\x03\x10\x02\x09\x00\x10\x03')
+
+        self.assertEqual(frames, [b'\x09\x00'])
+        self.assertEqual(decoder.errors, 1)
+
+
+class CommandFrameTest(unittest.TestCase):
+
+    def test_plain_command(self):
+        self.assertEqual(command_frame('verbose_toggle'),
+                         b'\x02W\x0d\x00\x10\x03')
+
+    def test_templated_command(self):
+        self.assertEqual(command_frame('volume_set', 0x28),
+                         b'\x02W\x83\x28\x10\x03')
+
+    def test_read_command(self):
+        self.assertEqual(command_frame('modelname_get'),
+                         b'\x02R\x16\x00\x10\x03')
+
+    def test_escapes_dle(self):
+        self.assertEqual(command_frame('volume_set', 0x10),
+                         b'\x02W\x83\x10\x10\x10\x03')
+
+    def test_frames_are_cached(self):
+        self.assertIs(command_frame('volume_set', 0x20),
+                      command_frame('volume_set', 0x20))
+
+    def test_templated_command_needs_option(self):
+        self.assertRaises(ValueError, command_frame, 'volume_set')
+        self.assertRaises(ValueError, command_frame, 'volume_set', 0x100)
+
+
+class TransmitQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        self.written = []
+        self.queue = TransmitQueue(self.written.append, self.clock, gap=0.06)
+
+    def test_first_frame_is_written_immediately(self):
+        self.queue.put(b'a')
+
+        self.assertEqual(self.written, [b'a'])
+
+    def test_frames_are_paced(self):
+        self.queue.put(b'a')
+        self.queue.put(b'b')
+        self.queue.put(b'c')
+
+        self.assertEqual(self.written, [b'a'])
+        self.clock.advance(0.06)
+        self.assertEqual(self.written, [b'a', b'b'])
+        self.clock.advance(0.06)
+        self.assertEqual(self.written, [b'a', b'b', b'c'])
+
+    def test_pause_holds_back_later_frames(self):
+        self.queue.pause(1)
+        self.queue.put(b'a')
+
+        self.clock.advance(0.5)
+        self.assertEqual(self.written, [])
+        self.clock.advance(0.5)
+        self.assertEqual(self.written, [b'a'])
+
+
+class LatencyHistogramTest(unittest.TestCase):
+
+    def test_summarizes_durations(self):
+        histogram = LatencyHistogram()
+        for seconds in (0.004, 0.008, 0.009, 0.3):
+            histogram.add(seconds)
+
+        summary = histogram.as_dict()
+        self.assertEqual(summary['count'], 4)
+        self.assertEqual(summary['p50_ms'], 10)
+        self.assertEqual(summary['max_ms'], 300)
+        self.assertEqual(summary['buckets'],
+                         {'<=5': 1, '<=10': 2, '<=500': 1})
+
+    def test_merge(self):
+        histogram = LatencyHistogram()
+        other = LatencyHistogram()
+        other.add(0.003)
+
+        histogram.merge(other)
+
+        self.assertEqual(histogram.count, 1)
+        self.assertEqual(histogram.percentile(0.95), 3)
+
+
+class PacingCalibrationTest(unittest.TestCase):
+
+    def test_gap_follows_reply_delay(self):
+        pacing = PacingCalibration(0.06)
+
+        for _ in range(100):
+            pacing.reply(0.03)
+
+        self.assertAlmostEqual(pacing.average, 0.03)
+        self.assertAlmostEqual(pacing.gap, 0.045)
+
+    def test_gap_grows_at_once_and_shrinks_slowly(self):
+        pacing = PacingCalibration(0.06)
+
+        self.assertAlmostEqual(pacing.reply(0.1), 0.15)
+        self.assertAlmostEqual(pacing.reply(0.0), 0.1425)
+
+    def test_gap_stays_within_bounds(self):
+        pacing = PacingCalibration(0.06)
+
+        for _ in range(10):
+            pacing.failure()
+        self.assertEqual(pacing.gap, PacingCalibration.MAX_GAP)
+        self.assertEqual(pacing.backoffs, 10)
+        self.assertEqual(pacing.restore(0), PacingCalibration.MIN_GAP)
+
+
+# Replies to inputname_specific_get for every input
+INPUT_NAME_REPLIES = dict(
+    (command_frame('inputname_specific_get', index),
+     b'\x02\x94' + bytes(bytearray([index])) + name + b'\x10\x03')
+    for index, name in enumerate([b'Phono', b'CD', b'DAC', b'Tuner', b'Aux',
+                                  b'Tape', b'Video', b'Bal']))
+
+
+class PrimareControllerTest(unittest.TestCase):
+
+    def answer(self, controller, replies, steps):
+        """Reply to every frame written, like the amplifier would."""
+        answered = 0
+        for _ in range(steps):
+            for frame in self.written[answered:]:
+                if frame in replies:
+                    controller._primare_reader(replies[frame])
+            answered = len(self.written)
+            self.clock.advance(0.06)
+
+    def setUp(self):
+        self.clock = Clock()
+        self.written = []
+        self.unsolicited = []
+        self.controller = PrimareController(
+            writer=self.written.append, reactor=self.clock,
+            unsolicited_cb=lambda *args: self.unsolicited.append(args))
+
+    def test_commands_return_without_waiting(self):
+        self.controller.volume_up()
+        self.controller.volume_up()
+
+        self.assertEqual(self.written, [command_frame('volume_up')])
+        self.clock.advance(0.06)
+        self.assertEqual(len(self.written), 2)
+
+    def test_call_tells_when_commands_are_written(self):
+        self.controller.volume_up()
+
+        result, sent = self.controller.call('volume_down')
+
+        self.assertFalse(sent.done())
+        self.clock.advance(0.06)
+        self.assertTrue(sent.done())
+        self.assertFalse(result.done())
+
+    def test_volume_get_returns_reply(self):
+        future = self.controller.volume_get()
+        self.assertFalse(future.done())
+
+        self.controller._primare_reader(b'\x02\x03\x28\x10\x03')
+
+        self.assertEqual(future.result(), 51)
+        self.assertEqual(self.unsolicited, [])
+
+    def test_volume_set_accepts_reply_one_step_low(self):
+        future = self.controller.volume_set(90)
+
+        self.controller._primare_reader(b'\x02\x03\x46\x10\x03')
+
+        self.assertTrue(future.result())
+
+    def test_mute_get_answers_from_state(self):
+        self.assertIsNone(self.controller.mute_get().result(timeout=0))
+
+        self.controller._primare_reader(b'\x02\x09\x01\x10\x03')
+
+        self.assertTrue(self.controller.mute_get().result(timeout=0))
+        self.assertEqual(self.written, [])
+
+    def test_unsolicited_replies_are_reported(self):
+        self.controller._primare_reader(b'\x02\x03\x28\x10\x03')
+
+        self.assertEqual(self.unsolicited, [('volume', 0x28)])
+
+    def test_reads_are_retried_on_timeout(self):
+        future = self.controller.volume_get()
+
+        self.clock.advance(self.controller.REPLY_TIMEOUT)
+        self.assertEqual(len(self.written), 2)
+        self.controller._primare_reader(b'\x02\x03\x00\x10\x03')
+        self.assertEqual(future.result(), 0)
+
+    def test_timeout_when_amplifier_never_replies(self):
+        future = self.controller.volume_up()
+
+        self.clock.pump(5)
+
+        self.assertEqual(len(self.written), 1)
+        self.assertIsInstance(future.exception(), PrimareTimeoutError)
+
+    def test_queued_volume_sets_are_coalesced(self):
+        self.controller.mute_set(True)
+        first = self.controller.volume_set(10)
+        self.controller.volume_up()
+        last = self.controller.volume_set(20)
+
+        self.clock.advance(0.06)
+        self.clock.advance(0.06)
+
+        self.assertEqual(self.written, [command_frame('mute_set', 0x01),
+                                        command_frame('volume_set', 16)])
+        self.controller._primare_reader(b'\x02\x03\x10\x10\x10\x03')
+        self.assertTrue(last.result())
+        self.assertFalse(first.result())
+
+    def test_coalescing_can_be_disabled(self):
+        controller = PrimareController(writer=self.written.append,
+                                       reactor=self.clock, coalesce=False)
+        controller.mute_set(True)
+        controller.volume_set(10)
+        controller.volume_set(20)
+
+        self.clock.advance(0.06)
+        self.clock.advance(0.06)
+
+        self.assertEqual(len(self.written), 3)
+
+    def test_state_tracks_unsolicited_replies(self):
+        self.clock.advance(1)
+        self.controller._primare_reader(b'\x02\x03\x28\x10\x03'
+                                        b'\x02\x09\x01\x10\x03'
+                                        b'\x02\x16i22\x10\x03')
+
+        self.assertEqual(self.controller.state.volume, 0x28)
+        self.assertEqual(self.controller.volume_state(), 51)
+        self.assertIs(self.controller.mute_state(), True)
+        self.assertEqual(self.controller.state.modelname, 'i22')
+        self.assertEqual(self.controller.state.updated['volume'], 1)
+
+    def test_state_keeps_requested_volume_despite_low_reply(self):
+        self.controller.volume_set(90)
+
+        self.controller._primare_reader(b'\x02\x03\x46\x10\x03')
+
+        self.assertEqual(self.controller.state.volume, 71)
+
+    def test_volume_state_reports_requested_volume(self):
+        self.controller.volume_set(40)
+        self.controller._primare_reader(b'\x02\x03\x20\x10\x03')
+
+        self.assertEqual(self.controller.volume_state(), 40)
+        future = self.controller.volume_get()
+        self.clock.advance(0.06)
+        self.controller._primare_reader(b'\x02\x03\x20\x10\x03')
+        self.assertEqual(future.result(timeout=0), 40)
+
+    def test_volume_steps_below_rounded_volume(self):
+        self.controller._primare_reader(b'\x02\x03\x20\x10\x03')
+        self.assertEqual(self.controller.volume_state(), 41)
+
+        self.assertTrue(self.controller.volume_set(40).result(timeout=0))
+        self.assertEqual(self.controller.volume_state(), 40)
+        self.controller.volume_set(39)
+
+        self.assertEqual(self.written, [command_frame('volume_set', 31)])
+
+    def test_set_to_current_state_is_skipped(self):
+        self.controller._primare_reader(b'\x02\x09\x01\x10\x03')
+
+        future = self.controller.mute_set(True)
+
+        self.assertTrue(future.result())
+        self.assertEqual(self.written, [])
+
+    def test_set_to_current_state_is_sent_if_queued_change(self):
+        self.controller._primare_reader(b'\x02\x09\x00\x10\x03')
+        self.controller.mute_set(True)
+
+        self.controller.mute_set(False)
+
+        self.assertEqual(self.written, [command_frame('mute_set', 0x01)])
+        self.clock.advance(0.06)
+        self.assertEqual(self.written[1:], [command_frame('mute_set', 0x00)])
+
+    def test_volume_fade_steps_to_target(self):
+        self.controller._primare_reader(b'\x02\x03\x0a\x10\x03')
+
+        future = self.controller.volume_fade(100, 1)
+
+        self.assertEqual(self.written, [command_frame('volume_set', 15)])
+        for _ in range(20):
+            self.clock.advance(0.1)
+            level = self.written[-1][3:4]
+            self.controller._primare_reader(
+                b''.join([b'\x02\x03', level, b'\x10\x03']))
+        self.assertEqual(self.written[-1], command_frame('volume_set', 79))
+        self.assertLessEqual(len(self.written), 14)
+        self.assertTrue(future.result())
+
+    def test_volume_fade_uses_single_steps_when_slow(self):
+        self.controller._primare_reader(b'\x02\x03\x0a\x10\x03')
+
+        self.controller.volume_fade(self.controller._volume_from_primare(13),
+                                    3)
+        self.clock.pump(3.1)
+
+        self.assertEqual(self.written, [command_frame('volume_up'),
+                                        command_frame('volume_up'),
+                                        command_frame('volume_set', 13)])
+
+    def test_volume_command_cancels_fade(self):
+        self.controller._primare_reader(b'\x02\x03\x0a\x10\x03')
+        future = self.controller.volume_fade(100, 2)
+
+        self.clock.advance(0.5)
+        self.controller.volume_set(0)
+        self.clock.pump(3)
+
+        self.assertTrue(future.cancelled())
+        self.assertEqual(self.written[-1], command_frame('volume_set', 0))
+
+    def test_volume_read_does_not_cancel_fade(self):
+        self.controller._primare_reader(b'\x02\x03\x0a\x10\x03')
+        future = self.controller.volume_fade(100, 3)
+
+        self.clock.advance(0.5)
+        self.controller.volume_get()
+        self.clock.advance(0.5)
+
+        self.assertFalse(future.done())
+        self.assertIsNotNone(self.controller._fade)
+
+    def test_setup_only_sends_differences(self):
+        controller = PrimareController(source='2', volume='50',
+                                       writer=self.written.append,
+                                       reactor=self.clock)
+        future = controller.setup()
+        replies = {
+            command_frame('verbose_set', 0x01): b'\x02\x0d\x01\x10\x03',
+            command_frame('inputname_current_get'): b'\x02\x14CD\x10\x03',
+            command_frame('volume_set', 40): b'\x02\x03\x28\x10\x03',
+        }
+        replies.update(INPUT_NAME_REPLIES)
+        controller._primare_reader(b'\x02\x01\x01\x10\x03'
+                                   b'\x02\x02\x02\x10\x03'
+                                   b'\x02\x09\x00\x10\x03')
+
+        self.answer(controller, replies, 20)
+
+        self.assertIsNone(future.result(timeout=0))
+        self.assertEqual(self.written[0], command_frame('verbose_set', 1))
+        self.assertIn(command_frame('volume_set', 40), self.written)
+        self.assertNotIn(command_frame('power_set', 1), self.written)
+        self.assertNotIn(command_frame('input_set', 2), self.written)
+
+    def test_setup_waits_for_power_on(self):
+        future = self.controller.setup()
+        self.controller._primare_reader(b'\x02\x0d\x01\x10\x03')
+        self.clock.advance(0.06)
+
+        self.assertEqual(self.written[-1], command_frame('power_set', 1))
+        self.clock.advance(2)
+        self.assertEqual(self.written[-1], command_frame('power_set', 1))
+        self.controller._primare_reader(b'\x02\x01\x01\x10\x03')
+        self.answer(self.controller, INPUT_NAME_REPLIES, 12)
+        self.assertIn(command_frame('mute_set', 0), self.written)
+        self.assertIn(command_frame('volume_get'), self.written)
+        self.assertFalse(future.done())
+
+    def test_listeners_are_told_about_changes_only(self):
+        changes = []
+        self.controller.add_listener(lambda *args: changes.append(args))
+
+        self.controller._primare_reader(b'\x02\x03\x28\x10\x03'
+                                        b'\x02\x03\x28\x10\x03'
+                                        b'\x02\x09\x01\x10\x03')
+
+        self.assertEqual(changes, [('volume', 0x28), ('mute', True)])
+
+    def test_listeners_see_requested_volume_despite_low_reply(self):
+        changes = []
+        self.controller.add_listener(lambda *args: changes.append(args))
+        self.controller.volume_set(90)
+
+        self.controller._primare_reader(b'\x02\x03\x46\x10\x03')
+
+        self.assertEqual(changes, [('volume', 71)])
+
+    def test_low_reply_below_quirk_level_is_kept(self):
+        future = self.controller.volume_set(50)
+
+        self.controller._primare_reader(b'\x02\x03\x27\x10\x03')
+
+        self.assertFalse(future.result())
+        self.assertEqual(self.controller.state.volume, 0x27)
+
+    def test_submit_sends_any_command(self):
+        future = self.controller.submit('dim_set', 2)
+
+        self.assertEqual(self.written, [command_frame('dim_set', 2)])
+        self.controller._primare_reader(b'\x02\x0a\x02\x10\x03')
+        self.assertEqual(future.result(), 2)
+
+    def test_stats_count_traffic(self):
+        self.controller.volume_get()
+        self.controller.volume_up()
+        self.clock.advance(0.02)
+        self.controller._primare_reader(b'\x02\x03\x28\x10\x03')
+        self.clock.advance(0.04)
+        self.controller._primare_reader(b'\x02\x09\x01\x10\x03')
+
+        stats = self.controller.stats()
+        self.assertEqual(stats['frames_sent'],
+                         {'volume_get': 1, 'volume_up': 1})
+        self.assertEqual(stats['bytes_sent']['volume_get'],
+                         len(command_frame('volume_get')))
+        self.assertEqual(stats['frames_received'], {'volume': 1, 'mute': 1})
+        self.assertEqual(stats['unsolicited'], {'mute': 1})
+        self.assertEqual(stats['round_trip']['volume_get']['count'], 1)
+        self.assertEqual(stats['max_queue_depth'], 1)
+        self.assertEqual(stats['queue_wait']['count'], 2)
+        self.assertEqual(stats['queue_depth'], 0)
+
+    def test_stats_count_timeouts(self):
+        self.controller.volume_get()
+
+        self.clock.pump(5)
+
+        stats = self.controller.stats()
+        self.assertEqual(stats['retries'], {'volume_get': 2})
+        self.assertEqual(stats['timeouts'], {'volume_get': 1})
+
+    def test_stats_are_logged_periodically(self):
+        controller = PrimareController(writer=self.written.append,
+                                       reactor=self.clock, stats_interval=60)
+
+        with mock.patch('mopidy_primare.primare_serial.logger') as logger:
+            self.clock.advance(60)
+            self.clock.advance(60)
+
+        self.assertEqual(logger.info.call_count, 2)
+        self.assertEqual(controller.stats()['uptime'], 120)
+
+    def test_reads_in_flight_are_not_repeated(self):
+        first = self.controller.volume_get()
+        second = self.controller.volume_get()
+        self.controller.modelname_get()
+        third = self.controller.modelname_get()
+
+        self.clock.advance(0.06)
+        self.assertEqual(self.written, [command_frame('volume_get'),
+                                        command_frame('modelname_get')])
+        self.controller._primare_reader(b'\x02\x03\x28\x10\x03')
+        self.assertEqual(first.result(), second.result())
+        self.assertFalse(third.done())
+        self.assertEqual(self.controller.stats()['deduplicated'],
+                         {'volume_get': 1, 'modelname_get': 1})
+
+    def test_batch_reports_every_reply(self):
+        future = self.controller.batch([('input_set', 2),
+                                        'inputname_current_get'])
+
+        self.assertEqual(self.written, [command_frame('input_set', 2)])
+        self.controller._primare_reader(b'\x02\x02\x02\x10\x03')
+        self.clock.advance(0.06)
+        self.assertEqual(self.written[-1],
+                         command_frame('inputname_current_get'))
+        self.controller._primare_reader(b'\x02\x14CD\x10\x03')
+
+        self.assertEqual(future.result(timeout=0), [2, 'CD'])
+
+    def test_batch_collapses_redundant_commands(self):
+        future = self.controller.batch([
+            ('volume_set', 10), 'mute_toggle', 'modelname_get',
+            'modelname_get', ('volume_set', 20), ('mute_set', 1),
+            'modelname_get'])
+        replies = {
+            command_frame('modelname_get'): b'\x02\x16I22\x10\x03',
+            command_frame('volume_set', 20): b'\x02\x03\x14\x10\x03',
+            command_frame('mute_set', 1): b'\x02\x09\x01\x10\x03',
+        }
+        answered = 0
+        for _ in range(10):
+            for frame in self.written[answered:]:
+                self.controller._primare_reader(replies[frame])
+            answered = len(self.written)
+            self.clock.advance(0.06)
+
+        self.assertEqual(self.written, [command_frame('modelname_get'),
+                                        command_frame('volume_set', 20),
+                                        command_frame('mute_set', 1),
+                                        command_frame('modelname_get')])
+        self.assertEqual(future.result(timeout=0),
+                         [20, True, 'I22', 'I22', 20, True, 'I22'])
+
+    def test_batch_fails_with_every_outcome(self):
+        future = self.controller.batch(['modelname_get', 'volume_up'])
+        self.clock.advance(0.06)
+        self.controller._primare_reader(b'\x02\x03\x0b\x10\x03')
+        self.clock.pump(3)
+
+        error = future.exception(timeout=0)
+        self.assertIsInstance(error, PrimareBatchError)
+        self.assertIsInstance(error.results[0], PrimareTimeoutError)
+        self.assertEqual(error.results[1], 11)
+
+    def test_gap_adapts_to_reply_delay(self):
+        for _ in range(60):
+            self.controller.submit('modelname_get')
+            self.clock.advance(0.01)
+            self.controller._primare_reader(b'\x02\x16I22\x10\x03')
+            self.clock.advance(0.3)
+
+        self.assertAlmostEqual(self.controller.stats()['pacing']['gap_ms'],
+                               PacingCalibration.MIN_GAP * 1000)
+        self.controller.volume_up()
+        self.controller.volume_up()
+        self.clock.advance(PacingCalibration.MIN_GAP)
+        self.assertEqual(self.written[-2:], [command_frame('volume_up')] * 2)
+
+    def test_gap_backs_off_on_missing_reply(self):
+        self.controller.volume_up()
+        self.clock.advance(PrimareController.REPLY_TIMEOUT)
+
+        self.assertAlmostEqual(self.controller.stats()['pacing']['gap_ms'],
+                               120)
+
+    def test_gap_is_stored_per_firmware(self):
+        timings = mock.Mock()
+        timings.timing.return_value = 0.1
+        controller = PrimareController(writer=self.written.append,
+                                       reactor=self.clock, timings=timings)
+        controller._primare_reader(b'\x02\x16I22\x10\x03'
+                                   b'\x02\x17V1\x10\x03')
+
+        timings.timing.assert_called_with('I22', 'V1')
+        self.assertAlmostEqual(controller.stats()['pacing']['gap_ms'], 100)
+        for _ in range(30):
+            controller.submit('modelname_get')
+            self.clock.advance(0.01)
+            controller._primare_reader(b'\x02\x16I22\x10\x03')
+            self.clock.advance(0.3)
+        timings.store_timing.assert_called_with(
+            'I22', 'V1', controller._pacing.gap)
+
+    def test_commands_are_held_while_link_is_down(self):
+        self.controller.link_lost('Unplugged')
+        self.controller.volume_set(10)
+        self.controller.volume_set(20)
+        self.controller.mute_toggle()
+        self.clock.pump(1)
+
+        self.assertEqual(self.written, [])
+        self.assertEqual(self.controller.stats()['link'], 'down')
+        self.controller.link_restored()
+        self.clock.pump(1)
+        self.assertEqual(self.written[:3], [
+            command_frame(variable, option) for variable, option in
+            [('verbose_set', 1), ('volume_get', None),
+             ('inputname_current_get', None)]])
+        self.assertEqual(self.written[3:5], [command_frame('volume_set', 16),
+                                             command_frame('mute_toggle')])
+
+    def test_mute_set_is_not_skipped_after_link_loss(self):
+        self.controller._primare_reader(b'\x02\x09\x00\x10\x03')
+        self.controller.link_lost('Unplugged')
+        self.controller.link_restored()
+
+        self.controller.mute_set(False)
+        self.clock.pump(1)
+
+        self.assertIn(command_frame('mute_set', 0), self.written)
+
+    def test_pending_commands_are_resent_after_link_loss(self):
+        volume = self.controller.volume_get()
+        toggle = self.controller.mute_toggle()
+        self.clock.advance(0.06)
+
+        self.controller.link_lost('Unplugged')
+        self.assertIsInstance(toggle.exception(timeout=0), PrimareError)
+        self.controller.link_restored()
+        self.clock.pump(0.5)
+        # The resync reads the volume for the pending request as well
+        self.assertEqual(self.written.count(command_frame('volume_get')), 2)
+        self.controller._primare_reader(b'\x02\x03\x0a\x10\x03' * 2)
+        self.assertEqual(volume.result(timeout=0), 13)
+
+    def test_repeated_outages_do_not_pile_up_requests(self):
+        volume = self.controller.volume_get()
+        self.controller.volume_set(10)
+        self.clock.advance(0.2)
+        self.controller.volume_set(20)
+        for _ in range(5):
+            self.controller.link_lost('No replies from the amplifier')
+            self.controller.link_restored()
+            self.clock.advance(0.1)
+
+        self.assertEqual(
+            [(request.variable, request.option)
+             for request in self.controller._tx_queue],
+            [('volume_get', None), ('inputname_current_get', None),
+             ('volume_set', 16)])
+        self.clock.pump(0.3)
+        self.assertEqual(self.written.count(command_frame('volume_get')), 2)
+        self.controller._primare_reader(b'\x02\x03\x0a\x10\x03')
+        self.assertEqual(volume.result(timeout=0), 13)
+
+    def test_recovery_time_is_tracked(self):
+        self.controller.link_lost('Unplugged')
+        self.clock.advance(3)
+        resynced = self.controller.link_restored()
+        replies = [b'\x02\x0d\x01\x10\x03', b'\x02\x03\x0a\x10\x03',
+                   b'\x02\x14CD\x10\x03']
+        for reply in replies:
+            self.controller._primare_reader(reply)
+            self.clock.advance(0.1)
+
+        self.assertIsNone(resynced.result(timeout=0))
+        stats = self.controller.stats()
+        self.assertEqual(stats['outages'], 1)
+        self.assertEqual(stats['recovery']['count'], 1)
+        self.assertEqual(stats['link'], 'up')
+
+    def test_recovery_is_tracked_for_amplifier_in_standby(self):
+        self.controller.link_lost('Unplugged')
+        self.clock.advance(3)
+        resynced = self.controller.link_restored()
+        self.controller._primare_reader(b'\x02\x0d\x01\x10\x03')
+        self.clock.pump(3)
+
+        self.assertIsInstance(resynced.exception(timeout=0),
+                              PrimareBatchError)
+        self.assertEqual(self.controller.stats()['recovery']['count'], 1)
+
+    def test_silent_amplifier_is_reported_as_link_loss(self):
+        lost = []
+        controller = PrimareController(writer=self.written.append,
+                                       reactor=self.clock,
+                                       on_link_lost=lost.append)
+        controller.volume_get()
+        controller.submit('modelname_get')
+        self.clock.pump(10)
+
+        self.assertEqual(lost, ['No replies from the amplifier'])
+
+    def test_commands_in_standby_power_on_first(self):
+        self.controller._primare_reader(b'\x02\x01\x00\x10\x03')
+        self.controller.volume_set(20)
+        future = self.controller.volume_set(30)
+        self.controller.mute_toggle()
+        self.controller.mute_set(True)
+        self.clock.advance(1)
+
+        self.assertEqual(self.written, [command_frame('power_set', 1)])
+        self.controller._primare_reader(b'\x02\x01\x01\x10\x03')
+        self.clock.advance(0.06)
+        self.assertEqual(self.written[1:], [command_frame('volume_set', 24),
+                                            command_frame('mute_set', 1)])
+        self.controller._primare_reader(b'\x02\x03\x18\x10\x03')
+        self.assertTrue(future.result(timeout=0))
+        self.assertEqual(self.controller.stats()['wakeups'], 1)
+
+    def test_commands_after_wake_keep_their_order(self):
+        self.controller._primare_reader(b'\x02\x01\x00\x10\x03')
+        self.controller.input_set(3)
+        self.clock.advance(1)
+
+        self.assertEqual(self.written, [command_frame('power_set', 1)])
+        self.controller._primare_reader(b'\x02\x01\x01\x10\x03')
+        self.clock.advance(0.06)
+        self.assertEqual(self.written[1:], [
+            command_frame('input_set', 3),
+            command_frame('inputname_current_get')])
+
+    def test_commands_in_standby_are_sent_if_power_on_unconfirmed(self):
+        self.controller._primare_reader(b'\x02\x01\x00\x10\x03')
+        self.controller.volume_up()
+        self.clock.pump(PrimareController.POWER_ON_TIMEOUT + 0.1)
+
+        self.assertEqual(self.written[-1], command_frame('volume_up'))
+
+    def test_restored_state_is_provisional(self):
+        self.controller.restore({'volume': 0x28, 'mute': False,
+                                 'modelname': 'I22'})
+
+        self.assertEqual(self.controller.volume_state(), 51)
+        self.assertEqual(self.controller.state.provisional,
+                         set(['volume', 'mute', 'modelname']))
+        self.controller.mute_set(False)
+        self.assertEqual(self.written, [command_frame('mute_set', 0)])
+        self.controller._primare_reader(b'\x02\x09\x00\x10\x03')
+        self.assertEqual(self.controller.state.provisional,
+                         set(['volume', 'modelname']))
+
+    def test_setup_skips_restored_identity(self):
+        self.controller.restore({'manufacturer': 'Primare', 'volume': 0x28,
+                                 'modelname': 'I22', 'swversion': 'V1',
+                                 'power': True,
+                                 'inputs': dict((str(index), 'In')
+                                                for index in range(8))})
+        self.controller.setup()
+        self.controller._primare_reader(b'\x02\x0d\x01\x10\x03')
+        self.clock.advance(0.06)
+        self.controller._primare_reader(b'\x02\x01\x01\x10\x03')
+        self.clock.advance(0.06)
+        self.controller._primare_reader(b'\x02\x09\x00\x10\x03')
+        self.clock.advance(0.06)
+        self.controller._primare_reader(b'\x02\x03\x28\x10\x03')
+        self.clock.advance(0.06)
+        self.clock.advance(0.06)
+        self.clock.advance(0.06)
+
+        # The identity is only checked once set up
+        self.assertEqual(self.written[2:], [
+            command_frame('mute_set', 0), command_frame('volume_get'),
+            command_frame('inputname_current_get'),
+            command_frame('modelname_get'), command_frame('swversion_get')])
+
+    def test_other_amplifier_replaces_restored_identity(self):
+        self.controller.restore({'modelname': 'I22', 'swversion': 'V1',
+                                 'inputs': {'1': 'CD'}})
+
+        self.controller._primare_reader(b'\x02\x16I32\x10\x03')
+        self.clock.pump(1)
+
+        self.assertEqual(self.controller.state.inputs, {})
+        self.assertIn(command_frame('inputname_specific_get', 7),
+                      self.written)
+
+    def test_input_names_are_kept_by_index(self):
+        changes = []
+        self.controller.add_listener(lambda *args: changes.append(args))
+
+        self.controller._primare_reader(b''.join(INPUT_NAME_REPLIES.values()))
+
+        self.assertEqual(self.controller.input_names()[1], 'CD')
+        self.assertEqual(len(self.controller.input_names()), 8)
+        self.assertEqual(changes[-1], ('inputs',
+                                       self.controller.input_names()))
+
+    def test_input_set_by_name_resolves_name_locally(self):
+        self.controller._primare_reader(b''.join(INPUT_NAME_REPLIES.values()))
+
+        future = self.controller.input_set('dac')
+        self.controller._primare_reader(b'\x02\x02\x02\x10\x03')
+        self.clock.pump(1)
+
+        self.assertEqual(future.result(timeout=0), 2)
+        self.assertEqual(self.written, [command_frame('input_set', 2)])
+        self.assertEqual(self.controller.state.inputname, 'DAC')
+
+    def test_input_set_by_unknown_name_fails(self):
+        self.assertRaises(PrimareError, self.controller.input_set, 'DAC')
+
+    def test_input_next_reads_name_without_table(self):
+        self.controller.input_next()
+        self.controller._primare_reader(b'\x02\x02\x03\x10\x03')
+        self.clock.advance(0.06)
+
+        self.assertEqual(self.written, [
+            command_frame('input_next'),
+            command_frame('inputname_current_get')])
+
+
+class ParseFrameTest(unittest.TestCase):
+
+    def test_values_have_native_types(self):
+        self.assertEqual(parse_frame(bytearray(b'\x03\x28')).value, 0x28)
+        self.assertIs(parse_frame(bytearray(b'\x09\x01')).value, True)
+        self.assertEqual(parse_frame(bytearray(b'\x16I22')).value, 'I22')
+        self.assertEqual(parse_frame(bytearray(b'\x94\x02DAC')).value,
+                         (2, 'DAC'))
+
+    def test_every_reply_has_a_parser(self):
+        for variable, field in PRIMARE_REPLY.items():
+            frame = parse_frame(bytearray([int(variable, 16), 1]))
+            self.assertEqual(frame.field, field)
+
+    def test_unknown_variables_keep_raw_value(self):
+        frame = parse_frame(bytearray(b'\x42\x01\x02'))
+
+        self.assertIsNone(frame.field)
+        self.assertEqual(frame.value, b'\x01\x02')
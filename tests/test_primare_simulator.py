@@ -0,0 +1,65 @@
+from __future__ import unicode_literals
+
+import time
+import unittest
+
+from mopidy_primare.primare_serial import PrimareController
+from mopidy_primare.primare_simulator import PrimareSimulator
+from mopidy_primare.primare_threaded import SerialTransport, ThreadedReactor
+
+TIMEOUT = 5
+
+
+class PrimareSimulatorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.simulator = PrimareSimulator(byte_time=0, response_delay=0,
+                                          power_on_delay=0.1)
+        self.simulator.open()
+        self.reactor = ThreadedReactor()
+        self.transport = SerialTransport(self.simulator.port, self.reactor)
+        self.controller = PrimareController(writer=self.transport.write,
+                                            reactor=self.reactor)
+        self.transport.open(self.controller._primare_reader)
+        self.reactor.start()
+
+    def tearDown(self):
+        self.transport.close()
+        self.reactor.stop()
+        self.simulator.close()
+
+    def wait_for(self, condition):
+        deadline = time.time() + TIMEOUT
+        while not condition() and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertTrue(condition())
+
+    def test_setup_reads_amplifier_state(self):
+        self.simulator.power = False
+
+        self.controller.setup().result(TIMEOUT)
+
+        self.assertTrue(self.simulator.power)
+        self.assertTrue(self.controller.state.power)
+        self.assertEqual(self.controller.state.volume, self.simulator.volume)
+
+    def test_volume_set_is_confirmed(self):
+        self.controller.verbose_set(True).result(TIMEOUT)
+
+        self.assertTrue(self.controller.volume_set(90).result(TIMEOUT))
+        self.assertEqual(self.simulator.volume, 71)
+        self.assertEqual(self.controller.state.volume, 71)
+
+    def test_knob_changes_are_reported(self):
+        self.controller.verbose_set(True).result(TIMEOUT)
+
+        self.simulator.turn_knob(3, interval=0.01)
+
+        self.wait_for(lambda: self.controller.state.volume == 23)
+
+    def test_identity_is_read(self):
+        self.controller.verbose_set(True).result(TIMEOUT)
+
+        self.controller.modelname_get().result(TIMEOUT)
+
+        self.assertEqual(self.controller.state.modelname, 'i22')
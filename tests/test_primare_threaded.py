@@ -0,0 +1,139 @@
+from __future__ import unicode_literals
+
+import unittest
+
+import mock
+
+from mopidy_primare.primare_serial import PrimareController
+from mopidy_primare.primare_threaded import SerialSupervisor
+
+from tests import Clock
+
+
+class FakeTransport(object):
+    """Transport failing to open as often as told to."""
+
+    port = 'loop://'
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.opened = 0
+        self.closed = 0
+        self.lost = None
+        self.written = []
+
+    def open(self, reader, lost=None):
+        if self.failures:
+            self.failures -= 1
+            raise IOError('No such device')
+        self.opened += 1
+        self.lost = lost
+
+    def close(self):
+        self.closed += 1
+
+    def write(self, data):
+        if self.closed >= self.opened:
+            raise IOError('Not open')
+        self.written.append(data)
+
+
+class SerialSupervisorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        self.controller = mock.Mock()
+
+    def test_connects_and_restores_link(self):
+        transport = FakeTransport()
+        supervisor = SerialSupervisor(transport, self.clock)
+
+        supervisor.start(self.controller)
+
+        self.assertTrue(supervisor.connected)
+        self.controller.link_restored.assert_called_once_with()
+        self.assertFalse(self.controller.link_lost.called)
+
+    def test_retries_with_growing_delays(self):
+        transport = FakeTransport(failures=3)
+        supervisor = SerialSupervisor(transport, self.clock)
+
+        supervisor.start(self.controller)
+        self.assertTrue(self.controller.link_lost.called)
+        self.clock.advance(0.5)
+        self.clock.advance(1)
+        self.assertFalse(supervisor.connected)
+        self.clock.advance(2)
+
+        self.assertTrue(supervisor.connected)
+        self.assertEqual(transport.opened, 1)
+        self.controller.link_restored.assert_called_once_with()
+
+    def test_reconnects_after_read_failure(self):
+        transport = FakeTransport()
+        supervisor = SerialSupervisor(transport, self.clock)
+        supervisor.start(self.controller)
+
+        transport.lost(IOError('Device disconnected'))
+        self.controller.link_lost.assert_called_once_with(
+            'Reading failed: Device disconnected')
+        self.assertFalse(supervisor.connected)
+        self.clock.advance(SerialSupervisor.RETRY_MIN)
+
+        self.assertTrue(supervisor.connected)
+        self.assertEqual(transport.opened, 2)
+
+    def test_write_failure_loses_link(self):
+        transport = FakeTransport()
+        supervisor = SerialSupervisor(transport, self.clock)
+        supervisor.start(self.controller)
+        transport.close()
+
+        supervisor.write(b'\x02R\x01\x00\x10\x03')
+
+        self.controller.link_lost.assert_called_once_with(
+            'Writing failed: Not open')
+
+    def test_close_stops_reconnecting(self):
+        transport = FakeTransport(failures=1)
+        supervisor = SerialSupervisor(transport, self.clock)
+        supervisor.start(self.controller)
+
+        supervisor.close()
+        self.clock.advance(SerialSupervisor.RETRY_MAX)
+
+        self.assertEqual(transport.opened, 0)
+
+    def test_silent_amplifier_keeps_delays_growing(self):
+        transport = FakeTransport()
+        supervisor = SerialSupervisor(transport, self.clock)
+        controller = PrimareController(writer=supervisor.write,
+                                       reactor=self.clock,
+                                       on_link_lost=supervisor.lost)
+        supervisor.start(controller)
+        controller.setup()
+
+        self.clock.pump(600, step=0.1)
+
+        self.assertLess(controller.stats()['outages'], 30)
+        self.assertEqual(supervisor._retry_delay, SerialSupervisor.RETRY_MAX)
+        self.assertLessEqual(len(controller._tx_queue),
+                             len(PrimareController.RESYNC_CMDS))
+
+    def test_answering_amplifier_resets_delay(self):
+        transport = FakeTransport(failures=3)
+        supervisor = SerialSupervisor(transport, self.clock)
+        controller = PrimareController(writer=supervisor.write,
+                                       reactor=self.clock,
+                                       on_link_lost=supervisor.lost)
+        supervisor.start(controller)
+        for delay in (0.5, 1, 2):
+            self.clock.advance(delay)
+        self.assertTrue(supervisor.connected)
+
+        for reply in [b'\x02\x0d\x01\x10\x03', b'\x02\x03\x0a\x10\x03',
+                      b'\x02\x14CD\x10\x03']:
+            self.clock.advance(0.1)
+            controller._primare_reader(reply)
+
+        self.assertEqual(supervisor._retry_delay, SerialSupervisor.RETRY_MIN)
@@ -0,0 +1,134 @@
+from __future__ import unicode_literals
+
+import unittest
+
+from mopidy_primare.primare_serial import PrimareController, command_frame
+
+from tests import Clock
+
+try:
+    from mopidy_primare import primare_wamp
+except ImportError:
+    primare_wamp = None
+
+
+@unittest.skipIf(primare_wamp is None, 'needs autobahn')
+class TopicThrottleTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        self.published = []
+        self.throttle = primare_wamp.TopicThrottle(
+            lambda *args: self.published.append(args), self.clock, rate=10)
+
+    def test_first_change_is_published_right_away(self):
+        self.throttle.update('volume', 1)
+
+        self.assertEqual(self.published, [('volume', 1)])
+
+    def test_changes_are_coalesced_within_the_interval(self):
+        for value in range(1, 5):
+            self.throttle.update('volume', value)
+            self.clock.advance(0.02)
+
+        self.assertEqual(self.published, [('volume', 1)])
+        self.clock.advance(0.03)
+        self.assertEqual(self.published, [('volume', 1), ('volume', 4)])
+        self.assertEqual(self.throttle.coalesced, 2)
+
+    def test_topics_are_throttled_independently(self):
+        self.throttle.update('volume', 1)
+        self.throttle.update('volume', 2)
+        self.throttle.update('mute', True)
+
+        self.assertEqual(self.published, [('volume', 1), ('mute', True)])
+
+    def test_stop_drops_held_values(self):
+        self.throttle.update('volume', 1)
+        self.throttle.update('volume', 2)
+
+        self.throttle.stop()
+        self.clock.advance(1)
+
+        self.assertEqual(self.published, [('volume', 1)])
+
+
+@unittest.skipIf(primare_wamp is None, 'needs autobahn')
+class McuComponentTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        self.published = []
+        self.component = primare_wamp.McuComponent()
+        self.written = []
+        self.component._primare_talker = PrimareController(
+            writer=self.written.append, reactor=self.clock)
+        self.component._reactor = self.clock
+        self.component._throttle = primare_wamp.TopicThrottle(
+            lambda *args: self.published.append(args), self.clock)
+        self.component._primare_talker.add_listener(
+            self.component.state_changed)
+
+    def test_state_changes_are_published_per_topic(self):
+        self.component._primare_talker._primare_reader(
+            b'\x02\x03\x28\x10\x03\x02\x09\x01\x10\x03')
+
+        self.assertEqual(self.published,
+                         [('com.mopidy.primare.volume', 0x28),
+                          ('com.mopidy.primare.mute', True)])
+
+    def test_snapshot_holds_known_state(self):
+        self.component._primare_talker._primare_reader(
+            b'\x02\x03\x28\x10\x03')
+
+        self.assertEqual(self.component.state_snapshot(), {'volume': 0x28})
+
+    def results(self, deferred):
+        results = []
+        deferred.addBoth(results.append)
+        return results
+
+    def test_commands_answer_with_the_reply(self):
+        results = self.results(self.component.call_command('volume_set', 40))
+
+        self.assertEqual(self.written, [command_frame('volume_set', 40)])
+        self.assertEqual(results, [])
+        self.component._primare_talker._primare_reader(
+            b'\x02\x03\x28\x10\x03')
+        self.assertEqual(results, [0x28])
+
+    def test_methods_answer_with_their_result(self):
+        results = self.results(self.component.call_method('volume_get'))
+
+        self.component._primare_talker._primare_reader(
+            b'\x02\x03\x28\x10\x03')
+
+        self.assertEqual(results, [51])
+        self.assertEqual(
+            self.component.call_method('volume_state'), 51)
+
+    def test_timeouts_are_application_errors(self):
+        results = self.results(self.component.call_method('volume_up'))
+
+        self.clock.pump(1)
+
+        self.assertEqual(results[0].value.error,
+                         'com.mopidy.primare.error.timeout')
+
+    def test_invalid_arguments_are_application_errors(self):
+        results = self.results(self.component.call_command('volume_set'))
+
+        self.assertEqual(results[0].value.error, 'com.mopidy.primare.error')
+
+    def test_unknown_input_is_application_error(self):
+        results = self.results(self.component.call_method('input_set',
+                                                          'Tape'))
+
+        self.assertEqual(results[0].value.error, 'com.mopidy.primare.error')
+
+    def test_public_methods_are_exported(self):
+        methods = primare_wamp.controller_methods()
+
+        self.assertIn('volume_fade', methods)
+        self.assertIn('stats', methods)
+        self.assertNotIn('add_listener', methods)